@@ -0,0 +1,148 @@
+# ann_index.py
+import os
+import json
+import numpy as np
+from scipy import sparse
+from typing import Optional, Tuple
+
+from similarity_artifact import save_arrays, load_arrays, artifact_dir
+
+CONTENT_LSH_TABLES = int(os.getenv('CONTENT_LSH_TABLES', '32'))
+CONTENT_LSH_BITS = int(os.getenv('CONTENT_LSH_BITS', '10'))
+# Upper bound on exactly-scored candidates per query, which bounds query latency
+CONTENT_LSH_MAX_CANDIDATES = int(os.getenv('CONTENT_LSH_MAX_CANDIDATES', '2000'))
+
+class LSHIndex:
+    """
+    Random-projection LSH for cosine similarity over (sparse) content vectors.
+
+    Each of `n_tables` tables hashes a vector to an `n_bits` code, one bit per
+    random hyperplane (the sign of the projection). Vectors with a small angle
+    between them agree on most bits, so near neighbours share buckets.
+
+    - `planes` (int8, V x tables*bits): the hyperplanes, with random +/-1
+      entries (sign projections hash as well as Gaussian ones at 1/4 the size).
+    - `keys` (uint64, tables*N): `table << 32 | code` for every row in every
+      table, sorted, so a bucket is the contiguous range `np.searchsorted`
+      finds for a key and all probes of a query are looked up in one call.
+    - `order` (int32, tables*N): the row index behind each sorted key.
+
+    Candidates are re-scored exactly by the caller; the index only narrows them.
+    """
+
+    ARTIFACT_NAME = "content_lsh"
+    _ARRAY_NAMES = ('planes', 'keys', 'order')
+
+    def __init__(self, planes: np.ndarray, keys: np.ndarray, order: np.ndarray, n_tables: int, version: Optional[str] = None):
+        self.planes = planes
+        self.keys = keys
+        self.order = order
+        self.version = version
+        self.n_tables = n_tables
+        self.n_bits = planes.shape[1] // n_tables
+
+    @classmethod
+    def build(cls, item_vectors, n_tables: int = CONTENT_LSH_TABLES, n_bits: int = CONTENT_LSH_BITS, seed: int = 0) -> "LSHIndex":
+        if not 0 < n_bits <= 31:
+            raise ValueError("n_bits must be between 1 and 31")
+        planes = np.where(np.random.default_rng(seed).random((item_vectors.shape[1], n_tables * n_bits)) < 0.5, -1, 1).astype(np.int8)
+        index = cls(planes, np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int32), n_tables)
+        row_keys = index._keys(index.hash(item_vectors)).T.ravel()
+        order = np.argsort(row_keys, kind='stable')
+        index.keys = row_keys[order]
+        index.order = (order % item_vectors.shape[0]).astype(np.int32)
+        return index
+
+    def _keys(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.uint64) | (np.arange(self.n_tables, dtype=np.uint64) << np.uint64(32))
+
+    def hash(self, vectors) -> np.ndarray:
+        """Returns the (n, tables) uint32 bucket codes of the rows of `vectors`."""
+        if sparse.issparse(vectors) and vectors.shape[0] == 1:
+            # One query: only the planes' rows for its nonzero terms matter
+            vector = vectors.tocsr()
+            projections = (vector.data.astype(np.float32) @ self.planes[vector.indices]).reshape(1, -1)
+        else:
+            projections = np.asarray(vectors @ self.planes)
+        bits = (projections > 0).reshape(projections.shape[0], self.n_tables, self.n_bits)
+        return (bits.astype(np.uint32) << np.arange(self.n_bits, dtype=np.uint32)).sum(axis=2, dtype=np.uint32)
+
+    def candidates(self, vector, max_candidates: int = CONTENT_LSH_MAX_CANDIDATES, multi_probe: bool = True) -> np.ndarray:
+        """
+        Returns the row indices sharing a bucket with `vector` in any table.
+        With `multi_probe`, buckets one bit away are probed too (after all exact
+        buckets), which raises recall without adding tables.
+        """
+        query_codes = self.hash(vector)[0]
+        # (probes, tables): row 0 is each table's own bucket, row b+1 flips bit b
+        probe_codes = query_codes[np.newaxis, :]
+        if multi_probe:
+            flips = np.uint32(1) << np.arange(self.n_bits, dtype=np.uint32)
+            probe_codes = np.vstack([probe_codes, query_codes[np.newaxis, :] ^ flips[:, np.newaxis]])
+        probe_keys = self._keys(probe_codes).ravel()
+        lows = np.searchsorted(self.keys, probe_keys, side='left')
+        lengths = np.searchsorted(self.keys, probe_keys, side='right') - lows
+
+        # Take whole buckets in probe order until about twice the budget is gathered
+        taken = np.flatnonzero(lengths)
+        ends = np.cumsum(lengths[taken])
+        taken = taken[:np.searchsorted(ends, max_candidates * 2) + 1]
+        if not len(taken):
+            return np.empty(0, dtype=np.int64)
+        lows, lengths = lows[taken], lengths[taken]
+        starts = np.cumsum(lengths) - lengths
+        positions = np.arange(lengths.sum()) - np.repeat(starts, lengths) + np.repeat(lows, lengths)
+        return _most_colliding(self.order[positions], max_candidates)
+
+    def top_k_neighbors(self, item_vectors, top_k: int = 50, max_candidates: int = CONTENT_LSH_MAX_CANDIDATES) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Approximate counterpart of `compute_top_k_neighbors` for L2-normalised
+        sparse rows: each row is compared only with the rows in its buckets.
+        Returns the same CSR-style `(indptr, indices, scores)` arrays.
+        """
+        item_vectors = item_vectors.tocsr()
+        n_items = item_vectors.shape[0]
+        row_keys = self._keys(self.hash(item_vectors))
+        # Exact-bucket ranges of every row in every table, found in one pass
+        lows = np.searchsorted(self.keys, row_keys, side='left')
+        highs = np.searchsorted(self.keys, row_keys, side='right')
+
+        indptr = np.zeros(n_items + 1, dtype=np.int64)
+        all_indices, all_scores = [], []
+        for row in range(n_items):
+            found = np.concatenate([self.order[lows[row, t]:highs[row, t]] for t in range(self.n_tables)])
+            candidates = _most_colliding(found[found != row], max_candidates)
+            scores = np.asarray((item_vectors[candidates] @ item_vectors[row].T).todense()).ravel() if len(candidates) else np.empty(0)
+            positive = scores > 0
+            candidates, scores = candidates[positive], scores[positive]
+            if len(candidates) > top_k:
+                keep = np.argpartition(scores, -top_k)[-top_k:]
+                candidates, scores = candidates[keep], scores[keep]
+            ranked = np.argsort(-scores, kind='stable')
+            all_indices.append(candidates[ranked].astype(np.int32))
+            all_scores.append(scores[ranked].astype(np.float32))
+            indptr[row + 1] = indptr[row] + len(candidates)
+
+        indices = np.concatenate(all_indices) if all_indices else np.empty(0, dtype=np.int32)
+        scores = np.concatenate(all_scores) if all_scores else np.empty(0, dtype=np.float32)
+        return indptr, indices, scores
+
+    def save(self, version: str) -> str:
+        meta = {"version": version, "tables": self.n_tables, "bits": self.n_bits, "movies": len(self.keys) // max(self.n_tables, 1)}
+        return save_arrays(self.ARTIFACT_NAME, version, {array_name: getattr(self, array_name) for array_name in self._ARRAY_NAMES}, meta)
+
+    @classmethod
+    def load(cls, version: str) -> Optional["LSHIndex"]:
+        arrays = load_arrays(cls.ARTIFACT_NAME, version, cls._ARRAY_NAMES)
+        if arrays is None:
+            return None
+        with open(os.path.join(artifact_dir(cls.ARTIFACT_NAME, version), 'meta.json')) as f:
+            n_tables = json.load(f)["tables"]
+        return cls(n_tables=n_tables, version=version, **arrays)
+
+def _most_colliding(found: np.ndarray, max_candidates: int) -> np.ndarray:
+    """Deduplicates candidate rows, keeping the ones that share the most buckets with the query."""
+    candidates, collisions = np.unique(found, return_counts=True)
+    if len(candidates) > max_candidates:
+        candidates = candidates[np.argpartition(-collisions, max_candidates - 1)[:max_candidates]]
+    return candidates.astype(np.int64)
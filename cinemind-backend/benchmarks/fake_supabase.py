@@ -0,0 +1,248 @@
+# benchmarks/fake_supabase.py
+import re
+import sys
+import copy
+import types
+import bisect
+import itertools
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+class FakeResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+class FakeQuery:
+    """
+    The subset of the postgrest query builder the backend uses: select / insert /
+    upsert / update / delete with eq, neq, gt, gte, lt, lte, like, in_, is_, overlaps,
+    order, limit, range and single filters, evaluated against in-memory rows.
+    """
+
+    def __init__(self, db: "InMemorySupabase", table: str):
+        self._db = db
+        self._table = table
+        self._action = 'select'
+        self._payload = None
+        self._on_conflict: Optional[str] = None
+        self._filters: List = []
+        self._order: Optional[tuple] = None
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._single = False
+        self._count: Optional[str] = None
+        self._columns: Optional[List[str]] = None
+
+    # --- actions ---
+    def select(self, columns: str = '*', count: Optional[str] = None) -> "FakeQuery":
+        self._action, self._count = 'select', count
+        self._columns = None if columns.strip() == '*' else [c.strip() for c in columns.split(',') if c.strip()]
+        return self
+
+    def insert(self, rows) -> "FakeQuery":
+        self._action, self._payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict: Optional[str] = None, **kwargs) -> "FakeQuery":
+        self._action, self._payload, self._on_conflict = 'upsert', rows, on_conflict
+        return self
+
+    def update(self, values: Dict) -> "FakeQuery":
+        self._action, self._payload = 'update', values
+        return self
+
+    def delete(self) -> "FakeQuery":
+        self._action = 'delete'
+        return self
+
+    # --- filters ---
+    def _filter(self, column: str, op: str, value) -> "FakeQuery":
+        self._filters.append((column, op, value))
+        return self
+
+    def eq(self, column, value): return self._filter(column, 'eq', value)
+    def neq(self, column, value): return self._filter(column, 'neq', value)
+    def gt(self, column, value): return self._filter(column, 'gt', value)
+    def gte(self, column, value): return self._filter(column, 'gte', value)
+    def lt(self, column, value): return self._filter(column, 'lt', value)
+    def lte(self, column, value): return self._filter(column, 'lte', value)
+    def like(self, column, pattern): return self._filter(column, 'like', re.compile('^' + '.*'.join(map(re.escape, pattern.split('%'))) + '$', re.S))
+    def in_(self, column, values): return self._filter(column, 'in', set(values))
+    def is_(self, column, value): return self._filter(column, 'is', None if value in (None, 'null') else value)
+    def overlaps(self, column, values): return self._filter(column, 'overlaps', set(values))
+
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None, **kwargs) -> "FakeQuery":
+        # Postgres puts NULLs first in descending order unless told otherwise
+        self._order = (column, desc, desc if nullsfirst is None else nullsfirst)
+        return self
+
+    def limit(self, size: int) -> "FakeQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int) -> "FakeQuery":
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self) -> "FakeQuery":
+        self._single = True
+        return self
+
+    maybe_single = single
+
+    # --- evaluation ---
+    def _matches(self, row: Dict) -> bool:
+        for column, op, value in self._filters:
+            field = row.get(column)
+            if op == 'eq' and not _equal(field, value): return False
+            if op == 'neq' and _equal(field, value): return False
+            if op == 'in' and field not in value and str(field) not in {str(v) for v in value}: return False
+            if op == 'is' and field is not value: return False
+            if op == 'like' and (field is None or not value.match(str(field))): return False
+            if op == 'overlaps' and not value.intersection(field or []): return False
+            if op in ('gt', 'gte', 'lt', 'lte'):
+                if field is None: return False
+                if op == 'gt' and not field > value: return False
+                if op == 'gte' and not field >= value: return False
+                if op == 'lt' and not field < value: return False
+                if op == 'lte' and not field <= value: return False
+        return True
+
+    def _project(self, row: Dict) -> Dict:
+        if self._columns is None:
+            return dict(row)
+        return {column: row.get(column) for column in self._columns}
+
+    def _select(self) -> FakeResponse:
+        candidates = self._db._candidate_rows(self._table, self._order, self._filters)
+        if self._db._is_indexed_scan(self._order) and self._limit is not None and not self._count:
+            # Already in order: stop as soon as the page is full
+            rows = list(itertools.islice((row for row in candidates if self._matches(row)), self._offset + self._limit))
+        else:
+            rows = [row for row in candidates if self._matches(row)]
+        if self._order and not self._db._is_indexed_scan(self._order):
+            column, desc, nullsfirst = self._order
+            present = sorted((row for row in rows if row.get(column) is not None), key=lambda row: row[column], reverse=desc)
+            missing = [row for row in rows if row.get(column) is None]
+            rows = missing + present if nullsfirst else present + missing
+        total = len(rows)
+        rows = rows[self._offset:self._offset + self._limit if self._limit is not None else None]
+        data = [self._project(row) for row in rows]
+        if self._single:
+            data = data[0] if data else None
+        return FakeResponse(data, total if self._count else None)
+
+    def execute(self) -> FakeResponse:
+        with self._db._lock:
+            self._db.query_counts[self._table] = self._db.query_counts.get(self._table, 0) + 1
+            if self._action == 'select':
+                return self._select()
+            if self._action in ('insert', 'upsert'):
+                rows = self._payload if isinstance(self._payload, list) else [self._payload]
+                written = [self._db._write(self._table, row, self._on_conflict if self._action == 'upsert' else None) for row in rows]
+                return FakeResponse(written)
+            table = self._db.tables.setdefault(self._table, [])
+            matched = [row for row in table if self._matches(row)]
+            if self._action == 'update':
+                for row in matched:
+                    row.update(copy.deepcopy(self._payload))
+            else:
+                ids = {id(row) for row in matched}
+                self._db.tables[self._table] = [row for row in table if id(row) not in ids]
+            self._db._invalidate(self._table)
+            return FakeResponse([dict(row) for row in matched])
+
+def _equal(field, value) -> bool:
+    return field == value or (field is not None and str(field) == str(value))
+
+class InMemorySupabase:
+    """
+    An in-memory stand-in for a Supabase client, holding each table as a list of
+    row dicts. Keyset pagination (`order(key).gt(key, last).limit(n)`) uses a
+    sorted index per column and `eq` filters a hash index, so streaming
+    millions of rows stays linear and per-user lookups do not scan the table.
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict]]] = None):
+        self.tables: Dict[str, List[Dict]] = {name: list(rows) for name, rows in (tables or {}).items()}
+        self.query_counts: Dict[str, int] = {}
+        self._indexes: Dict[tuple, tuple] = {}
+        self._lock = threading.RLock()
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def load(self, name: str, rows: List[Dict]):
+        with self._lock:
+            self.tables[name] = list(rows)
+            self._invalidate(name)
+
+    def _invalidate(self, name: str):
+        for key in [key for key in self._indexes if key[0] == name]:
+            del self._indexes[key]
+
+    def _index(self, name: str, column: str) -> tuple:
+        key = (name, column)
+        if key not in self._indexes:
+            rows = sorted((row for row in self.tables.get(name, []) if row.get(column) is not None), key=lambda row: row[column])
+            self._indexes[key] = ([row[column] for row in rows], rows)
+        return self._indexes[key]
+
+    @staticmethod
+    def _is_indexed_scan(order: Optional[tuple]) -> bool:
+        # Ascending scans read the sorted index (rows with a NULL key are left out)
+        return order is not None and not order[1]
+
+    def _eq_index(self, name: str, column: str) -> Dict[str, List[Dict]]:
+        key = (name, column, 'eq')
+        if key not in self._indexes:
+            index: Dict[str, List[Dict]] = {}
+            for row in self.tables.get(name, []):
+                index.setdefault(str(row.get(column)), []).append(row)
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def _candidate_rows(self, name: str, order: Optional[tuple], filters: List) -> Iterable[Dict]:
+        """Narrows the rows a query has to scan with the sorted or equality index."""
+        if self._is_indexed_scan(order):
+            column = order[0]
+            keys, rows = self._index(name, column)
+            start = 0
+            for filter_column, op, value in filters:
+                if filter_column == column and op in ('gt', 'gte'):
+                    start = max(start, bisect.bisect_right(keys, value) if op == 'gt' else bisect.bisect_left(keys, value))
+            return itertools.islice(rows, start, None)
+        for filter_column, op, value in filters:
+            if op == 'eq':
+                return self._eq_index(name, filter_column).get(str(value), [])
+        return self.tables.get(name, [])
+
+    def _write(self, name: str, row: Dict, on_conflict: Optional[str]) -> Dict:
+        table = self.tables.setdefault(name, [])
+        row = copy.deepcopy(row)
+        if on_conflict:
+            conflict_columns = [c.strip() for c in on_conflict.split(',')]
+            for existing in table:
+                if all(_equal(existing.get(c), row.get(c)) for c in conflict_columns):
+                    existing.update(row)
+                    self._invalidate(name)
+                    return dict(existing)
+        if 'id' not in row:
+            row['id'] = len(table) + 1
+        table.append(row)
+        self._invalidate(name)
+        return dict(row)
+
+def install(client: Optional[InMemorySupabase] = None) -> InMemorySupabase:
+    """
+    Registers the in-memory client as the `supabase_client` module, so every
+    backend module imported afterwards reads and writes it instead of the network.
+    Must run before the first backend import.
+    """
+    client = client or InMemorySupabase()
+    module = types.ModuleType('supabase_client')
+    module.supabase = client
+    module.supabase_admin = client
+    sys.modules['supabase_client'] = module
+    return client
@@ -0,0 +1,204 @@
+# benchmarks/run_benchmarks.py
+"""
+Offline benchmark of the recommendation pipeline on synthetic data.
+
+For every dataset size it measures training wall time and peak RSS of each
+trainer, per-user scoring latency percentiles, and precision@K / recall@K /
+catalog coverage on a held-out split. Supabase is replaced by an in-memory
+stand-in, so no network or credentials are needed.
+
+Run from cinemind-backend/:
+    python -m benchmarks.run_benchmarks --scales 10k 100k
+    python -m benchmarks.run_benchmarks --scales 1m --engine als --output results.json
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tempfile
+import resource
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Parse the engine first: the backend reads COLLAB_ENGINE when it is imported
+_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+_parser.add_argument('--scales', nargs='+', default=['10k', '100k'], help="dataset sizes: 10k, 100k, 1m or a rating count")
+_parser.add_argument('--engine', choices=['item_cosine', 'als'], default='item_cosine', help="collaborative engine to train and serve")
+_parser.add_argument('--k', type=int, default=10, help="cut-off for precision@K / recall@K")
+_parser.add_argument('--eval-users', type=int, default=1000, help="held-out users evaluated for quality")
+_parser.add_argument('--latency-users', type=int, default=300, help="users timed for scoring latency")
+_parser.add_argument('--seed', type=int, default=0)
+_parser.add_argument('--output', help="write the results as JSON to this path")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+class PeakRSS:
+    """Samples the resident set size on a background thread; falls back to ru_maxrss off Linux."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.baseline = self.peak = _rss_bytes() or 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes() or 0)
+
+    def __enter__(self) -> "PeakRSS":
+        if _rss_bytes() is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        rss = _rss_bytes()
+        if rss is None:
+            # ru_maxrss is the process-wide peak (KiB on Linux, bytes on macOS)
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = max_rss if sys.platform == 'darwin' else max_rss * 1024
+        else:
+            self.peak = max(self.peak, rss)
+
+@contextmanager
+def measure(results: Dict, name: str):
+    gc.collect()
+    started = time.perf_counter()
+    with PeakRSS() as rss:
+        yield
+    results[name] = {
+        "seconds": round(time.perf_counter() - started, 3),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+        "rss_growth_mb": round((rss.peak - rss.baseline) / 2**20, 1),
+    }
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    import numpy as np
+    values = np.asarray(samples_ms)
+    return {f"p{p}": round(float(np.percentile(values, p)), 3) for p in (50, 90, 95, 99)} | {"mean": round(float(values.mean()), 3)}
+
+def run_scale(client, n_ratings: int, args) -> Dict:
+    import numpy as np
+    from model_store import similarity_models
+    from recommendation_engine import RecommendationEngine
+    from training_scheduler import MODEL_TRAINERS
+    from benchmarks.synthetic_data import generate_dataset, holdout_split, dataset_shape
+
+    n_movies, n_users = dataset_shape(n_ratings)
+    print(f"\n=== {n_ratings:,} ratings ({n_movies:,} movies, {n_users:,} users, engine={args.engine}) ===")
+    result: Dict = {"ratings": n_ratings, "movies": n_movies, "users": n_users, "engine": args.engine, "training": {}}
+
+    with measure(result, "generate"):
+        dataset = generate_dataset(n_ratings, seed=args.seed)
+        train, test = holdout_split(dataset.ratings, seed=args.seed)
+    client.load('movies', dataset.movies)
+    client.load('user_ratings', train)
+    client.load('user_likes', [])
+    client.load('cached_lists', [])
+    result["train_ratings"], result["test_users"] = len(train), len(test)
+
+    for name, train_function in MODEL_TRAINERS:
+        with measure(result["training"], name):
+            succeeded = train_function()
+        result["training"][name]["succeeded"] = succeeded
+        similarity_models.refresh()
+        print(f"  train {name:<22} {result['training'][name]}")
+
+    with measure(result, "model_load"):
+        similarity_models._loaded = False
+        similarity_models.refresh()
+
+    # --- per-user scoring latency (the CPU part of the home path, without TMDB) ---
+    rng = np.random.default_rng(args.seed)
+    user_ids = sorted({row['user_id'] for row in train})
+    sampled = [user_ids[i] for i in rng.choice(len(user_ids), size=min(args.latency_users, len(user_ids)), replace=False)]
+    live_engine = RecommendationEngine(collab_engine=args.engine, use_precomputed=False)
+    engines = {"live_scoring": live_engine}
+    if similarity_models.get().precomputed:
+        engines["precomputed_lookup"] = RecommendationEngine(collab_engine=args.engine)
+    result["latency_ms"] = {}
+    for path_name, engine in engines.items():
+        samples = []
+        for user_id in sampled:
+            started = time.perf_counter()
+            engine.context(user_id, args.k).taste().top(args.k)
+            samples.append((time.perf_counter() - started) * 1000)
+        result["latency_ms"][path_name] = percentiles(samples)
+        print(f"  latency {path_name:<20} {result['latency_ms'][path_name]}")
+
+    # --- offline quality on the held-out split ---
+    relevant_users = [user_id for user_id, held_out in test.items() if any(rating >= 4 for rating in held_out.values())]
+    evaluated = [relevant_users[i] for i in rng.choice(len(relevant_users), size=min(args.eval_users, len(relevant_users)), replace=False)]
+    popularity: Dict[int, int] = {}
+    for row in train:
+        popularity[row['movie_id']] = popularity.get(row['movie_id'], 0) + 1
+    popular = sorted(popularity, key=popularity.get, reverse=True)
+    seen_by_user: Dict[str, set] = {}
+    for row in train:
+        seen_by_user.setdefault(row['user_id'], set()).add(row['movie_id'])
+
+    def evaluate(recommend) -> Dict[str, float]:
+        precisions, recalls, recommended = [], [], set()
+        for user_id in evaluated:
+            relevant = {movie_id for movie_id, rating in test[user_id].items() if rating >= 4}
+            top = [int(movie_id) for movie_id in recommend(user_id)][:args.k]
+            hits = len(relevant.intersection(top))
+            precisions.append(hits / args.k)
+            recalls.append(hits / len(relevant))
+            recommended.update(top)
+        return {
+            f"precision@{args.k}": round(float(np.mean(precisions)), 4) if precisions else 0.0,
+            f"recall@{args.k}": round(float(np.mean(recalls)), 4) if recalls else 0.0,
+            "coverage": round(len(recommended) / n_movies, 4),
+        }
+
+    def recommend_model(user_id: str) -> List[str]:
+        taste = live_engine.context(user_id, args.k).taste()
+        if not taste.has_signal():
+            return recommend_popular(user_id)
+        return [candidate.movie_id for candidate in taste.top(args.k)]
+
+    def recommend_popular(user_id: str) -> List[int]:
+        seen = seen_by_user.get(user_id, set())
+        return [movie_id for movie_id in popular[:args.k + len(seen)] if movie_id not in seen]
+
+    result["quality"] = {"model": evaluate(recommend_model), "popularity_baseline": evaluate(recommend_popular), "evaluated_users": len(evaluated)}
+    print(f"  quality model              {result['quality']['model']}")
+    print(f"  quality popularity         {result['quality']['popularity_baseline']}")
+    return result
+
+def main(argv: Optional[List[str]] = None):
+    args = _parser.parse_args(argv)
+    os.environ['COLLAB_ENGINE'] = args.engine
+    os.environ.setdefault('MODEL_ARTIFACT_DIR', tempfile.mkdtemp(prefix='cinemind-bench-'))
+    # The scheduler and incremental updaters are not exercised here
+    os.environ.setdefault('TRAINING_ENABLED', 'false')
+
+    from benchmarks.fake_supabase import install
+    client = install()
+    from benchmarks.synthetic_data import SCALES
+
+    results = []
+    for scale in args.scales:
+        n_ratings = SCALES.get(scale.lower()) or int(scale)
+        results.append(run_scale(client, n_ratings, args))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote results to {args.output}")
+
+if __name__ == '__main__':
+    main()
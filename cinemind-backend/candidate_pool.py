@@ -0,0 +1,140 @@
+# candidate_pool.py
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from tmdb_service import GENRE_IDS, get_mood_pool_movies
+
+# How long a prefetched pool is served before it is refetched (stale pools keep being served meanwhile).
+CANDIDATE_POOL_TTL_SECONDS = int(os.getenv('CANDIDATE_POOL_TTL_SECONDS', '3600'))
+# How often the background task looks for expired pools.
+CANDIDATE_POOL_CHECK_SECONDS = int(os.getenv('CANDIDATE_POOL_CHECK_SECONDS', '60'))
+# TMDB result pages (20 movies each) prefetched per genre.
+CANDIDATE_POOL_PAGES = int(os.getenv('CANDIDATE_POOL_PAGES', '5'))
+# A multi-genre mood with fewer movies having all its genres is padded with movies having any of them.
+MIN_MOOD_CANDIDATES = 20
+
+# Pool key of the trending movies served when no keyword names a genre
+TRENDING_POOL = ""
+
+@dataclass(frozen=True)
+class GenrePool:
+    """Deduplicated TMDB movies of one genre, most popular first, and when they were fetched."""
+    movies: List[Dict]
+    fetched_at: float
+
+    def expired(self, now: float) -> bool:
+        return now - self.fetched_at >= CANDIDATE_POOL_TTL_SECONDS
+
+class CandidatePool:
+    """
+    Process-local mood candidates for the home screen.
+
+    One pool per genre in GENRE_IDS (plus the trending movies) is prefetched
+    from TMDB at startup and refetched in the background once it is older than
+    CANDIDATE_POOL_TTL_SECONDS. A mood is answered by merging its genres'
+    pools in memory, so the request path never waits on TMDB: an expired pool
+    is still served while its refresh runs, and a pool that is not loaded yet
+    yields no candidates until the scheduled fetch lands.
+    """
+
+    def __init__(self):
+        self._pools: Dict[str, GenrePool] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def movies_for_mood(self, keywords: List[str]) -> List[Dict]:
+        """
+        Movies for the mood's genre keywords, most popular first. Like TMDB's
+        `with_genres=a,b`, movies having every genre come first; when fewer than
+        MIN_MOOD_CANDIDATES do, movies having any of the genres follow.
+        Returns copies, since rerankers annotate the movie dicts.
+        """
+        genres = [keyword for keyword in dict.fromkeys(keywords) if keyword in GENRE_IDS]
+        keys = genres or [TRENDING_POOL]
+        now = time.monotonic()
+        pools = []
+        for key in keys:
+            pool = self._pools.get(key)
+            if pool is None or pool.expired(now):
+                self._schedule(key)
+            if pool is not None:
+                pools.append(pool)
+
+        merged: Dict[int, Dict] = {}
+        for pool in pools:
+            for movie in pool.movies:
+                merged.setdefault(movie['id'], movie)
+        ranked = sorted(merged.values(), key=lambda movie: movie['popularity'], reverse=True)
+        if len(genres) > 1:
+            required = {GENRE_IDS[genre] for genre in genres}
+            matching = [movie for movie in ranked if required.issubset(movie['genre_ids'])]
+            if len(matching) < MIN_MOOD_CANDIDATES:
+                matching += [movie for movie in ranked if not required.issubset(movie['genre_ids'])]
+            ranked = matching
+        return [_public(movie) for movie in ranked]
+
+    def _schedule(self, key: str):
+        """Starts a background fetch of one pool unless one is already running."""
+        if key in self._inflight:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self._fetch(key), name=f"candidate-pool-{key or 'trending'}")
+        except RuntimeError:
+            # No event loop in this thread (e.g. a sync caller); the refresh loop will pick it up
+            return
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    async def _fetch(self, key: str):
+        try:
+            movies = await get_mood_pool_movies(GENRE_IDS.get(key), CANDIDATE_POOL_PAGES)
+        except Exception as e:
+            # Keep serving the previous pool; the next check retries
+            print(f"[CandidatePool] Failed to fetch the '{key or 'trending'}' pool: {e}")
+            return
+        self._pools[key] = GenrePool(movies, time.monotonic())
+
+    async def refresh(self, force: bool = False):
+        """Fetches every missing or expired pool (every pool if `force`) concurrently and waits for them."""
+        now = time.monotonic()
+        for key in [TRENDING_POOL, *GENRE_IDS]:
+            pool = self._pools.get(key)
+            if force or pool is None or pool.expired(now):
+                self._schedule(key)
+        if not self._inflight:
+            return
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        print(f"[CandidatePool] {len(self._pools)} pools, {sum(len(pool.movies) for pool in self._pools.values())} movies.")
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(CANDIDATE_POOL_CHECK_SECONDS)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[CandidatePool] Background refresh failed: {e}")
+
+    def start_background_refresh(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop(), name="candidate-pool-refresh")
+
+    async def stop_background_refresh(self):
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+
+def _public(movie: Dict) -> Dict:
+    """The movie dict in the shape the TMDB list endpoints return, without the merge keys."""
+    return {key: value for key, value in movie.items() if key not in ('genre_ids', 'popularity')}
+
+candidate_pool = CandidatePool()
@@ -0,0 +1,297 @@
+# catalog_index.py
+import os
+import asyncio
+import time
+import threading
+import numpy as np
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from supabase_client import supabase_admin
+from data_loader import iter_table_chunks
+from llm_service import EMOTIONAL_TAGS
+
+# Every tag the tag generator can write, in a fixed order: row t of `tag_bits` is tag t
+INDEXED_TAGS = list(dict.fromkeys(tag for tags in EMOTIONAL_TAGS.values() for tag in tags))
+
+# How often the cheap catalog stamp (movie counts, see `_fetch_stamp`) is checked for changes
+# and ratings written since the last check are added to the popularity.
+CATALOG_INDEX_REFRESH_SECONDS = int(os.getenv('CATALOG_INDEX_REFRESH_SECONDS', '300'))
+# Full rebuilds also recount popularity, picking up deleted ratings the incremental counts miss.
+CATALOG_INDEX_REBUILD_SECONDS = int(os.getenv('CATALOG_INDEX_REBUILD_SECONDS', '86400'))
+
+def genre_names(genres) -> List[str]:
+    """Genres are stored either as names or as {'id', 'name'} dicts."""
+    names = []
+    for genre in genres if isinstance(genres, list) else []:
+        if isinstance(genre, dict) and 'name' in genre:
+            names.append(genre['name'])
+        elif isinstance(genre, str):
+            names.append(genre)
+    return names
+
+class CatalogIndex:
+    """
+    Immutable in-memory index over the cached `movies` table.
+
+    - `ids` (unicode, N): movie ids, sorted, so a movie's catalog index is its
+      `np.searchsorted` position.
+    - `popularity` (int32, N): number of user ratings of each movie.
+    - `by_popularity` (int32, N): catalog indices, most popular first.
+    - `genre_postings`: genre name -> catalog indices of its movies, most
+      popular first (an inverted index, so a genre lookup is one dict access).
+    - `genre_indptr`/`genre_codes`: each movie's genres as codes into
+      `genres`, CSR style, for counting a user's favourite genres.
+    - `tag_bits` (bool, tags x N): one bitset per emotional tag in
+      `INDEXED_TAGS`, so a mood filter is an OR of a few rows and an AND
+      with the candidates. Tags written after the build are set in place
+      (or kept in `_late_tags` for movies the index does not have yet).
+    """
+
+    def __init__(self, ids: np.ndarray, popularity: np.ndarray, genres: List[str], genre_indptr: np.ndarray, genre_codes: np.ndarray, tag_bits: np.ndarray, stamp: Optional[Tuple] = None):
+        self.ids = ids
+        self.popularity = popularity
+        self.genres = genres
+        self.genre_indptr = genre_indptr
+        self.genre_codes = genre_codes
+        self.tag_bits = tag_bits
+        self.stamp = stamp
+        self._tag_rows = {tag: row for row, tag in enumerate(INDEXED_TAGS)}
+        self._late_tags: Dict[str, set] = {}
+        # Stable sort on -popularity keeps ties in id order
+        self.by_popularity = np.argsort(-popularity, kind='stable').astype(np.int32)
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[self.by_popularity] = np.arange(len(ids))
+        rows = np.repeat(np.arange(len(ids), dtype=np.int32), np.diff(genre_indptr))
+        self.genre_postings: Dict[str, np.ndarray] = {}
+        for code, genre in enumerate(genres):
+            members = rows[genre_codes == code]
+            self.genre_postings[genre] = members[np.argsort(rank[members], kind='stable')]
+
+    @classmethod
+    def empty(cls) -> "CatalogIndex":
+        return cls.from_movies([], {})
+
+    @classmethod
+    def from_movies(cls, movies: Iterable[Dict], rating_counts: Dict[str, int], stamp: Optional[Tuple] = None) -> "CatalogIndex":
+        """Builds the index from movie rows (`id`, `genres`, `emotional_tags`) and per-movie rating counts."""
+        movies = list(movies)
+        movie_genres = {str(movie['id']): genre_names(movie.get('genres')) for movie in movies}
+        ids = np.asarray(sorted(movie_genres), dtype=str) if movie_genres else np.empty(0, dtype='U1')
+        genres = sorted({genre for names in movie_genres.values() for genre in names})
+        code_of = {genre: code for code, genre in enumerate(genres)}
+        counts = [len(set(movie_genres[movie_id])) for movie_id in ids]
+        genre_indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        genre_indptr[1:] = np.cumsum(counts)
+        genre_codes = np.asarray([code_of[genre] for movie_id in ids for genre in dict.fromkeys(movie_genres[movie_id])], dtype=np.int32)
+        popularity = np.asarray([rating_counts.get(movie_id, 0) for movie_id in ids], dtype=np.int32)
+
+        tag_rows = {tag: row for row, tag in enumerate(INDEXED_TAGS)}
+        tag_bits = np.zeros((len(INDEXED_TAGS), len(ids)), dtype=bool)
+        if len(ids):
+            for movie in movies:
+                rows = [tag_rows[tag] for tag in movie.get('emotional_tags') or [] if tag in tag_rows]
+                if rows:
+                    tag_bits[rows, np.searchsorted(ids, str(movie['id']))] = True
+        return cls(ids, popularity, genres, genre_indptr, genre_codes, tag_bits, stamp)
+
+    def with_ratings(self, rating_counts: Dict[str, int]) -> "CatalogIndex":
+        """A new index with the given ratings added to the popularity; genres and tags are shared."""
+        indices = self.indices_of(list(rating_counts))
+        counts = np.fromiter(rating_counts.values(), dtype=np.int32, count=len(rating_counts))
+        popularity = self.popularity.copy()
+        np.add.at(popularity, indices[indices >= 0], counts[indices >= 0])
+        index = CatalogIndex(self.ids, popularity, self.genres, self.genre_indptr, self.genre_codes, self.tag_bits, self.stamp)
+        index._late_tags = self._late_tags
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def indices_of(self, movie_ids: Iterable) -> np.ndarray:
+        """Maps movie ids to catalog indices; unknown ids map to -1."""
+        if isinstance(movie_ids, np.ndarray) and movie_ids.dtype.kind == 'U':
+            query = movie_ids
+        else:
+            query = np.asarray([str(movie_id) for movie_id in movie_ids], dtype=str)
+        if not len(self.ids) or not len(query):
+            return np.full(len(query), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.ids, query), len(self.ids) - 1)
+        return np.where(self.ids[positions] == query, positions, -1).astype(np.int64)
+
+    def mask_of(self, movie_ids: Iterable) -> np.ndarray:
+        mask = np.zeros(len(self.ids), dtype=bool)
+        indices = self.indices_of(movie_ids)
+        mask[indices[indices >= 0]] = True
+        return mask
+
+    def favorite_genres(self, movie_ids: Iterable, n: int = 2) -> List[str]:
+        """The `n` genres that occur most often among the given movies."""
+        indices = self.indices_of(movie_ids)
+        indices = indices[indices >= 0]
+        if not len(indices) or not self.genres:
+            return []
+        codes = np.concatenate([self.genre_codes[self.genre_indptr[i]:self.genre_indptr[i + 1]] for i in indices])
+        counts = Counter(codes.tolist())
+        return [self.genres[code] for code, _ in counts.most_common(n)]
+
+    def popular(self, n: int, genres: Optional[List[str]] = None, exclude: Optional[np.ndarray] = None) -> List[str]:
+        """
+        The `n` most popular movie ids, optionally of the given genres (each
+        genre's movies in turn, as before), skipping movies set in `exclude`.
+        """
+        postings = [self.genre_postings.get(genre, np.empty(0, dtype=np.int32)) for genre in genres] if genres is not None else [self.by_popularity]
+        ordered = np.concatenate(postings) if postings else np.empty(0, dtype=np.int32)
+        if exclude is not None and len(ordered):
+            ordered = ordered[~exclude[ordered]]
+        # First occurrence of each movie, in posting order
+        _, first = np.unique(ordered, return_index=True)
+        return self.ids[ordered[np.sort(first)][:n]].tolist()
+
+    def genre_mask(self, genres: Iterable[str]) -> np.ndarray:
+        """Bitset of the movies of any of `genres`."""
+        mask = np.zeros(len(self.ids), dtype=bool)
+        for genre in genres:
+            mask[self.genre_postings.get(genre, np.empty(0, dtype=np.int32))] = True
+        return mask
+
+    def filter_genres(self, movie_ids: List, genres: Iterable[str]) -> np.ndarray:
+        """Boolean keep-array for `movie_ids`: True where the movie is of any of `genres`."""
+        indices = self.indices_of(movie_ids)
+        if not len(self.ids):
+            return np.zeros(len(indices), dtype=bool)
+        return self.genre_mask(genres)[np.maximum(indices, 0)] & (indices >= 0)
+
+    def tag_mask(self, tags: Iterable[str]) -> np.ndarray:
+        """Bitset of the movies carrying any of `tags`."""
+        rows = [self._tag_rows[tag] for tag in tags if tag in self._tag_rows]
+        return np.logical_or.reduce(self.tag_bits[rows], axis=0) if rows else np.zeros(len(self.ids), dtype=bool)
+
+    def filter_tagged(self, movie_ids: List, tags: Iterable[str]) -> np.ndarray:
+        """Boolean keep-array for `movie_ids`: True where the movie carries any of `tags`."""
+        tags = list(tags)
+        indices = self.indices_of(movie_ids)
+        keep = self.tag_mask(tags)[np.maximum(indices, 0)] & (indices >= 0) if len(self.ids) else np.zeros(len(indices), dtype=bool)
+        late = set().union(*(self._late_tags.get(tag, set()) for tag in tags))
+        if late:
+            keep |= np.fromiter((str(movie_id) in late for movie_id in movie_ids), dtype=bool, count=len(movie_ids))
+        return keep
+
+    def has_tagged(self, tags: Iterable[str]) -> bool:
+        tags = list(tags)
+        return bool(self.tag_mask(tags).any()) or any(self._late_tags.get(tag) for tag in tags)
+
+    def set_emotional_tags(self, movie_id, tags: Iterable[str]):
+        """Records tags written after the build: bits are set in place, unknown movies kept aside until the next rebuild."""
+        movie_id = str(movie_id)
+        tags = [tag for tag in tags or [] if tag in self._tag_rows]
+        index = self.indices_of([movie_id])[0]
+        if index >= 0:
+            self.tag_bits[:, index] = False
+            self.tag_bits[[self._tag_rows[tag] for tag in tags], index] = True
+            return
+        for tag in INDEXED_TAGS:
+            self._late_tags.get(tag, set()).discard(movie_id)
+        for tag in tags:
+            self._late_tags.setdefault(tag, set()).add(movie_id)
+
+class CatalogIndexStore:
+    """
+    Process-local holder of the catalog index, loaded by the startup
+    `refresh()` and kept current in the background, so requests never scan
+    `movies`.
+
+    The index is rebuilt when the catalog stamp (number of cached and of
+    untagged movies) changes. `last_updated` is not part of it: it is bumped
+    whenever a movie page is viewed, which changes nothing indexed. Ratings do
+    not trigger a rebuild either: each poll reads only the ratings with an id
+    above the newest one counted and adds them to the popularity, and a full
+    rebuild every CATALOG_INDEX_REBUILD_SECONDS recounts it.
+    """
+
+    def __init__(self):
+        self._index = CatalogIndex.empty()
+        self._loaded = False
+        self._built_at = 0.0
+        # Id of the newest rating counted into the popularity
+        self._rating_cursor = None
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def get(self) -> CatalogIndex:
+        """The current index; empty until the startup `refresh()` has run. Never touches the DB."""
+        return self._index
+
+    def _fetch_stamp(self) -> Tuple:
+        # New movies change the count; tag writes on existing movies change the untagged count
+        movies = supabase_admin.table('movies').select('id', count='exact').limit(1).execute()
+        untagged = supabase_admin.table('movies').select('id', count='exact').is_('emotional_tags', 'null').limit(1).execute()
+        return (movies.count, untagged.count)
+
+    def rebuild(self, stamp: Optional[Tuple] = None) -> CatalogIndex:
+        """Streams the movies' genres and tags and the ratings' movie ids into a new index and swaps it in."""
+        movies = [row for chunk in iter_table_chunks('movies', 'genres, emotional_tags') for row in chunk]
+        rating_counts: Counter = Counter()
+        rating_cursor = None
+        for chunk in iter_table_chunks('user_ratings', 'movie_id'):
+            rating_counts.update(str(row['movie_id']) for row in chunk)
+            rating_cursor = chunk[-1]['id']
+        index = CatalogIndex.from_movies(movies, rating_counts, stamp)
+        self._index, self._rating_cursor, self._built_at = index, rating_cursor, time.monotonic()
+        print(f"[CatalogIndex] Indexed {len(index)} movies in {len(index.genres)} genres.")
+        return index
+
+    def _count_new_ratings(self) -> bool:
+        rating_counts: Counter = Counter()
+        rating_cursor = self._rating_cursor
+        for chunk in iter_table_chunks('user_ratings', 'movie_id', after_key=self._rating_cursor):
+            rating_counts.update(str(row['movie_id']) for row in chunk)
+            rating_cursor = chunk[-1]['id']
+        if not rating_counts:
+            return False
+        self._index, self._rating_cursor = self._index.with_ratings(rating_counts), rating_cursor
+        return True
+
+    def refresh(self) -> bool:
+        """Rebuilds the index if the catalog stamp changed, else adds new ratings. Returns True if a new index was swapped in."""
+        with self._lock:
+            try:
+                stamp = self._fetch_stamp()
+                if self._loaded and stamp == self._index.stamp and time.monotonic() - self._built_at < CATALOG_INDEX_REBUILD_SECONDS:
+                    return self._count_new_ratings()
+                self.rebuild(stamp)
+                return True
+            except Exception as e:
+                print(f"[CatalogIndex] Failed to refresh the catalog index: {e}")
+                return False
+            finally:
+                self._loaded = True
+
+    def set_emotional_tags(self, movie_id, tags: Iterable[str]):
+        """Applies freshly written emotional tags to the current index right away."""
+        with self._lock:
+            self._index.set_emotional_tags(movie_id, tags)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(CATALOG_INDEX_REFRESH_SECONDS)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"[CatalogIndex] Background refresh failed: {e}")
+
+    def start_background_refresh(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop(), name="catalog-index-refresh")
+
+    async def stop_background_refresh(self):
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+
+catalog_index = CatalogIndexStore()
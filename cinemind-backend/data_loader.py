@@ -0,0 +1,74 @@
+# data_loader.py
+import os
+import queue
+import threading
+from typing import Dict, Iterator, List
+
+from supabase_client import supabase_admin
+
+# Rows requested per page. PostgREST may cap a response below this (1000 rows by default),
+# so a short page does not mean the table is exhausted.
+TRAINING_CHUNK_SIZE = int(os.getenv('TRAINING_CHUNK_SIZE', '1000'))
+
+_END_OF_STREAM = object()
+
+def _fetch_page(table: str, columns: str, key_column: str, after_key, chunk_size: int) -> List[Dict]:
+    query = supabase_admin.table(table).select(columns).order(key_column)
+    if after_key is not None:
+        query = query.gt(key_column, after_key)
+    return query.limit(chunk_size).execute().data or []
+
+def iter_table_chunks(table: str, columns: str, key_column: str = 'id', chunk_size: int = TRAINING_CHUNK_SIZE, prefetch: int = 2, after_key=None) -> Iterator[List[Dict]]:
+    """
+    Streams every row of `table` in fixed-size chunks using keyset pagination
+    (`WHERE key > last_key ORDER BY key LIMIT n`), so no offset scan is needed.
+    Paging only stops at an empty page: a page shorter than `chunk_size` may
+    just have been truncated by the server's max-rows cap. With `after_key`
+    only rows whose key is greater are streamed.
+
+    Pages are downloaded on a background thread and handed over through a
+    bounded queue, so the caller can process one chunk while the next
+    `prefetch` pages are being fetched.
+    """
+    if key_column not in [c.strip() for c in columns.split(',')]:
+        columns = f"{key_column}, {columns}"
+
+    chunks: queue.Queue = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+
+    def producer(after_key):
+        short_page = warned = False
+        try:
+            while not stop.is_set():
+                rows = _fetch_page(table, columns, key_column, after_key, chunk_size)
+                if not rows:
+                    break
+                if short_page and not warned:
+                    warned = True
+                    print(f"[DataLoader] {table}: pages are capped below TRAINING_CHUNK_SIZE={chunk_size}; lower it to the server's max rows.")
+                chunks.put(rows)
+                short_page = len(rows) < chunk_size
+                after_key = rows[-1][key_column]
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(_END_OF_STREAM)
+
+    worker = threading.Thread(target=producer, args=(after_key,), name=f"load-{table}", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblock the producer if the consumer stops early
+        stop.set()
+        while worker.is_alive():
+            try:
+                chunks.get_nowait()
+            except queue.Empty:
+                worker.join(timeout=0.1)
@@ -0,0 +1,141 @@
+# http_clients.py
+import os
+import asyncio
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+
+from tmdb_cache import CachingTransport, tmdb_response_cache, TMDB_CACHE_ENABLED
+from rate_limit import RateLimitedTransport, RateLimiter, tmdb_limiter, kobis_limiter
+
+# Connection pool and timeouts of the shared TMDB client. Keep-alive connections are
+# reused across requests, so only the first call to a host pays TCP and TLS setup.
+TMDB_HTTP_MAX_CONNECTIONS = int(os.getenv('TMDB_HTTP_MAX_CONNECTIONS', '100'))
+TMDB_HTTP_MAX_KEEPALIVE = int(os.getenv('TMDB_HTTP_MAX_KEEPALIVE', '20'))
+TMDB_HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('TMDB_HTTP_KEEPALIVE_EXPIRY_SECONDS', '30'))
+TMDB_HTTP_TIMEOUT_SECONDS = float(os.getenv('TMDB_HTTP_TIMEOUT_SECONDS', '10'))
+TMDB_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('TMDB_HTTP_CONNECT_TIMEOUT_SECONDS', '5'))
+TMDB_HTTP2 = os.getenv('TMDB_HTTP2', 'true').lower() != 'false'
+# KOBIS serves plain HTTP/1.1 only, so it gets its own smaller pool without HTTP/2.
+KOBIS_HTTP_MAX_CONNECTIONS = int(os.getenv('KOBIS_HTTP_MAX_CONNECTIONS', '20'))
+KOBIS_HTTP_TIMEOUT_SECONDS = float(os.getenv('KOBIS_HTTP_TIMEOUT_SECONDS', '10'))
+
+class PooledHTTPClient:
+    """
+    One `httpx.AsyncClient` shared by every caller for the lifetime of the app.
+
+    The client is created on first use and closed at shutdown. A client is
+    bound to the event loop it was created on, so each loop (e.g. a script
+    using `asyncio.run`) gets its own, kept until that loop is closed; the
+    app's client is never replaced by another loop's.
+    Every upstream request waits for `limiter` (token bucket plus a cap on
+    requests in flight) and 429s are retried with backoff. `wrap_transport`
+    can layer further behaviour such as response caching on top.
+    """
+
+    def __init__(self, name: str, limits: httpx.Limits, timeout: httpx.Timeout, http2: bool, limiter: RateLimiter, wrap_transport: Optional[Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = None):
+        self.name = name
+        self.limits = limits
+        self.timeout = timeout
+        self.http2 = http2
+        self.limiter = limiter
+        self.wrap_transport = wrap_transport
+        # Client and its connection pool per event loop
+        self._clients: Dict[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, httpx.AsyncHTTPTransport]] = {}
+        self._requests = 0
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None or entry[0].is_closed:
+            # Loops that have finished can no longer use (or close) their clients
+            for finished_loop in [other for other in self._clients if other.is_closed()]:
+                del self._clients[finished_loop]
+            pool_transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+            transport = RateLimitedTransport(pool_transport, self.limiter)
+            if self.wrap_transport:
+                transport = self.wrap_transport(transport)
+            entry = (httpx.AsyncClient(transport=transport, timeout=self.timeout, event_hooks={"request": [self._count_request]}), pool_transport)
+            self._clients[loop] = entry
+        return entry[0]
+
+    async def _count_request(self, request: httpx.Request):
+        self._requests += 1
+
+    async def aclose(self):
+        """Closes this loop's client, and asks loops still running in other threads to close theirs."""
+        current = asyncio.get_running_loop()
+        clients, self._clients = self._clients, {}
+        for loop, (client, _) in clients.items():
+            if client.is_closed:
+                continue
+            if loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    def _current(self) -> Optional[Tuple[httpx.AsyncClient, httpx.AsyncHTTPTransport]]:
+        """The calling loop's client, or the most recently created one when called off a loop."""
+        try:
+            entry = self._clients.get(asyncio.get_running_loop())
+        except RuntimeError:
+            entry = None
+        if entry is None and self._clients:
+            entry = list(self._clients.values())[-1]
+        return entry
+
+    def stats(self) -> Dict:
+        """Pool utilization: open connections (active/idle, HTTP/2 ones), requests in flight and queued for a connection."""
+        entry = self._current()
+        stats = {
+            "client": self.name, "open": entry is not None and not entry[0].is_closed,
+            "http2": self.http2, "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections, "requests_sent": self._requests,
+            "rate_limit": self.limiter.stats(),
+        }
+        # httpx does not expose its connection pool publicly; read it best effort
+        pool = getattr(entry[1], '_pool', None) if entry is not None else None
+        if pool is None:
+            return stats
+        connections = list(pool.connections)
+        pending = list(getattr(pool, '_requests', []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        stats.update({
+            "connections": len(connections),
+            "active_connections": len(connections) - idle,
+            "idle_connections": idle,
+            "http2_connections": sum(1 for connection in connections if 'HTTP/2' in connection.info()),
+            "requests_in_flight": len(pending),
+            "requests_queued": sum(1 for request in pending if request.is_queued()),
+        })
+        return stats
+
+tmdb_http = PooledHTTPClient(
+    "tmdb",
+    limits=httpx.Limits(
+        max_connections=TMDB_HTTP_MAX_CONNECTIONS, max_keepalive_connections=TMDB_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=TMDB_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    ),
+    timeout=httpx.Timeout(TMDB_HTTP_TIMEOUT_SECONDS, connect=TMDB_HTTP_CONNECT_TIMEOUT_SECONDS),
+    http2=TMDB_HTTP2,
+    limiter=tmdb_limiter,
+    wrap_transport=(lambda transport: CachingTransport(transport, tmdb_response_cache)) if TMDB_CACHE_ENABLED else None,
+)
+
+kobis_http = PooledHTTPClient(
+    "kobis",
+    limits=httpx.Limits(
+        max_connections=KOBIS_HTTP_MAX_CONNECTIONS, max_keepalive_connections=KOBIS_HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=TMDB_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    ),
+    timeout=httpx.Timeout(KOBIS_HTTP_TIMEOUT_SECONDS, connect=TMDB_HTTP_CONNECT_TIMEOUT_SECONDS),
+    http2=False,
+    limiter=kobis_limiter,
+)
+
+def http_pool_stats() -> Dict[str, Dict]:
+    return {"tmdb": tmdb_http.stats(), "kobis": kobis_http.stats()}
+
+async def close_http_clients():
+    await tmdb_http.aclose()
+    await kobis_http.aclose()
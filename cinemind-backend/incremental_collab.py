@@ -0,0 +1,277 @@
+# incremental_collab.py
+import os
+import json
+import uuid
+import asyncio
+import numpy as np
+from scipy import sparse
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from supabase_client import supabase_admin
+from data_loader import iter_table_chunks
+from similarity_kernel import top_k_row, update_top_k_row
+from model_store import similarity_models, COLLAB_LIST_TYPE, COLLAB_DELTA_PREFIX, delta_prefix
+from training_scheduler import training_status
+
+INCREMENTAL_COLLAB_ENABLED = os.getenv('INCREMENTAL_COLLAB_ENABLED', 'true').lower() != 'false'
+COLLAB_TOP_K = int(os.getenv('COLLAB_TOP_K', '50'))
+# How often the training leader folds pending rating events into a delta batch.
+INCREMENTAL_COLLAB_POLL_SECONDS = int(os.getenv('INCREMENTAL_COLLAB_POLL_SECONDS', '5'))
+# Rating events processed per batch.
+INCREMENTAL_COLLAB_BATCH_SIZE = 500
+
+# Rating writes are queued for the leader as `cached_lists` rows named "<prefix><uuid>".
+RATING_EVENT_PREFIX = "collab_rating_event:"
+
+class RatingAdjacency:
+    """
+    The users x movies rating matrix as CSR (by user) and CSC (by movie) arrays,
+    plus the ratings written since it was loaded in small per-user/per-movie
+    maps that take precedence over the arrays.
+    """
+
+    def __init__(self, users: List[str], movies: List[str], matrix: sparse.csr_matrix):
+        self.user_ids, self.movie_ids = users, movies
+        self.user_index = {user_id: i for i, user_id in enumerate(users)}
+        self.movie_index = {movie_id: i for i, movie_id in enumerate(movies)}
+        self.by_user = matrix
+        self.by_movie = matrix.tocsc()
+        self.n_base_users, self.n_base_movies = matrix.shape
+        self.norms_sq = np.zeros(max(1024, len(movies)), dtype=np.float64)
+        self.norms_sq[:len(movies)] = np.asarray(self.by_movie.multiply(self.by_movie).sum(axis=0)).ravel()
+        self.written_by_user: Dict[int, Dict[int, float]] = {}
+        self.written_by_movie: Dict[int, Dict[int, float]] = {}
+
+    @property
+    def n_ratings(self) -> int:
+        return self.by_user.nnz
+
+    def _intern(self, ids: List[str], index: Dict[str, int], key: str) -> int:
+        position = index.get(key)
+        if position is None:
+            position = len(ids)
+            index[key] = position
+            ids.append(key)
+        return position
+
+    def _base_rating(self, user: int, movie: int) -> float:
+        if user >= self.n_base_users or movie >= self.n_base_movies:
+            return 0.0
+        start, end = self.by_user.indptr[user], self.by_user.indptr[user + 1]
+        found = np.flatnonzero(self.by_user.indices[start:end] == movie)
+        return float(self.by_user.data[start + found[0]]) if len(found) else 0.0
+
+    def set_rating(self, user_id: str, movie_id: str, rating: float) -> int:
+        """Records a rating write and returns the movie's index."""
+        user = self._intern(self.user_ids, self.user_index, user_id)
+        movie = self._intern(self.movie_ids, self.movie_index, movie_id)
+        if movie >= len(self.norms_sq):
+            self.norms_sq = np.concatenate([self.norms_sq, np.zeros(max(1024, len(self.norms_sq)))])
+        old = self.written_by_user.get(user, {}).get(movie)
+        if old is None:
+            old = self._base_rating(user, movie)
+        self.written_by_user.setdefault(user, {})[movie] = rating
+        self.written_by_movie.setdefault(movie, {})[user] = rating
+        self.norms_sq[movie] += rating ** 2 - old ** 2
+        return movie
+
+    def _raters(self, movie: int) -> Dict[int, float]:
+        raters = {}
+        if movie < self.n_base_movies:
+            start, end = self.by_movie.indptr[movie], self.by_movie.indptr[movie + 1]
+            raters = dict(zip(self.by_movie.indices[start:end].tolist(), self.by_movie.data[start:end].tolist()))
+        raters.update(self.written_by_movie.get(movie, {}))
+        return raters
+
+    def similarity_row(self, movie: int) -> np.ndarray:
+        """Cosine similarity of `movie` with every known movie, from its raters' co-ratings."""
+        n_movies = len(self.movie_ids)
+        raters = self._raters(movie)
+        if not raters or self.norms_sq[movie] <= 0:
+            return np.zeros(n_movies)
+        # Co-rating dot products from the arrays: one sparse product over the raters' rows
+        base_raters = np.fromiter((user for user in raters if user < self.n_base_users), dtype=np.int64)
+        column = np.zeros(self.n_base_users)
+        column[base_raters] = [raters[user] for user in base_raters]
+        dots = np.zeros(n_movies)
+        dots[:self.n_base_movies] = self.by_user.T @ column
+        # Corrections for the raters' ratings written since the arrays were loaded
+        for user, rating in raters.items():
+            for other, value in self.written_by_user.get(user, {}).items():
+                dots[other] += rating * (value - self._base_rating(user, other))
+        norms = np.sqrt(self.norms_sq[:n_movies] * self.norms_sq[movie])
+        similarities = np.divide(dots, norms, out=np.zeros(n_movies), where=norms > 0)
+        similarities[movie] = 0
+        return similarities
+
+def _load_adjacency() -> RatingAdjacency:
+    user_index: Dict[str, int] = {}
+    movie_index: Dict[str, int] = {}
+    users, movies, values = [], [], []
+    for chunk in iter_table_chunks('user_ratings', 'user_id, movie_id, rating'):
+        for row in chunk:
+            if row.get('rating') is None:
+                continue
+            users.append(user_index.setdefault(row['user_id'], len(user_index)))
+            movies.append(movie_index.setdefault(str(row['movie_id']), len(movie_index)))
+            values.append(float(row['rating']))
+    matrix = sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float32), (np.asarray(users, dtype=np.int32), np.asarray(movies, dtype=np.int32))),
+        shape=(len(user_index), len(movie_index)),
+    )
+    return RatingAdjacency(list(user_index), list(movie_index), matrix)
+
+class IncrementalCollabUpdater:
+    """
+    Keeps item-item cosine similarities fresh between full retrains.
+
+    Any worker that stores a rating queues it as a rating event in
+    `cached_lists`. Only the training leader holds the rating adjacency: every
+    INCREMENTAL_COLLAB_POLL_SECONDS it folds the pending events in, recomputes
+    the rated movies' rows, patches their scores into the Top-K lists of the
+    movies they touch, and publishes the changed rows as one delta batch on top
+    of the current collaborative model. Every worker's `similarity_models` poll
+    installs the batches as overrides, so all workers serve the same rows.
+    Events are kept until a retrain that read their ratings replaces the
+    model, then replayed on top of it if it did not. Without a training leader (TRAINING_ENABLED=false everywhere) events are
+    not processed and the next retrain picks the ratings up.
+    """
+
+    def __init__(self, top_k: int = COLLAB_TOP_K):
+        self.top_k = top_k
+        self._adjacency: Optional[RatingAdjacency] = None
+        self._base_version: Optional[str] = None
+        # `last_updated` of the last rating event folded in, and the events done at that instant
+        self._cursor: Optional[str] = None
+        self._cursor_events: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def apply_rating(self, user_id: str, movie_id: str, rating: float):
+        """Queues one rating write for the training leader."""
+        if not INCREMENTAL_COLLAB_ENABLED:
+            return
+        event = {"user_id": user_id, "movie_id": str(movie_id), "rating": float(rating)}
+        try:
+            supabase_admin.table('cached_lists').insert({
+                "list_type": f"{RATING_EVENT_PREFIX}{uuid.uuid4().hex}", "data": json.dumps(event),
+                "last_updated": datetime.now(timezone.utc).isoformat(),
+            }).execute()
+        except Exception as e:
+            print(f"[IncrementalCollab] Failed to queue a rating on movie {movie_id}: {e}")
+
+    def _rebuild(self, base_version: str, snapshot_started: Optional[str]):
+        """Reloads the rating adjacency for a new collaborative model and drops what it supersedes."""
+        self._adjacency = _load_adjacency()
+        self._base_version = base_version
+        self._cursor, self._cursor_events = None, set()
+        # Only events written before training started reading the ratings are
+        # guaranteed to be part of the model. Later ones (including those written
+        # while it trained) are replayed; setting a rating again is idempotent.
+        # Models saved without a snapshot start keep every event.
+        if snapshot_started:
+            supabase_admin.table('cached_lists').delete().like('list_type', f"{RATING_EVENT_PREFIX}%").lt('last_updated', snapshot_started).execute()
+        # Delta batches of older models are never read again.
+        stale = supabase_admin.table('cached_lists').select('list_type').like('list_type', f"{COLLAB_DELTA_PREFIX}%").execute().data or []
+        stale = [row['list_type'] for row in stale if not row['list_type'].startswith(delta_prefix(COLLAB_LIST_TYPE, base_version))]
+        if stale:
+            supabase_admin.table('cached_lists').delete().in_('list_type', stale).execute()
+        print(f"[IncrementalCollab] Loaded {self._adjacency.n_ratings} ratings for incremental updates.")
+
+    def _apply(self, movie_id: str, movie: int, rows: Dict[str, Tuple[List[str], List[float]]]):
+        """Recomputes one rated movie's row and patches it into its neighbours' rows, collecting them in `rows`."""
+        adjacency = self._adjacency
+        scorer = similarity_models.get().scorer
+        neighbors = lambda other_id: rows[other_id] if other_id in rows else scorer.neighbors("collab", other_id)
+
+        similarities = adjacency.similarity_row(movie)
+        old_neighbor_ids, _ = neighbors(movie_id)
+        rows[movie_id] = top_k_row(similarities, adjacency.movie_ids, self.top_k)
+
+        # The rated movie's norm changed, so its score moved against every movie
+        # it shares a rater with (all nonzero entries of its row, which include
+        # the user's other ratings) and possibly dropped for its old neighbours.
+        touched = set(adjacency.movie_ids[i] for i in np.flatnonzero(similarities > 0)) | set(map(str, old_neighbor_ids))
+        touched.discard(movie_id)
+        for neighbor_id in touched:
+            neighbor = adjacency.movie_index.get(neighbor_id)
+            if neighbor is None:
+                continue
+            neighbor_ids, neighbor_scores = neighbors(neighbor_id)
+            recompute = lambda neighbor=neighbor: top_k_row(adjacency.similarity_row(neighbor), adjacency.movie_ids, self.top_k)
+            patched = update_top_k_row(neighbor_ids, neighbor_scores, movie_id, float(similarities[neighbor]), self.top_k, recompute)
+            if patched is not None:
+                rows[neighbor_id] = patched
+
+    def process_events(self) -> int:
+        """Leader only: folds pending rating events into one published delta batch. Returns the number processed."""
+        models = similarity_models.get()
+        base_version = models.versions.get(COLLAB_LIST_TYPE)
+        if not base_version:
+            return 0
+        if self._adjacency is None or base_version != self._base_version:
+            self._rebuild(base_version, models.collab.snapshot_started)
+        # Pick up batches this worker has not applied yet before patching rows on top of them
+        similarity_models.refresh_deltas(COLLAB_LIST_TYPE)
+
+        query = supabase_admin.table('cached_lists').select('list_type, data, last_updated').like('list_type', f"{RATING_EVENT_PREFIX}%")
+        if self._cursor is not None:
+            query = query.gte('last_updated', self._cursor)
+        events = query.order('last_updated').limit(INCREMENTAL_COLLAB_BATCH_SIZE).execute().data or []
+        events = [event for event in events if not (event['last_updated'] == self._cursor and event['list_type'] in self._cursor_events)]
+        if not events:
+            return 0
+        rows: Dict[str, Tuple[List[str], List[float]]] = {}
+        for event in events:
+            rating = json.loads(event['data'])
+            movie = self._adjacency.set_rating(rating['user_id'], rating['movie_id'], rating['rating'])
+            self._apply(rating['movie_id'], movie, rows)
+
+        now = datetime.now(timezone.utc).isoformat()
+        supabase_admin.table('cached_lists').insert({
+            "list_type": f"{delta_prefix(COLLAB_LIST_TYPE, base_version)}{uuid.uuid4().hex}",
+            "data": json.dumps({"rows": {movie_id: [list(ids), [round(score, 6) for score in scores]] for movie_id, (ids, scores) in rows.items()}}),
+            "last_updated": now,
+        }).execute()
+        similarity_models.refresh_deltas(COLLAB_LIST_TYPE)
+        # Events stay queued until a model trained on them replaces this one (see `_rebuild`);
+        # events sharing the last timestamp may continue on the next page, so remember which were done.
+        last_updated = events[-1]['last_updated']
+        done = {event['list_type'] for event in events if event['last_updated'] == last_updated}
+        self._cursor_events = (self._cursor_events | done) if last_updated == self._cursor else done
+        self._cursor = last_updated
+        print(f"[IncrementalCollab] Published {len(rows)} Top-K rows for {len(events)} ratings.")
+        return len(events)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(INCREMENTAL_COLLAB_POLL_SECONDS)
+            if not training_status["is_leader"]:
+                # Another worker leads; free the adjacency until this one takes over
+                self._adjacency, self._base_version = None, None
+                self._cursor, self._cursor_events = None, set()
+                continue
+            try:
+                await asyncio.to_thread(self.process_events)
+            except Exception as e:
+                print(f"[IncrementalCollab] Failed to process rating events: {e}")
+
+    def start(self):
+        """Starts folding rating events into delta batches whenever this worker is the training leader."""
+        if not INCREMENTAL_COLLAB_ENABLED:
+            print("[IncrementalCollab] Disabled by INCREMENTAL_COLLAB_ENABLED.")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="incremental-collab")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+incremental_collab = IncrementalCollabUpdater()
@@ -0,0 +1,321 @@
+# incremental_content.py
+import os
+import json
+import uuid
+import asyncio
+import threading
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from supabase_client import supabase_admin
+from model_store import similarity_models, CONTENT_LIST_TYPE, CONTENT_DELTA_PREFIX, delta_prefix
+from similarity_artifact import ContentVectorArtifact
+from ann_index import LSHIndex
+from similarity_kernel import top_k_row, update_top_k_row
+from recommendation_service import _create_corpus_document, _has_content_features, CONTENT_FEATURE_COLUMNS
+from training_scheduler import training_status
+
+INCREMENTAL_CONTENT_ENABLED = os.getenv('INCREMENTAL_CONTENT_ENABLED', 'true').lower() != 'false'
+CONTENT_TOP_K = int(os.getenv('CONTENT_TOP_K', '50'))
+# How often the training leader looks for newly cached or changed movies.
+INCREMENTAL_CONTENT_POLL_SECONDS = int(os.getenv('INCREMENTAL_CONTENT_POLL_SECONDS', '5'))
+# Movies folded in per batch.
+INCREMENTAL_CONTENT_BATCH_SIZE = 500
+
+class IncrementalContentUpdater:
+    """
+    Inserts newly cached (or changed) movies into the content Top-K lists without a retrain.
+
+    The TF-IDF matrix, vocabulary and IDF weights saved with the content model
+    are memory-mapped as the base rows. A new movie is vectorised against the
+    persisted vocabulary (terms unseen at training time are dropped), scored
+    against every row with one sparse product, and appended as an in-memory
+    delta row. A changed movie's old row is masked out rather than rewritten.
+
+    Only the training leader inserts: every INCREMENTAL_CONTENT_POLL_SECONDS it
+    reads the movies whose `last_updated` moved past its cursor (every cache
+    write bumps it), folds in those whose features changed, and publishes the
+    changed Top-K rows as one delta batch on top of the current content model.
+    Every worker's `similarity_models` poll installs the batches as overrides,
+    so `/similar` answers the same on every worker. A new model or a new leader
+    starts from the model's `snapshot_started`, replaying every movie cached
+    since its training read them (unchanged ones are skipped).
+
+    The LSH index saved with the model answers similarity queries for movies
+    that have no Top-K list yet: only the base rows sharing a bucket with the
+    query, plus the (small) delta rows, are scored exactly.
+
+    `_floors` holds the lowest score of each full Top-K list (0 for lists with
+    free slots), so the lists the movie can enter are found with one vectorised
+    comparison instead of visiting every movie it shares a term with.
+    """
+
+    def __init__(self, top_k: int = CONTENT_TOP_K):
+        self.top_k = top_k
+        self._lock = threading.RLock()
+        self._version: Optional[str] = None
+        self._base: Optional[sparse.csr_matrix] = None
+        self._delta: Optional[sparse.csr_matrix] = None
+        self._counter: Optional[CountVectorizer] = None
+        self._lsh: Optional[LSHIndex] = None
+        self._idf: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._row_of: Dict[str, int] = {}
+        self._active = np.zeros(0, dtype=bool)
+        self._floors = np.zeros(0, dtype=np.float32)
+        # `last_updated` of the last movie folded in, and the ids already seen at that instant
+        self._cursor: Optional[str] = None
+        self._cursor_ids: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self, version: Optional[str]):
+        """Opens the TF-IDF state saved with the given content model version."""
+        vectors = ContentVectorArtifact.load(version) if version else None
+        with self._lock:
+            if vectors is None:
+                self._version = None
+                if version:
+                    print(f"[IncrementalContent] No TF-IDF vectors on this host for content model {version}; incremental inserts disabled until the next retrain.")
+                return
+            content = similarity_models.get().content
+            n_rows, n_terms = len(vectors.ids), len(vectors.terms)
+            self._base = sparse.csr_matrix((vectors.data, vectors.indices, vectors.indptr), shape=(n_rows, n_terms), copy=False)
+            self._delta = sparse.csr_matrix((0, n_terms), dtype=np.float32)
+            self._counter = CountVectorizer(vocabulary={str(term): column for column, term in enumerate(vectors.terms)})
+            self._idf = np.asarray(vectors.idf)
+            self._lsh = LSHIndex.load(version)
+            self._ids = vectors.ids.tolist()
+            self._row_of = {movie_id: row for row, movie_id in enumerate(self._ids)}
+            self._active = np.ones(n_rows, dtype=bool)
+            artifact_rows = content.indices_of(self._ids)
+            known = artifact_rows >= 0
+            row_lengths = np.zeros(n_rows, dtype=np.int64)
+            last_scores = np.zeros(n_rows, dtype=np.float32)
+            if known.any():
+                indptr = np.asarray(content.indptr)
+                row_lengths[known] = indptr[artifact_rows[known] + 1] - indptr[artifact_rows[known]]
+                has_neighbors = row_lengths > 0
+                last_scores[has_neighbors] = np.asarray(content.scores)[indptr[artifact_rows[has_neighbors] + 1] - 1]
+            self._floors = np.where(row_lengths >= self.top_k, last_scores, 0).astype(np.float32)
+            self._version = version
+            self._cursor, self._cursor_ids = None, set()
+        print(f"[IncrementalContent] Loaded TF-IDF vectors for {n_rows} movies ({n_terms} terms).")
+
+    def _vectorize(self, document: str) -> sparse.csr_matrix:
+        counts = self._counter.transform([document]).astype(np.float64)
+        counts.data *= self._idf[counts.indices]
+        return normalize(counts).astype(np.float32)
+
+    def _row_vector(self, row: int) -> sparse.csr_matrix:
+        n_base = self._base.shape[0]
+        return self._base[row] if row < n_base else self._delta[row - n_base]
+
+    def _scores(self, vector: sparse.csr_matrix, exclude_row: Optional[int] = None) -> np.ndarray:
+        """Cosine similarity of a normalised vector with every active row."""
+        scores = np.concatenate([
+            (self._base @ vector.T).toarray().ravel(),
+            (self._delta @ vector.T).toarray().ravel(),
+        ]).astype(np.float32)
+        scores[~self._active] = 0
+        if exclude_row is not None:
+            scores[exclude_row] = 0
+        return scores
+
+    def _append_row(self, movie_id: str, vector: sparse.csr_matrix) -> int:
+        row = len(self._ids)
+        self._delta = sparse.vstack([self._delta, vector], format='csr')
+        self._ids.append(movie_id)
+        self._row_of[movie_id] = row
+        self._active = np.append(self._active, True)
+        self._floors = np.append(self._floors, np.float32(0))
+        return row
+
+    def _set_floor(self, movie_id: str, neighbor_scores: List[float]):
+        row = self._row_of.get(movie_id)
+        if row is not None:
+            self._floors[row] = min(neighbor_scores) if len(neighbor_scores) >= self.top_k else 0
+
+    def apply_movie(self, movie: Dict, rows: Dict[str, Tuple[List[str], List[float]]]) -> bool:
+        """
+        Folds one cached movie's content features into the TF-IDF rows and
+        collects its Top-K row and the neighbour rows it changes in `rows`.
+        Returns False when the movie has no usable features or did not change.
+        """
+        if self._version is None or not _has_content_features(movie):
+            return False
+        document = _create_corpus_document(movie)
+        if not document.strip():
+            return False
+        movie_id = str(movie['id'])
+        with self._lock:
+            vector = self._vectorize(document)
+            if not vector.nnz:
+                return False
+            old_row = self._row_of.get(movie_id)
+            old_scores = None
+            if old_row is not None:
+                old_vector = self._row_vector(old_row)
+                if np.array_equal(old_vector.indices, vector.indices) and np.allclose(old_vector.data, vector.data, atol=1e-6):
+                    return False
+                old_scores = self._scores(old_vector, exclude_row=old_row)
+                self._active[old_row] = False
+
+            row = self._append_row(movie_id, vector)
+            scores = self._scores(vector, exclude_row=row)
+
+            # Lists the movie can enter, plus lists it was already in (its old
+            # score reached their floor) where its score may have changed.
+            affected = scores > self._floors
+            if old_scores is not None:
+                affected[:len(old_scores)] |= (old_scores > 0) & (old_scores >= self._floors[:len(old_scores)])
+            affected[row] = False
+            if old_row is not None:
+                affected[old_row] = False
+
+            scorer = similarity_models.get().scorer
+            neighbors = lambda other_id: rows[other_id] if other_id in rows else scorer.neighbors("content", other_id)
+            old_neighbor_ids, _ = neighbors(movie_id)
+            rows[movie_id] = top_k_row(scores, self._ids, self.top_k)
+            touched = set(self._ids[i] for i in np.flatnonzero(affected)) | set(map(str, old_neighbor_ids))
+            touched.discard(movie_id)
+
+            updated_ids = [movie_id]
+            for neighbor_id in touched:
+                neighbor_row = self._row_of.get(neighbor_id)
+                if neighbor_row is None:
+                    continue
+                neighbor_ids, neighbor_scores = neighbors(neighbor_id)
+                recompute = lambda neighbor_row=neighbor_row: top_k_row(self._scores(self._row_vector(neighbor_row), exclude_row=neighbor_row), self._ids, self.top_k)
+                patched = update_top_k_row(neighbor_ids, neighbor_scores, movie_id, float(scores[neighbor_row]), self.top_k, recompute)
+                if patched is not None:
+                    rows[neighbor_id] = patched
+                    updated_ids.append(neighbor_id)
+
+            for updated_id in updated_ids:
+                self._set_floor(updated_id, rows[updated_id][1])
+        return True
+
+    def _cleanup(self, base_version: str):
+        """Drops the delta batches of older content models, which are never read again."""
+        stale = supabase_admin.table('cached_lists').select('list_type').like('list_type', f"{CONTENT_DELTA_PREFIX}%").execute().data or []
+        stale = [row['list_type'] for row in stale if not row['list_type'].startswith(delta_prefix(CONTENT_LIST_TYPE, base_version))]
+        if stale:
+            supabase_admin.table('cached_lists').delete().in_('list_type', stale).execute()
+
+    def process_movies(self) -> int:
+        """Leader only: folds movies cached since the cursor into one published delta batch. Returns the number changed."""
+        content = similarity_models.get().content
+        base_version = similarity_models.get().versions.get(CONTENT_LIST_TYPE)
+        if not base_version or self._version != content.version:
+            # No content model yet, or its TF-IDF vectors are still loading
+            return 0
+        if self._cursor is None:
+            self._cleanup(base_version)
+            self._cursor = content.snapshot_started or base_version
+        # Pick up batches this worker has not applied yet before patching rows on top of them
+        similarity_models.refresh_deltas(CONTENT_LIST_TYPE)
+
+        movies = (
+            supabase_admin.table('movies').select(f'id, last_updated, {CONTENT_FEATURE_COLUMNS}').gte('last_updated', self._cursor)
+            .order('last_updated').limit(INCREMENTAL_CONTENT_BATCH_SIZE).execute().data or []
+        )
+        movies = [movie for movie in movies if not (movie['last_updated'] == self._cursor and str(movie['id']) in self._cursor_ids)]
+        if not movies:
+            return 0
+        rows: Dict[str, Tuple[List[str], List[float]]] = {}
+        changed = sum(1 for movie in movies if self.apply_movie(movie, rows))
+        if rows:
+            supabase_admin.table('cached_lists').insert({
+                "list_type": f"{delta_prefix(CONTENT_LIST_TYPE, base_version)}{uuid.uuid4().hex}",
+                "data": json.dumps({"rows": {movie_id: [list(ids), [round(float(score), 6) for score in scores]] for movie_id, (ids, scores) in rows.items()}}),
+                "last_updated": datetime.now(timezone.utc).isoformat(),
+            }).execute()
+            similarity_models.refresh_deltas(CONTENT_LIST_TYPE)
+            print(f"[IncrementalContent] Published {len(rows)} content Top-K rows for {changed} changed movies.")
+        # Movies sharing the last timestamp may continue on the next page; remember which were done
+        last_updated = movies[-1]['last_updated']
+        done_ids = {str(movie['id']) for movie in movies if movie['last_updated'] == last_updated}
+        self._cursor_ids = (self._cursor_ids | done_ids) if last_updated == self._cursor else done_ids
+        self._cursor = last_updated
+        return changed
+
+    def similar_movies(self, movie: Dict, top_k: Optional[int] = None) -> Tuple[List[str], List[float]]:
+        """
+        Approximate top-K content neighbours of any movie, vectorised on the fly
+        from its features if it is not in the matrix yet.
+        """
+        if self._version is None:
+            return [], []
+        movie_id = str(movie['id'])
+        with self._lock:
+            row = self._row_of.get(movie_id)
+            if row is not None and self._active[row]:
+                vector = self._row_vector(row)
+            else:
+                document = _create_corpus_document(movie) if _has_content_features(movie) else ''
+                vector = self._vectorize(document) if document.strip() else None
+            if vector is None or not vector.nnz:
+                return [], []
+
+            n_base = self._base.shape[0]
+            base_rows = self._lsh.candidates(vector) if self._lsh is not None else np.arange(n_base)
+            candidates = np.concatenate([base_rows, np.arange(n_base, len(self._ids))])
+            scores = np.concatenate([
+                (self._base[base_rows] @ vector.T).toarray().ravel(),
+                (self._delta @ vector.T).toarray().ravel(),
+            ]).astype(np.float32)
+            scores[~self._active[candidates]] = 0
+            if row is not None:
+                scores[candidates == row] = 0
+            return top_k_row(scores, [self._ids[i] for i in candidates], top_k or self.top_k)
+
+    def _on_model_reload(self, changed_list_types: List[str]):
+        # A retrained content model comes with its own vectors; earlier inserts are part of it
+        if CONTENT_LIST_TYPE in changed_list_types:
+            self._start_load()
+
+    def _start_load(self):
+        def load():
+            try:
+                self.load(similarity_models.get().content.version)
+            except Exception as e:
+                print(f"[IncrementalContent] Failed to load TF-IDF vectors: {e}")
+        threading.Thread(target=load, name="incremental-content-load", daemon=True).start()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(INCREMENTAL_CONTENT_POLL_SECONDS)
+            if not training_status["is_leader"]:
+                # Another worker leads; replay from the model snapshot if this one takes over
+                self._cursor, self._cursor_ids = None, set()
+                continue
+            try:
+                await asyncio.to_thread(self.process_movies)
+            except Exception as e:
+                print(f"[IncrementalContent] Failed to fold in cached movies: {e}")
+
+    def start(self):
+        """Opens the current model's TF-IDF vectors in the background, follows model reloads and, while leading, folds in cached movies."""
+        if not INCREMENTAL_CONTENT_ENABLED:
+            print("[IncrementalContent] Disabled by INCREMENTAL_CONTENT_ENABLED.")
+            return
+        similarity_models.add_reload_listener(self._on_model_reload)
+        self._start_load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="incremental-content")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+incremental_content = IncrementalContentUpdater()
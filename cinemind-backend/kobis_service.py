@@ -1,55 +1,99 @@
 # kobis_service.py
 import os
 import requests
+import httpx
 from datetime import datetime, timedelta
 
+from http_clients import kobis_http
+from singleflight import coalesce
+
 KOBIS_API_KEY = os.environ.get("KOBIS_API_KEY")
 BOX_OFFICE_API_URL = "http://www.kobis.or.kr/kobisopenapi/webservice/rest/boxoffice/searchDailyBoxOfficeList.json"
 MOVIE_INFO_API_URL = "http://www.kobis.or.kr/kobisopenapi/webservice/rest/movie/searchMovieInfo.json"
+PEOPLE_LIST_API_URL = "http://www.kobis.or.kr/kobisopenapi/webservice/rest/people/searchPeopleList.json"
+PEOPLE_INFO_API_URL = "http://www.kobis.or.kr/kobisopenapi/webservice/rest/people/searchPeopleInfo.json"
 
-def get_daily_box_office(repNationCd: str | None = None):
-    """
-    KOBIS API를 호출하여 일일 박스오피스 순위를 가져옵니다.
-    (데이터는 보통 하루 전 기준으로 집계되므로, 어제 날짜를 조회합니다.)
-    repNationCd: 'K' (한국영화), 'F' (외국영화)
-    """
-    # 어제 날짜를 'YYYYMMDD' 형식으로 계산
-    yesterday = datetime.now() - timedelta(days=1)
-    target_dt = yesterday.strftime('%Y%m%d')
+BOX_OFFICE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
 
-    params = {
-        'key': KOBIS_API_KEY,
-        'targetDt': target_dt,
-        'itemPerPage': '10' # 상위 10개 영화
-    }
+def is_kobis_movie_code(movie_id) -> bool:
+    """KOBIS 영화코드(8자리 이상 숫자)인지 확인합니다. TMDB ID는 이보다 짧습니다."""
+    movie_id = str(movie_id)
+    return len(movie_id) > 7 and movie_id.isdigit()
 
-    if repNationCd:
-        params['repNationCd'] = repNationCd
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-    }
+# 각 조회는 (URL, 파라미터, 헤더)를 만드는 함수와 JSON 응답을 해석하는 함수로 나뉘어,
+# 동기 버전(requests)과 비동기 버전(공유 httpx 클라이언트)이 같은 로직을 사용합니다.
+# 비동기 버전은 같은 인자로 동시에 들어온 호출을 하나의 KOBIS 요청으로 합칩니다.
 
+def _get_json(url: str, params: dict, label: str, headers: dict | None = None):
+    """동기 GET 요청. 실패하면 오류를 출력하고 None을 반환합니다."""
     try:
-        response = requests.get(BOX_OFFICE_API_URL, params=params, headers=headers)
+        response = requests.get(url, params=params, headers=headers)
         response.raise_for_status() # 오류가 발생하면 예외를 발생시킴
-        data = response.json()
-        return data.get('boxOfficeResult', {}).get('dailyBoxOfficeList', [])
+        return response.json()
     except requests.exceptions.HTTPError as e:
-        print(f"KOBIS API 호출 중 HTTP 오류 발생: {e.response.status_code} - {e.response.text}")
-        return [] # Empty list for graceful degradation
+        print(f"{label} 중 HTTP 오류 발생: {e.response.status_code} - {e.response.text}")
     except requests.exceptions.ConnectionError as e:
-        print(f"KOBIS API 연결 오류 발생: {e}")
-        return []
+        print(f"{label} 중 연결 오류 발생: {e}")
     except requests.exceptions.Timeout as e:
-        print(f"KOBIS API 요청 시간 초과: {e}")
-        return []
+        print(f"{label} 중 요청 시간 초과: {e}")
     except requests.exceptions.RequestException as e:
-        print(f"KOBIS API 호출 중 알 수 없는 요청 오류 발생: {e}")
-        return []
+        print(f"{label} 중 알 수 없는 요청 오류 발생: {e}")
     except Exception as e:
-        print(f"KOBIS 데이터 처리 중 예외 발생: {e}")
-        return []
+        print(f"{label} 응답 처리 중 예외 발생: {e}")
+    return None
+
+async def _get_json_async(url: str, params: dict, label: str, headers: dict | None = None):
+    """비동기 GET 요청 (공유 KOBIS 클라이언트). 실패하면 오류를 출력하고 None을 반환합니다."""
+    try:
+        response = await kobis_http.client().get(url, params=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        print(f"{label} 중 HTTP 오류 발생: {e.response.status_code} - {e.response.text}")
+    except httpx.TimeoutException as e:
+        print(f"{label} 중 요청 시간 초과: {e}")
+    except httpx.TransportError as e:
+        print(f"{label} 중 연결 오류 발생: {e}")
+    except Exception as e:
+        print(f"{label} 응답 처리 중 예외 발생: {e}")
+    return None
+
+def _box_office_request(repNationCd: str | None):
+    # 어제 날짜를 'YYYYMMDD' 형식으로 계산 (데이터는 보통 하루 전 기준으로 집계됨)
+    yesterday = datetime.now() - timedelta(days=1)
+    params = {
+        'key': KOBIS_API_KEY,
+        'targetDt': yesterday.strftime('%Y%m%d'),
+        'itemPerPage': '10' # 상위 10개 영화
+    }
+    if repNationCd:
+        params['repNationCd'] = repNationCd
+    return params
+
+def _parse_box_office(data) -> list:
+    if data is None:
+        return [] # Empty list for graceful degradation
+    return data.get('boxOfficeResult', {}).get('dailyBoxOfficeList', [])
+
+def get_daily_box_office(repNationCd: str | None = None):
+    """
+    KOBIS API를 호출하여 일일 박스오피스 순위를 가져옵니다.
+    (데이터는 보통 하루 전 기준으로 집계되므로, 어제 날짜를 조회합니다.)
+    repNationCd: 'K' (한국영화), 'F' (외국영화)
+    """
+    return _parse_box_office(_get_json(BOX_OFFICE_API_URL, _box_office_request(repNationCd), "KOBIS 박스오피스 조회", BOX_OFFICE_HEADERS))
+
+@coalesce("kobis_box_office", key=lambda repNationCd=None: repNationCd)
+async def get_daily_box_office_async(repNationCd: str | None = None):
+    """`get_daily_box_office`의 비동기 버전입니다."""
+    return _parse_box_office(await _get_json_async(BOX_OFFICE_API_URL, _box_office_request(repNationCd), "KOBIS 박스오피스 조회", BOX_OFFICE_HEADERS))
+
+def _parse_movie_details(data):
+    if data is None:
+        return None
+    return data.get('movieInfoResult', {}).get('movieInfo', None)
 
 def get_movie_details(movie_cd: str):
     """
@@ -57,31 +101,23 @@ def get_movie_details(movie_cd: str):
     """
     if not movie_cd:
         return None
-        
-    params = {
-        'key': KOBIS_API_KEY,
-        'movieCd': movie_cd
-    }
-    try:
-        response = requests.get(MOVIE_INFO_API_URL, params=params)
-        response.raise_for_status()
-        data = response.json()
-        return data.get('movieInfoResult', {}).get('movieInfo', None)
-    except requests.exceptions.HTTPError as e:
-        print(f"KOBIS 영화 상세 정보 조회 중 HTTP 오류 발생: {e.response.status_code} - {e.response.text}")
-        return None
-    except requests.exceptions.ConnectionError as e:
-        print(f"KOBIS 영화 상세 정보 조회 중 연결 오류 발생: {e}")
-        return None
-    except requests.exceptions.Timeout as e:
-        print(f"KOBIS 영화 상세 정보 조회 중 요청 시간 초과: {e}")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"KOBIS 영화 상세 정보 조회 중 알 수 없는 요청 오류 발생: {e}")
+    return _parse_movie_details(_get_json(MOVIE_INFO_API_URL, {'key': KOBIS_API_KEY, 'movieCd': movie_cd}, "KOBIS 영화 상세 정보 조회"))
+
+@coalesce("kobis_movie_details", key=lambda movie_cd: movie_cd)
+async def get_movie_details_async(movie_cd: str):
+    """`get_movie_details`의 비동기 버전입니다."""
+    if not movie_cd:
         return None
-    except Exception as e:
-        print(f"KOBIS 영화 상세 정보 처리 중 예외 발생: {e}")
+    return _parse_movie_details(await _get_json_async(MOVIE_INFO_API_URL, {'key': KOBIS_API_KEY, 'movieCd': movie_cd}, "KOBIS 영화 상세 정보 조회"))
+
+def _parse_person_code(data):
+    if data is None:
         return None
+    people_list = data.get("peopleListResult", {}).get("peopleList", [])
+    if people_list:
+        # Return the first person found
+        return people_list[0].get("peopleCd")
+    return None
 
 def search_person_by_name(person_nm: str):
     """
@@ -90,41 +126,40 @@ def search_person_by_name(person_nm: str):
     if not KOBIS_API_KEY:
         print("KOBIS_API_KEY가 설정되지 않았습니다.")
         return None
+    return _parse_person_code(_get_json(PEOPLE_LIST_API_URL, {"key": KOBIS_API_KEY, "peopleNm": person_nm}, "KOBIS 영화인 목록 조회"))
 
-    api_url = "http://www.kobis.or.kr/kobisopenapi/webservice/rest/people/searchPeopleList.json"
-    params = {
-        "key": KOBIS_API_KEY,
-        "peopleNm": person_nm,
-    }
-    
-    try:
-        response = requests.get(api_url, params=params)
-        response.raise_for_status()
-        
-        people_list_result = response.json().get("peopleListResult", {})
-        people_list = people_list_result.get("peopleList", [])
-
-        if people_list:
-            # Return the first person found
-            return people_list[0].get("peopleCd")
-        return None
-        
-    except requests.exceptions.HTTPError as e:
-        print(f"KOBIS 영화인 목록 조회 중 HTTP 오류 발생: {e.response.status_code} - {e.response.text}")
-        return None
-    except requests.exceptions.ConnectionError as e:
-        print(f"KOBIS 영화인 목록 조회 중 연결 오류 발생: {e}")
-        return None
-    except requests.exceptions.Timeout as e:
-        print(f"KOBIS 영화인 목록 조회 중 요청 시간 초과: {e}")
+@coalesce("kobis_person_search", key=lambda person_nm: person_nm)
+async def search_person_by_name_async(person_nm: str):
+    """`search_person_by_name`의 비동기 버전입니다."""
+    if not KOBIS_API_KEY:
+        print("KOBIS_API_KEY가 설정되지 않았습니다.")
         return None
-    except requests.exceptions.RequestException as e:
-        print(f"KOBIS 영화인 목록 조회 중 알 수 없는 요청 오류 발생: {e}")
+    return _parse_person_code(await _get_json_async(PEOPLE_LIST_API_URL, {"key": KOBIS_API_KEY, "peopleNm": person_nm}, "KOBIS 영화인 목록 조회"))
+
+def _parse_person_details(data):
+    if data is None:
         return None
-    except Exception as e:
-        print(f"KOBIS 영화인 목록 처리 중 예외 발생: {e}")
+    # 실제 데이터는 중첩된 구조 안에 있음
+    person_info = data.get('peopleInfoResult', {}).get('peopleInfo')
+    if not person_info:
         return None
 
+    # 필모그래피를 'category' 기준으로 그룹화
+    filmos = []
+    for filmo in person_info.get('filmos', []):
+        filmos.append({
+            "movieCd": filmo.get('movieCd'),
+            "movieNm": filmo.get('movieNm'),
+            "category": filmo.get('category'),
+        })
+
+    return {
+        "personCd": person_info.get("peopleCd"),
+        "personNm": person_info.get("peopleNm"),
+        "repRoleNm": person_info.get("repRoleNm"),
+        "filmos": filmos,
+    }
+
 def get_person_details(person_cd: str):
     """
     KOBIS 영화인코드(personCd)를 사용하여 영화인의 상세 정보를 조회합니다.
@@ -132,52 +167,12 @@ def get_person_details(person_cd: str):
     if not KOBIS_API_KEY:
         print("KOBIS_API_KEY가 설정되지 않았습니다.")
         return None
+    return _parse_person_details(_get_json(PEOPLE_INFO_API_URL, {"key": KOBIS_API_KEY, "peopleCd": person_cd}, "KOBIS 영화인 상세 정보 조회"))
 
-    api_url = "http://www.kobis.or.kr/kobisopenapi/webservice/rest/people/searchPeopleInfo.json"
-    params = {
-        "key": KOBIS_API_KEY,
-        "peopleCd": person_cd,
-    }
-
-    try:
-        response = requests.get(api_url, params=params)
-        response.raise_for_status()
-        
-        # 실제 데이터는 중첩된 구조 안에 있음
-        person_info_result = response.json().get('peopleInfoResult', {})
-        person_info = person_info_result.get('peopleInfo')
-
-        if not person_info:
-            return None
-
-        # 필모그래피를 'category' 기준으로 그룹화
-        filmos = []
-        for filmo in person_info.get('filmos', []):
-            filmos.append({
-                "movieCd": filmo.get('movieCd'),
-                "movieNm": filmo.get('movieNm'),
-                "category": filmo.get('category'),
-            })
-
-        return {
-            "personCd": person_info.get("peopleCd"),
-            "personNm": person_info.get("peopleNm"),
-            "repRoleNm": person_info.get("repRoleNm"),
-            "filmos": filmos,
-        }
-
-    except requests.exceptions.HTTPError as e:
-        print(f"KOBIS 영화인 상세 정보 조회 중 HTTP 오류 발생: {e.response.status_code} - {e.response.text}")
-        return None
-    except requests.exceptions.ConnectionError as e:
-        print(f"KOBIS 영화인 상세 정보 조회 중 연결 오류 발생: {e}")
-        return None
-    except requests.exceptions.Timeout as e:
-        print(f"KOBIS 영화인 상세 정보 조회 중 요청 시간 초과: {e}")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"KOBIS 영화인 상세 정보 조회 중 알 수 없는 요청 오류 발생: {e}")
+@coalesce("kobis_person_details", key=lambda person_cd: person_cd)
+async def get_person_details_async(person_cd: str):
+    """`get_person_details`의 비동기 버전입니다."""
+    if not KOBIS_API_KEY:
+        print("KOBIS_API_KEY가 설정되지 않았습니다.")
         return None
-    except Exception as e:
-        print(f"KOBIS 상세 정보 처리 중 예외 발생: {e}")
-        return None
\ No newline at end of file
+    return _parse_person_details(await _get_json_async(PEOPLE_INFO_API_URL, {"key": KOBIS_API_KEY, "peopleCd": person_cd}, "KOBIS 영화인 상세 정보 조회"))
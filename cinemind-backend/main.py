@@ -10,7 +10,14 @@ from fastapi.middleware.cors import CORSMiddleware
 # Import routers from the routers directory
 from routers import auth, movies, users, utils, user_interactions, recommendations, people
 from schemas import ResponseMessage
-from recommendation_service import train_and_save_similarity_matrix
+from training_scheduler import start_training_scheduler, stop_training_scheduler
+from model_store import similarity_models
+from catalog_index import catalog_index
+from candidate_pool import candidate_pool
+from http_clients import close_http_clients
+from incremental_collab import incremental_collab
+from incremental_content import incremental_content
+import asyncio
 
 app = FastAPI(
     title="CineMind API",
@@ -22,14 +29,45 @@ app = FastAPI(
 async def startup_event():
     """
     Actions to perform on application startup.
-    - Train the recommendation model.
+    - Load the last saved similarity models into memory.
+    - Build the in-memory catalog index used by the fallback recommendations.
+    - Start prefetching the per-genre TMDB candidate pools used by the home mood
+      recommendations; the server accepts requests while they load.
+    - Load the TF-IDF vectors used for incremental content updates, and start folding
+      rating events and newly cached movies into collaborative and content delta
+      batches while this worker leads training.
+    - Start the background training scheduler. Training no longer blocks startup;
+      one leader worker retrains the models when they become stale.
     """
     print("Server startup: Initializing background tasks...")
-    # In a real-world scenario, you might run this in a background thread
-    # or as a separate scheduled task to avoid blocking startup.
-    train_and_save_similarity_matrix()
+    await asyncio.to_thread(similarity_models.refresh)
+    similarity_models.start_background_refresh()
+    await asyncio.to_thread(catalog_index.refresh)
+    catalog_index.start_background_refresh()
+    # Keep a reference so the warm-up task is not garbage collected while it runs
+    app.state.candidate_pool_warmup = asyncio.create_task(candidate_pool.refresh(), name="candidate-pool-warmup")
+    candidate_pool.start_background_refresh()
+    incremental_collab.start()
+    incremental_content.start()
+    start_training_scheduler()
     print("Startup tasks complete.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Actions to perform on application shutdown.
+    - Stop the training scheduler and release the leader lease.
+    - Stop the incremental collaborative and content updates.
+    - Close the shared HTTP client's pooled connections.
+    """
+    await stop_training_scheduler()
+    await incremental_collab.stop()
+    await incremental_content.stop()
+    await similarity_models.stop_background_refresh()
+    await catalog_index.stop_background_refresh()
+    await candidate_pool.stop_background_refresh()
+    await close_http_clients()
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
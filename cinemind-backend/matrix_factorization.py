@@ -0,0 +1,217 @@
+# matrix_factorization.py
+import io
+import os
+import json
+import base64
+import numpy as np
+from scipy import sparse
+from typing import Dict, List, Optional, Tuple
+
+from similarity_artifact import save_arrays, load_arrays, artifact_dir, lookup_indices
+
+# Which collaborative engine the home screen uses: "item_cosine" (Top-K neighbour
+# propagation) or "als" (matrix factorization).
+COLLAB_ENGINE = os.getenv('COLLAB_ENGINE', 'item_cosine')
+# The factor model is trained whenever it is served; enable it explicitly to train it for comparison.
+MF_TRAINING_ENABLED = os.getenv('MF_TRAINING_ENABLED', str(COLLAB_ENGINE == 'als')).lower() == 'true'
+# "explicit": ALS on star ratings. "implicit": confidence-weighted ALS on likes and ratings.
+MF_FEEDBACK = os.getenv('MF_FEEDBACK', 'explicit')
+MF_FACTORS = int(os.getenv('MF_FACTORS', '64'))
+MF_ITERATIONS = int(os.getenv('MF_ITERATIONS', '15'))
+MF_REGULARIZATION = float(os.getenv('MF_REGULARIZATION', '0.1'))
+MF_IMPLICIT_ALPHA = float(os.getenv('MF_IMPLICIT_ALPHA', '40'))
+# Upper bound for the per-interaction outer products of one solve block (float64, n x k x k).
+MF_BLOCK_BYTES = int(os.getenv('MF_BLOCK_BYTES', str(64 * 1024 * 1024)))
+
+def _solve_factors(interactions: sparse.csr_matrix, fixed: np.ndarray, regularization: float, implicit: bool, alpha: float, block_bytes: int = MF_BLOCK_BYTES) -> np.ndarray:
+    """
+    One ALS half-step: solves the factors of every row of `interactions` with the
+    other side (`fixed`) held constant.
+
+    Explicit:  (sum_i v_i v_i^T + reg * n_u * I) x_u = sum_i r_ui v_i, over observed i only.
+    Implicit:  (V^T V + sum_i alpha r_ui v_i v_i^T + reg * I) x_u = sum_i (1 + alpha r_ui) v_i.
+
+    Rows are solved in blocks: the outer products of a block's interactions are
+    summed per row with one sparse indicator product and all k x k systems are
+    solved in one batched `np.linalg.solve` call.
+    """
+    n_rows, k = interactions.shape[0], fixed.shape[1]
+    factors = np.zeros((n_rows, k))
+    gram = fixed.T @ fixed if implicit else None
+    identity = np.eye(k)
+    indptr, counts = interactions.indptr, np.diff(interactions.indptr)
+    max_block_nnz = max(1, block_bytes // (k * k * 8))
+
+    start = 0
+    while start < n_rows:
+        # Grow the block until its interactions fill the budget (at least one row)
+        end = int(np.searchsorted(indptr, indptr[start] + max_block_nnz, side='right')) - 1
+        end = min(max(end, start + 1), n_rows)
+        lo, hi = indptr[start], indptr[end]
+        vectors = fixed[interactions.indices[lo:hi]]
+        values = interactions.data[lo:hi].astype(np.float64)
+        if implicit:
+            weights, targets = alpha * values, 1 + alpha * values
+        else:
+            weights, targets = np.ones_like(values), values
+
+        block_counts = counts[start:end]
+        # Row-segment indicator of the block's interactions: (rows x interactions) @ X sums X per row
+        segments = sparse.csr_matrix((np.ones(hi - lo), np.arange(hi - lo), indptr[start:end + 1] - lo), shape=(end - start, hi - lo))
+        outer = np.einsum('nk,nl->nkl', vectors * weights[:, None], vectors).reshape(hi - lo, k * k)
+        lhs = np.asarray(segments @ outer).reshape(end - start, k, k)
+        rhs = np.asarray(segments @ (vectors * targets[:, None]))
+        if implicit:
+            lhs += gram + regularization * identity
+        else:
+            lhs += (regularization * np.maximum(block_counts, 1))[:, None, None] * identity
+        factors[start:end] = np.linalg.solve(lhs, rhs[..., None])[..., 0]
+        start = end
+    return factors
+
+def train_als(interactions: sparse.csr_matrix, factors: int = MF_FACTORS, iterations: int = MF_ITERATIONS, regularization: float = MF_REGULARIZATION, implicit: bool = False, alpha: float = MF_IMPLICIT_ALPHA, seed: int = 0) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Alternating least squares on a users x movies sparse matrix. Only observed
+    entries are fitted (unrated movies are not treated as 0 stars); explicit
+    ratings are centred on their global mean first.
+    Returns (user_factors, item_factors, mean).
+    """
+    interactions = interactions.tocsr().astype(np.float64)
+    mean = 0.0
+    if not implicit and interactions.nnz:
+        mean = float(interactions.data.mean())
+        interactions = interactions.copy()
+        interactions.data -= mean
+    interactions_t = interactions.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    item_factors = rng.normal(scale=0.01, size=(interactions.shape[1], factors))
+    user_factors = np.zeros((interactions.shape[0], factors))
+    for iteration in range(iterations):
+        user_factors = _solve_factors(interactions, item_factors, regularization, implicit, alpha)
+        item_factors = _solve_factors(interactions_t, user_factors, regularization, implicit, alpha)
+
+    if not implicit and interactions.nnz:
+        rows = np.repeat(np.arange(interactions.shape[0]), np.diff(interactions.indptr))
+        predictions = np.einsum('nk,nk->n', user_factors[rows], item_factors[interactions.indices])
+        print(f"ALS finished {iterations} iterations; training RMSE {np.sqrt(np.mean((predictions - interactions.data) ** 2)):.4f}.")
+    return user_factors, item_factors, mean
+
+class FactorModel:
+    """
+    Movie factor matrix of a trained ALS model.
+
+    - `item_factors` (float32, M x k): memory-mapped for serving; scoring a user
+      is one mat-vec product against it.
+    - `item_ids` with the `item_order` permutation for searchsorted lookups.
+
+    User factors are not kept: serving always folds the user in from their
+    current ratings (`user_vector`), so ratings made after training count.
+    """
+
+    ARTIFACT_NAME = "mf"
+    _ARRAY_NAMES = ('item_factors', 'item_ids', 'item_order')
+
+    def __init__(self, item_factors: np.ndarray, item_ids: np.ndarray, item_order: np.ndarray, mean: float = 0.0, regularization: float = MF_REGULARIZATION, implicit: bool = False, alpha: float = MF_IMPLICIT_ALPHA, version: Optional[str] = None):
+        self.item_factors = item_factors
+        self.item_ids = item_ids
+        self.item_order = item_order
+        self.mean = mean
+        self.regularization = regularization
+        self.implicit = implicit
+        self.alpha = alpha
+        self.version = version
+        self._gram: Optional[np.ndarray] = None
+
+    @classmethod
+    def empty(cls) -> "FactorModel":
+        return cls.from_arrays(np.empty((0, 0)), [])
+
+    @classmethod
+    def from_arrays(cls, item_factors: np.ndarray, item_ids: List[str], version: Optional[str] = None, **params) -> "FactorModel":
+        item_ids = np.asarray([str(item_id) for item_id in item_ids], dtype=str)
+        return cls(
+            np.asarray(item_factors, dtype=np.float32), item_ids, np.argsort(item_ids, kind='stable').astype(np.int32),
+            version=version, **params,
+        )
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    def __bool__(self) -> bool:
+        return len(self.item_ids) > 0
+
+    def _params(self) -> Dict:
+        return {"mean": self.mean, "regularization": self.regularization, "implicit": self.implicit, "alpha": self.alpha}
+
+    def to_cached_list(self) -> str:
+        """Compact shared copy for `cached_lists`: a compressed float16 .npz, base64 encoded."""
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer, item_factors=np.asarray(self.item_factors, dtype=np.float16), item_ids=self.item_ids,
+        )
+        return json.dumps({"format": "npz", "params": self._params(), "payload": base64.b64encode(buffer.getvalue()).decode('ascii')})
+
+    @classmethod
+    def from_cached_list(cls, data: str, version: Optional[str] = None) -> "FactorModel":
+        document = json.loads(data)
+        with np.load(io.BytesIO(base64.b64decode(document["payload"]))) as arrays:
+            return cls.from_arrays(arrays["item_factors"], arrays["item_ids"].tolist(), version, **document["params"])
+
+    def save(self, name: str, version: str) -> str:
+        meta = {"version": version, "movies": len(self.item_ids), **self._params()}
+        return save_arrays(name, version, {array_name: getattr(self, array_name) for array_name in self._ARRAY_NAMES}, meta)
+
+    @classmethod
+    def load(cls, name: str, version: str) -> Optional["FactorModel"]:
+        arrays = load_arrays(name, version, cls._ARRAY_NAMES)
+        if arrays is None:
+            return None
+        with open(os.path.join(artifact_dir(name, version), 'meta.json')) as f:
+            meta = json.load(f)
+        params = {key: meta[key] for key in ('mean', 'regularization', 'implicit', 'alpha')}
+        return cls(version=version, **arrays, **params)
+
+    def item_indices(self, movie_ids: List) -> np.ndarray:
+        return lookup_indices(self.item_ids, self.item_order, movie_ids)
+
+    def user_vector(self, interactions: Dict[str, float]) -> Optional[np.ndarray]:
+        """
+        Folds a user in from their current ratings (or implicit interactions)
+        with one k x k solve against the fixed movie factors, so ratings made
+        after training are reflected immediately.
+        """
+        if not self or not interactions:
+            return None
+        indices = self.item_indices(list(interactions.keys()))
+        known = indices >= 0
+        if not known.any():
+            return None
+        values = np.fromiter(interactions.values(), dtype=np.float64, count=len(interactions))[known]
+        vectors = np.asarray(self.item_factors[indices[known]], dtype=np.float64)
+        k = vectors.shape[1]
+        if self.implicit:
+            if self._gram is None:
+                item_factors = np.asarray(self.item_factors, dtype=np.float64)
+                self._gram = item_factors.T @ item_factors
+            lhs = self._gram + (vectors * (self.alpha * values)[:, None]).T @ vectors + self.regularization * np.eye(k)
+            rhs = vectors.T @ (1 + self.alpha * values)
+        else:
+            lhs = vectors.T @ vectors + self.regularization * len(values) * np.eye(k)
+            rhs = vectors.T @ (values - self.mean)
+        return np.linalg.solve(lhs, rhs).astype(np.float32)
+
+    def score(self, user_vector: np.ndarray) -> np.ndarray:
+        """Predicted preference for every movie; for explicit models, relative to the mean rating."""
+        return self.item_factors @ user_vector
+
+    def seen_mask(self, seen_movie_ids) -> np.ndarray:
+        mask = np.zeros(len(self.item_ids), dtype=bool)
+        indices = self.item_indices(list(seen_movie_ids))
+        mask[indices[indices >= 0]] = True
+        return mask
+
+    def scores_for(self, scores: np.ndarray, movie_ids: List) -> np.ndarray:
+        """Looks up the scores of specific movies; movies the model does not know score 0."""
+        indices = self.item_indices(movie_ids)
+        return np.where(indices >= 0, scores[np.maximum(indices, 0)] if len(scores) else 0, 0).astype(np.float32)
@@ -0,0 +1,215 @@
+# model_store.py
+import os
+import json
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from supabase_client import supabase_admin
+from similarity_artifact import TopKArtifact, artifact_version
+from scoring_engine import HybridScoringEngine
+from matrix_factorization import FactorModel, COLLAB_ENGINE
+from precomputed_recommendations import PrecomputedRecommendations, BATCH_RECOMMENDATIONS_ENABLED
+
+COLLAB_LIST_TYPE = "movie_top_k_similarities"
+CONTENT_LIST_TYPE = "content_similar_top_k"
+MF_LIST_TYPE = "mf_factors"
+PRECOMPUTED_LIST_TYPE = "precomputed_recommendations"
+# Incrementally refreshed Top-K rows are published by the training leader as `cached_lists`
+# rows named "<prefix><model version>:<batch id>", on top of the model version they patch.
+COLLAB_DELTA_PREFIX = "movie_top_k_similarities_delta:"
+CONTENT_DELTA_PREFIX = "content_similar_top_k_delta:"
+DELTA_PREFIXES = {COLLAB_LIST_TYPE: COLLAB_DELTA_PREFIX, CONTENT_LIST_TYPE: CONTENT_DELTA_PREFIX}
+
+# Name of the on-disk artifact for each cached_lists model row
+ARTIFACT_NAMES = {
+    COLLAB_LIST_TYPE: "collab", CONTENT_LIST_TYPE: "content",
+    MF_LIST_TYPE: FactorModel.ARTIFACT_NAME, PRECOMPUTED_LIST_TYPE: PrecomputedRecommendations.ARTIFACT_NAME,
+}
+MODEL_CLASSES = {
+    COLLAB_LIST_TYPE: TopKArtifact, CONTENT_LIST_TYPE: TopKArtifact,
+    MF_LIST_TYPE: FactorModel, PRECOMPUTED_LIST_TYPE: PrecomputedRecommendations,
+}
+# The factor model and batch results are only held in memory when they serve the home screen
+SERVED_LIST_TYPES = (
+    [COLLAB_LIST_TYPE, CONTENT_LIST_TYPE]
+    + ([MF_LIST_TYPE] if COLLAB_ENGINE == 'als' else [])
+    + ([PRECOMPUTED_LIST_TYPE] if BATCH_RECOMMENDATIONS_ENABLED else [])
+)
+
+# How often the cheap `last_updated` version stamps are checked for a newer model
+# and for newly published delta batches.
+MODEL_REFRESH_SECONDS = int(os.getenv('MODEL_REFRESH_SECONDS', '10'))
+
+@dataclass(frozen=True)
+class SimilarityModels:
+    """An immutable snapshot of the Top-K similarity artifacts, the factor model and their version stamps."""
+    collab: TopKArtifact = field(default_factory=TopKArtifact.empty)
+    content: TopKArtifact = field(default_factory=TopKArtifact.empty)
+    mf: FactorModel = field(default_factory=FactorModel.empty)
+    precomputed: PrecomputedRecommendations = field(default_factory=PrecomputedRecommendations.empty)
+    versions: Dict[str, Optional[str]] = field(default_factory=dict)
+    scorer: HybridScoringEngine = field(default_factory=lambda: HybridScoringEngine(TopKArtifact.empty(), TopKArtifact.empty()))
+
+class SimilarityModelStore:
+    """
+    Process-local holder for the similarity models.
+
+    Each model version is opened as a memory-mapped artifact from
+    MODEL_ARTIFACT_DIR. If this host does not have the version yet (e.g. it was
+    trained on another machine) the JSON copy in `cached_lists` is downloaded
+    once and converted. A background task polls only the `last_updated` stamps
+    and swaps in a new snapshot after a retrain, so readers never touch the DB.
+
+    The same poll reads the collaborative and content delta batches published
+    since the last one it applied (see `incremental_collab` and
+    `incremental_content`) and installs their rows as overrides, so every
+    worker serves the same incrementally refreshed rows.
+    """
+
+    def __init__(self):
+        self._snapshot = SimilarityModels()
+        self._loaded = False
+        self._reload_lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._reload_listeners: List[Callable[[List[str]], None]] = []
+        # Per delta-patched model: its version and `last_updated` of the last delta batch applied
+        self._delta_bases: Dict[str, Optional[str]] = {}
+        self._delta_cursors: Dict[str, Optional[str]] = {}
+
+    def get(self) -> SimilarityModels:
+        """The current snapshot; empty until the startup `refresh()` has run. Never touches the DB."""
+        return self._snapshot
+
+    def add_reload_listener(self, listener: Callable[[List[str]], None]):
+        """Registers a callback invoked with the changed list types after a new snapshot is swapped in."""
+        self._reload_listeners.append(listener)
+
+    def _fetch_versions(self) -> Dict[str, Optional[str]]:
+        res = supabase_admin.table('cached_lists').select('list_type, last_updated').in_('list_type', SERVED_LIST_TYPES).execute()
+        return {row['list_type']: row.get('last_updated') for row in (res.data or [])}
+
+    def _fetch_model(self, list_type: str, last_updated: str):
+        model_class = MODEL_CLASSES[list_type]
+        name, version = ARTIFACT_NAMES[list_type], artifact_version(last_updated)
+        artifact = model_class.load(name, version)
+        if artifact is not None:
+            return artifact
+
+        res = supabase_admin.table('cached_lists').select('data').eq('list_type', list_type).limit(1).execute()
+        if not res.data or not res.data[0].get('data'):
+            return model_class.empty()
+        artifact = model_class.from_cached_list(res.data[0]['data'], version)
+        try:
+            artifact.save(name, version)
+            return model_class.load(name, version)
+        except OSError as e:
+            print(f"[ModelStore] Could not write {name} artifact, keeping it in memory: {e}")
+            return artifact
+
+    def refresh(self) -> bool:
+        """Reloads any model whose version stamp changed. Returns True if a new snapshot was swapped in."""
+        with self._reload_lock:
+            changed_list_types = []
+            try:
+                try:
+                    versions = self._fetch_versions()
+                except Exception as e:
+                    print(f"[ModelStore] Failed to check model versions: {e}")
+                    return False
+
+                current = self._snapshot
+                models = {COLLAB_LIST_TYPE: current.collab, CONTENT_LIST_TYPE: current.content, MF_LIST_TYPE: current.mf, PRECOMPUTED_LIST_TYPE: current.precomputed}
+                for list_type in SERVED_LIST_TYPES:
+                    if self._loaded and versions.get(list_type) == current.versions.get(list_type):
+                        continue
+                    try:
+                        models[list_type] = self._fetch_model(list_type, versions[list_type]) if versions.get(list_type) else MODEL_CLASSES[list_type].empty()
+                        changed_list_types.append(list_type)
+                    except Exception as e:
+                        print(f"[ModelStore] Failed to load {list_type}: {e}")
+                        versions[list_type] = current.versions.get(list_type)
+
+                if changed_list_types:
+                    # A single reference assignment, so readers never see a half-updated pair
+                    collab, content = models[COLLAB_LIST_TYPE], models[CONTENT_LIST_TYPE]
+                    scorer = current.scorer
+                    if COLLAB_LIST_TYPE in changed_list_types or CONTENT_LIST_TYPE in changed_list_types or not self._loaded:
+                        scorer = HybridScoringEngine(collab, content)
+                        # Incremental rows of a model that was not retrained stay valid
+                        scorer.inherit_overrides(current.scorer, [ARTIFACT_NAMES[t] for t in (COLLAB_LIST_TYPE, CONTENT_LIST_TYPE) if t not in changed_list_types])
+                    self._snapshot = SimilarityModels(collab=collab, content=content, mf=models[MF_LIST_TYPE], precomputed=models[PRECOMPUTED_LIST_TYPE], versions=versions, scorer=scorer)
+                    print(f"[ModelStore] Loaded similarity models (versions: {versions}).")
+            finally:
+                # Also after a failed check: readers are served the current (possibly empty)
+                # snapshot and the next poll retries, instead of every request hitting the DB
+                self._loaded = True
+            self._apply_deltas()
+
+        for listener in self._reload_listeners if changed_list_types else []:
+            try:
+                listener(changed_list_types)
+            except Exception as e:
+                print(f"[ModelStore] Reload listener failed: {e}")
+        return bool(changed_list_types)
+
+    def _apply_deltas(self):
+        for list_type in DELTA_PREFIXES:
+            self._apply_delta_batches(list_type)
+
+    def _apply_delta_batches(self, list_type: str):
+        base = self._snapshot.versions.get(list_type)
+        if not base:
+            return
+        if base != self._delta_bases.get(list_type):
+            # A new model: replay the batches published on top of it
+            self._delta_bases[list_type], self._delta_cursors[list_type] = base, None
+        try:
+            query = supabase_admin.table('cached_lists').select('data, last_updated').like('list_type', f"{delta_prefix(list_type, base)}%")
+            if self._delta_cursors.get(list_type):
+                query = query.gt('last_updated', self._delta_cursors[list_type])
+            batches = query.order('last_updated').execute().data or []
+        except Exception as e:
+            print(f"[ModelStore] Failed to check {list_type} deltas: {e}")
+            return
+        if not batches:
+            return
+        rows = {}
+        for batch in batches:
+            rows.update(json.loads(batch['data']).get('rows', {}))
+        self._snapshot.scorer.override_rows(ARTIFACT_NAMES[list_type], {movie_id: tuple(row) for movie_id, row in rows.items()})
+        self._delta_cursors[list_type] = batches[-1]['last_updated']
+        print(f"[ModelStore] Applied {len(batches)} {list_type} delta batches ({len(rows)} rows).")
+
+    def refresh_deltas(self, list_type: str):
+        """Applies newly published delta batches of one model without waiting for the next poll."""
+        with self._reload_lock:
+            self._apply_delta_batches(list_type)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(MODEL_REFRESH_SECONDS)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"[ModelStore] Background refresh failed: {e}")
+
+    def start_background_refresh(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop(), name="model-refresh")
+
+    async def stop_background_refresh(self):
+        if self._refresh_task is None:
+            return
+        self._refresh_task.cancel()
+        try:
+            await self._refresh_task
+        except asyncio.CancelledError:
+            pass
+        self._refresh_task = None
+
+def delta_prefix(list_type: str, version: str) -> str:
+    return f"{DELTA_PREFIXES[list_type]}{artifact_version(version)}:"
+
+similarity_models = SimilarityModelStore()
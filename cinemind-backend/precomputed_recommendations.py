@@ -0,0 +1,127 @@
+# precomputed_recommendations.py
+import io
+import os
+import json
+import zlib
+import base64
+import numpy as np
+from typing import Dict, List, Optional
+
+from similarity_artifact import save_arrays, load_arrays, lookup_indices
+
+BATCH_RECOMMENDATIONS_ENABLED = os.getenv('BATCH_RECOMMENDATIONS_ENABLED', 'true').lower() != 'false'
+# The batch job runs once this long after the previous run finished (nightly by default).
+BATCH_RECOMMENDATIONS_INTERVAL_MINUTES = int(os.getenv('BATCH_RECOMMENDATIONS_INTERVAL_MINUTES', '1440'))
+# Candidates kept per user; mood candidates outside this list score 0.
+BATCH_RECOMMENDATIONS_TOP_N = int(os.getenv('BATCH_RECOMMENDATIONS_TOP_N', '500'))
+# joblib worker processes for the batch job; 1 scores in-process.
+BATCH_RECOMMENDATIONS_JOBS = int(os.getenv('BATCH_RECOMMENDATIONS_JOBS', '1'))
+
+def interaction_checksum(ratings: Dict[str, float]) -> int:
+    """CRC32 of a user's sorted (movie_id, rating) pairs, so an added, removed or changed rating changes it."""
+    return zlib.crc32(";".join(f"{movie_id}:{float(rating):g}" for movie_id, rating in sorted(ratings.items())).encode())
+
+class UserTopN:
+    """One user's precomputed candidates; quacks like a scorer for `scores_for`."""
+
+    def __init__(self, movie_ids: np.ndarray, scores: np.ndarray):
+        order = np.argsort(movie_ids, kind='stable')
+        self.movie_ids = movie_ids
+        self.scores = scores
+        self._order = order.astype(np.int32)
+
+    def scores_for(self, scores: np.ndarray, movie_ids: List) -> np.ndarray:
+        """Looks up the scores of specific movies; movies outside the top-N score 0."""
+        indices = lookup_indices(self.movie_ids, self._order, movie_ids)
+        return np.where(indices >= 0, scores[np.maximum(indices, 0)] if len(scores) else 0, 0).astype(np.float32)
+
+class PrecomputedRecommendations:
+    """
+    Top-N taste-score candidates of every active user, from the batch job.
+
+    - `indptr` (int64, U+1), `movies` (int32), `scores` (float16): CSR layout,
+      user u's candidates are `catalog_ids[movies[indptr[u]:indptr[u+1]]]`,
+      best first.
+    - `user_ids`/`user_order`: searchsorted lookup of a user's row.
+    - `rating_checksums` (uint32, U): `interaction_checksum` of the user's
+      ratings when scored, and `like_counts` (int32, U) their like count when
+      likes fed the model (-1 otherwise), so an entry made stale by a new or
+      changed rating or a like can be detected and skipped.
+    - `catalog_ids` (unicode): each movie id is stored once.
+    """
+
+    # Renamed with the staleness checksums, so artifacts of the old layout are not opened
+    ARTIFACT_NAME = "precomputed_v2"
+    _ARRAY_NAMES = ('indptr', 'movies', 'scores', 'user_ids', 'user_order', 'rating_checksums', 'like_counts', 'catalog_ids')
+
+    def __init__(self, indptr: np.ndarray, movies: np.ndarray, scores: np.ndarray, user_ids: np.ndarray, user_order: np.ndarray, rating_checksums: np.ndarray, like_counts: np.ndarray, catalog_ids: np.ndarray, version: Optional[str] = None):
+        self.indptr = indptr
+        self.movies = movies
+        self.scores = scores
+        self.user_ids = user_ids
+        self.user_order = user_order
+        self.rating_checksums = rating_checksums
+        self.like_counts = like_counts
+        self.tracks_likes = bool(len(like_counts)) and int(np.max(like_counts)) >= 0
+        self.catalog_ids = catalog_ids
+        self.version = version
+
+    @classmethod
+    def empty(cls) -> "PrecomputedRecommendations":
+        return cls.from_user_lists([], [], [], [])
+
+    @classmethod
+    def from_user_lists(cls, user_ids: List[str], candidate_ids: List[List[str]], candidate_scores: List[List[float]], rating_checksums: List[int], like_counts: Optional[List[int]] = None, version: Optional[str] = None) -> "PrecomputedRecommendations":
+        flat_ids = np.asarray([str(movie_id) for movie_ids in candidate_ids for movie_id in movie_ids], dtype=str)
+        catalog_ids, movies = np.unique(flat_ids, return_inverse=True) if len(flat_ids) else (np.empty(0, dtype='U1'), np.empty(0, dtype=np.int64))
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(movie_ids) for movie_ids in candidate_ids])
+        user_ids = np.asarray([str(user_id) for user_id in user_ids], dtype=str)
+        return cls(
+            indptr, movies.astype(np.int32), np.asarray([score for scores in candidate_scores for score in scores], dtype=np.float16),
+            user_ids, np.argsort(user_ids, kind='stable').astype(np.int32),
+            np.asarray(rating_checksums, dtype=np.uint32), np.asarray(like_counts if like_counts is not None else [-1] * len(user_ids), dtype=np.int32),
+            catalog_ids, version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def __bool__(self) -> bool:
+        return len(self.user_ids) > 0
+
+    def for_user(self, user_id: str, rating_checksum: Optional[int] = None, like_count: Optional[int] = None) -> Optional[UserTopN]:
+        """
+        The user's candidates, or None if they were not scored or have rated
+        (checksum mismatch) or, when likes fed the model, liked since.
+        """
+        index = lookup_indices(self.user_ids, self.user_order, [user_id])[0]
+        if index < 0 or (rating_checksum is not None and int(self.rating_checksums[index]) != rating_checksum):
+            return None
+        if like_count is not None and int(self.like_counts[index]) >= 0 and int(self.like_counts[index]) != like_count:
+            return None
+        row = slice(self.indptr[index], self.indptr[index + 1])
+        return UserTopN(self.catalog_ids[self.movies[row]], np.asarray(self.scores[row], dtype=np.float32))
+
+    def to_cached_list(self) -> str:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **{array_name: getattr(self, array_name) for array_name in self._ARRAY_NAMES})
+        return json.dumps({"format": "npz", "payload": base64.b64encode(buffer.getvalue()).decode('ascii')})
+
+    @classmethod
+    def from_cached_list(cls, data: str, version: Optional[str] = None) -> "PrecomputedRecommendations":
+        document = json.loads(data)
+        with np.load(io.BytesIO(base64.b64decode(document["payload"]))) as arrays:
+            if any(array_name not in arrays for array_name in cls._ARRAY_NAMES):
+                # Written before staleness checksums; the next batch run replaces it
+                return cls.empty()
+            return cls(version=version, **{array_name: arrays[array_name] for array_name in cls._ARRAY_NAMES})
+
+    def save(self, name: str, version: str) -> str:
+        meta = {"version": version, "users": len(self), "candidates": int(len(self.movies))}
+        return save_arrays(name, version, {array_name: getattr(self, array_name) for array_name in self._ARRAY_NAMES}, meta)
+
+    @classmethod
+    def load(cls, name: str, version: str) -> Optional["PrecomputedRecommendations"]:
+        arrays = load_arrays(name, version, cls._ARRAY_NAMES)
+        return cls(version=version, **arrays) if arrays is not None else None
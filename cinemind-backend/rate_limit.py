@@ -0,0 +1,208 @@
+# rate_limit.py
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+# Sustained requests per second, burst size and requests in flight allowed per upstream API,
+# for the whole deployment. TMDB allows roughly 50 requests/s per IP; KOBIS is a small public
+# API and gets far less. The buckets live in each worker process, so every worker enforces
+# its share: the totals divided by WEB_CONCURRENCY (the number of uvicorn/gunicorn workers).
+WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+TMDB_RATE_LIMIT_PER_SECOND = float(os.getenv('TMDB_RATE_LIMIT_PER_SECOND', '40')) / WEB_CONCURRENCY
+TMDB_RATE_LIMIT_BURST = max(1, int(os.getenv('TMDB_RATE_LIMIT_BURST', '40')) // WEB_CONCURRENCY)
+TMDB_MAX_CONCURRENCY = max(1, int(os.getenv('TMDB_MAX_CONCURRENCY', '20')) // WEB_CONCURRENCY)
+KOBIS_RATE_LIMIT_PER_SECOND = float(os.getenv('KOBIS_RATE_LIMIT_PER_SECOND', '10')) / WEB_CONCURRENCY
+KOBIS_RATE_LIMIT_BURST = max(1, int(os.getenv('KOBIS_RATE_LIMIT_BURST', '10')) // WEB_CONCURRENCY)
+KOBIS_MAX_CONCURRENCY = max(1, int(os.getenv('KOBIS_MAX_CONCURRENCY', '5')) // WEB_CONCURRENCY)
+# Retries of a request answered with 429, and the cap of a single backoff wait.
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '3'))
+RATE_LIMIT_MAX_BACKOFF_SECONDS = float(os.getenv('RATE_LIMIT_MAX_BACKOFF_SECONDS', '30'))
+RATE_LIMIT_BASE_BACKOFF_SECONDS = 0.5
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `burst`.
+
+    `acquire` reserves a token and sleeps until it is due, so callers are
+    released one every 1/rate seconds once the burst is spent instead of all
+    at once. Reservations are plain arithmetic on the monotonic clock, which
+    keeps the bucket usable from any event loop.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _reserve(self) -> float:
+        """Takes one token (possibly going into debt) and returns how long to wait for it."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        return max(wait, self._paused_until - now)
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Holds every caller back for `seconds`, e.g. after the upstream answered 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class RateLimiter:
+    """Token bucket plus a cap on requests in flight, shared by every request to one upstream API in this process."""
+
+    def __init__(self, name: str, rate: float, burst: int, max_concurrency: int):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.throttled = 0
+        self.retries = 0
+        self.gave_up = 0
+
+    def semaphore(self) -> asyncio.Semaphore:
+        # Semaphores are bound to one event loop, like the pooled clients
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore, self._loop = asyncio.Semaphore(self.max_concurrency), loop
+        return self._semaphore
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            await self.semaphore().acquire()
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                self.semaphore().release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self.semaphore().release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def stats(self) -> Dict:
+        return {
+            "rate_per_second": self.bucket.rate, "burst": self.bucket.burst, "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight, "waiting": self.waiting,
+            "throttled": self.throttled, "retries": self.retries, "gave_up": self.gave_up,
+        }
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """The Retry-After header as seconds (it may be a number or an HTTP date), or None."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_seconds(attempt: int, response: httpx.Response) -> float:
+    """Retry-After when the upstream sent one, otherwise exponential backoff with jitter."""
+    delay = retry_after_seconds(response)
+    if delay is None:
+        delay = RATE_LIMIT_BASE_BACKOFF_SECONDS * 2 ** attempt * random.uniform(1, 1.5)
+    return min(delay, RATE_LIMIT_MAX_BACKOFF_SECONDS)
+
+class _SlotReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the limiter's in-flight slot back once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, limiter: RateLimiter):
+        self._stream = stream
+        self._limiter = limiter
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._limiter.release()
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the pooled transport so every upstream request waits for `limiter`,
+    and a 429 is retried after its backoff (pausing the whole bucket meanwhile)
+    up to RATE_LIMIT_MAX_RETRIES times before the 429 is returned to the caller.
+    A request keeps its in-flight slot until its response body is closed, so the
+    concurrency cap also covers bodies still being downloaded.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: RateLimiter, max_retries: int = RATE_LIMIT_MAX_RETRIES):
+        self._transport = transport
+        self._limiter = limiter
+        self._max_retries = max_retries
+
+    def _holding_slot(self, response: httpx.Response) -> httpx.Response:
+        if response.is_closed:
+            # Already read into memory (e.g. by a mock transport): its body will never be closed again
+            self._limiter.release()
+            return response
+        response.stream = _SlotReleasingStream(response.stream, self._limiter)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            await self._limiter.acquire()
+            try:
+                response = await self._transport.handle_async_request(request)
+            except BaseException:
+                self._limiter.release()
+                raise
+            if response.status_code != 429:
+                return self._holding_slot(response)
+            self._limiter.throttled += 1
+            if attempt >= self._max_retries:
+                self._limiter.gave_up += 1
+                return self._holding_slot(response)
+            delay = backoff_seconds(attempt, response)
+            try:
+                await response.aclose()
+            finally:
+                self._limiter.release()
+            self._limiter.bucket.pause(delay)
+            self._limiter.retries += 1
+            attempt += 1
+            print(f"[RateLimit] {self._limiter.name} answered 429; retrying {request.url.path} in {delay:.1f}s ({attempt}/{self._max_retries}).")
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+tmdb_limiter = RateLimiter("tmdb", TMDB_RATE_LIMIT_PER_SECOND, TMDB_RATE_LIMIT_BURST, TMDB_MAX_CONCURRENCY)
+kobis_limiter = RateLimiter("kobis", KOBIS_RATE_LIMIT_PER_SECOND, KOBIS_RATE_LIMIT_BURST, KOBIS_MAX_CONCURRENCY)
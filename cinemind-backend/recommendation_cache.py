@@ -0,0 +1,76 @@
+# recommendation_cache.py
+import os
+import uuid
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Hashable, List, Optional, Tuple
+from cachetools import TTLCache
+
+from supabase_client import supabase_admin
+
+RECOMMENDATION_CACHE_TTL_SECONDS = int(os.getenv('RECOMMENDATION_CACHE_TTL_SECONDS', '600'))
+RECOMMENDATION_CACHE_MAX_ENTRIES = int(os.getenv('RECOMMENDATION_CACHE_MAX_ENTRIES', '10000'))
+# `cached_lists` row holding a user's cache generation: "<prefix><user id>"
+GENERATION_PREFIX = "recommendation_cache_generation:"
+
+class RecommendationCache:
+    """
+    Per-(user, mood) cache of finished home recommendations.
+
+    Entries expire after a TTL and the least recently used entry is evicted when
+    the cache is full. Each worker holds its own entries, but a user's
+    generation is shared: it lives in a `cached_lists` row that every worker
+    reads before a lookup and that `invalidate_user` replaces after a rating or
+    like. The generation is part of every key, so one write drops all of that
+    user's moods in every worker; the orphaned entries simply age out.
+    """
+
+    def __init__(self, maxsize: int = RECOMMENDATION_CACHE_MAX_ENTRIES, ttl: int = RECOMMENDATION_CACHE_TTL_SECONDS):
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, user_id: str) -> Optional[str]:
+        """The user's current generation ("" if never invalidated), or None if it could not be read."""
+        try:
+            res = supabase_admin.table('cached_lists').select('data').eq('list_type', f"{GENERATION_PREFIX}{user_id}").limit(1).execute()
+        except Exception as e:
+            print(f"[RecommendationCache] Failed to read the generation of user {user_id}: {e}")
+            return None
+        return res.data[0]['data'] if res.data else ""
+
+    def get(self, user_id: str, generation: Optional[str], variant: Hashable) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(self._key(user_id, generation, variant)) if generation is not None else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(entry)
+
+    def set(self, user_id: str, generation: Optional[str], variant: Hashable, recommendations: List[Dict]):
+        """Stores results computed after `generation` was read; without a generation nothing is cached."""
+        if generation is None:
+            return
+        with self._lock:
+            self._entries[self._key(user_id, generation, variant)] = list(recommendations)
+
+    def invalidate_user(self, user_id: str):
+        try:
+            supabase_admin.table('cached_lists').upsert(
+                {"list_type": f"{GENERATION_PREFIX}{user_id}", "data": uuid.uuid4().hex, "last_updated": datetime.now(timezone.utc).isoformat()},
+                on_conflict='list_type'
+            ).execute()
+        except Exception as e:
+            print(f"[RecommendationCache] Failed to invalidate user {user_id}: {e}")
+
+    @staticmethod
+    def _key(user_id: str, generation: str, variant: Hashable) -> Tuple:
+        return (user_id, generation, variant)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+home_recommendation_cache = RecommendationCache()
@@ -0,0 +1,471 @@
+# recommendation_engine.py
+import time
+import random
+import numpy as np
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from supabase_client import supabase_admin
+from model_store import similarity_models, SimilarityModelStore, SimilarityModels
+from catalog_index import catalog_index, CatalogIndexStore, CatalogIndex
+from scoring_engine import HybridScoringEngine
+from matrix_factorization import FactorModel, COLLAB_ENGINE
+from similarity_kernel import top_k_row
+from kobis_service import is_kobis_movie_code
+from precomputed_recommendations import interaction_checksum
+
+# Hybrid weights and rating transform shared by every recommendation path
+HYBRID_COLLAB_WEIGHT = 0.6
+HYBRID_CONTENT_WEIGHT = 0.4
+# Ratings at or above LIKED_RATING are positive evidence, weighted by (rating - RATING_PIVOT)
+LIKED_RATING = 4
+RATING_PIVOT = 3.5
+
+def hybrid_scores_for_ratings(scorer: HybridScoringEngine, user_ratings: Dict, collab_weight: float = HYBRID_COLLAB_WEIGHT, content_weight: float = HYBRID_CONTENT_WEIGHT) -> np.ndarray:
+    """Hybrid scores of every catalog movie for one user's ratings, with the rated movies zeroed out."""
+    # Each highly rated movie contributes its neighbours weighted by (rating - RATING_PIVOT)
+    movie_weights = {movie_id: rating - RATING_PIVOT for movie_id, rating in user_ratings.items() if rating >= LIKED_RATING}
+    if not movie_weights:
+        return np.zeros(len(scorer), dtype=np.float32)
+    hybrid_scores = scorer.score(movie_weights, collab_weight, content_weight)
+
+    # Filter out movies the user has already seen; slots added since scoring are not in the vector
+    hybrid_scores[scorer.seen_mask(user_ratings.keys())[:len(hybrid_scores)]] = 0
+    return hybrid_scores
+
+def mf_scores_for_interactions(model: FactorModel, user_ratings: Dict, liked_movie_ids: Iterable = ()) -> np.ndarray:
+    """Factor-model scores of every movie for one user, with the rated movies zeroed out."""
+    interactions = dict(user_ratings)
+    if model.implicit:
+        # Same encoding as training: ratings scaled to 0-1, averaged with a like (1.0)
+        interactions = {movie_id: rating / 5.0 for movie_id, rating in user_ratings.items()}
+        for movie_id in map(str, liked_movie_ids):
+            interactions[movie_id] = (interactions[movie_id] + 1.0) / 2 if movie_id in interactions else 1.0
+
+    user_vector = model.user_vector(interactions)
+    if user_vector is None:
+        return np.zeros(len(model), dtype=np.float32)
+    scores = model.score(user_vector)
+    scores[model.seen_mask(user_ratings.keys())] = 0
+    return scores
+
+@dataclass
+class Candidate:
+    """A movie moving through a pipeline; `movie` holds the full movie dict when the source has one."""
+    movie_id: str
+    movie: Optional[Dict] = None
+    score: float = 0.0
+    reason: str = ""
+
+@dataclass
+class TasteScores:
+    """
+    A user's taste-score vector and the object that maps movie ids onto it.
+
+    `movie_ids` is cut to the vector's length: incremental rows can add score
+    slots to the scorer after the scores were computed, and stages index both
+    arrays together.
+    """
+    scores: Optional[np.ndarray]
+    scorer: object
+    movie_ids: np.ndarray
+    source: str
+
+    def __post_init__(self):
+        if self.scores is not None:
+            self.movie_ids = self.movie_ids[:len(self.scores)]
+
+    def has_signal(self) -> bool:
+        return self.scores is not None and bool(self.scores.any())
+
+    def scores_for(self, movie_ids: List) -> np.ndarray:
+        if self.scores is None:
+            return np.zeros(len(movie_ids), dtype=np.float32)
+        return self.scorer.scores_for(self.scores, movie_ids)
+
+    def top(self, n: int, keep: Optional[np.ndarray] = None) -> List[Candidate]:
+        """The `n` best positive-scoring movies (seen movies are already zeroed out), among `keep` if given."""
+        if not self.has_signal():
+            return []
+        scores = self.scores if keep is None else np.where(keep, self.scores, 0)
+        top_ids, top_scores = top_k_row(scores, self.movie_ids, n)
+        return [Candidate(str(movie_id), score=float(score)) for movie_id, score in zip(top_ids, top_scores)]
+
+class RecommendationContext:
+    """
+    Per-request state shared by every stage: one model snapshot and catalog
+    index, and the user's ratings and likes, each loaded at most once. `timings` collects the
+    milliseconds spent in each stage.
+    """
+
+    def __init__(self, engine: "RecommendationEngine", user_id: str, top_n: int, mood_keywords: Sequence[str] = ()):
+        self.engine = engine
+        self.user_id = user_id
+        self.top_n = top_n
+        self.mood_keywords = list(mood_keywords)
+        self.models: SimilarityModels = engine.models.get()
+        self._catalog: Optional[CatalogIndex] = None
+        self.timings: Dict[str, float] = {}
+        self._ratings: Optional[Dict[str, float]] = None
+        self._seen_movie_ids: Optional[set] = None
+        self._liked_movie_ids: Optional[List[str]] = None
+        self._taste: Optional[TasteScores] = None
+
+    def timed(self, name: str, started: float):
+        self.timings[name] = round(self.timings.get(name, 0.0) + (time.perf_counter() - started) * 1000, 3)
+
+    def _load_ratings(self):
+        started = time.perf_counter()
+        res = supabase_admin.table('user_ratings').select('movie_id, rating').eq('user_id', self.user_id).execute()
+        self._seen_movie_ids = {str(item['movie_id']) for item in res.data}
+        self._ratings = {str(item['movie_id']): item['rating'] for item in res.data if item.get('rating') is not None}
+        self.timed("load_ratings", started)
+
+    @property
+    def ratings(self) -> Dict[str, float]:
+        """The user's ratings as {movie_id: rating}."""
+        if self._ratings is None:
+            self._load_ratings()
+        return self._ratings
+
+    @property
+    def seen_movie_ids(self) -> set:
+        if self._seen_movie_ids is None:
+            self._load_ratings()
+        return self._seen_movie_ids
+
+    @property
+    def catalog(self) -> CatalogIndex:
+        """The catalog index, taken once per request (only paths that need it build it)."""
+        if self._catalog is None:
+            self._catalog = self.engine.catalog.get()
+        return self._catalog
+
+    @property
+    def liked_movie_ids(self) -> List[str]:
+        if self._liked_movie_ids is None:
+            started = time.perf_counter()
+            res = supabase_admin.table('user_likes').select('movie_id').eq('user_id', self.user_id).execute()
+            self._liked_movie_ids = [str(item['movie_id']) for item in res.data]
+            self.timed("load_likes", started)
+        return self._liked_movie_ids
+
+    def taste(self) -> TasteScores:
+        if self._taste is None:
+            started = time.perf_counter()
+            self._taste = self.engine.taste_scores(self)
+            self.timed(f"taste_{self._taste.source}", started)
+        return self._taste
+
+    def format_timings(self) -> str:
+        return ", ".join(f"{name}={ms:.1f}ms" for name, ms in self.timings.items())
+
+class Stage(ABC):
+    """A pipeline step: takes the candidates so far and returns the new candidate list."""
+    name = "stage"
+
+    @abstractmethod
+    async def __call__(self, ctx: RecommendationContext, candidates: List[Candidate]) -> List[Candidate]:
+        ...
+
+@dataclass
+class Pipeline:
+    """
+    Candidate sources, then filters, scorers and rerankers, run in that order.
+    Sources append (deduplicated by movie id); the other stages transform the list.
+    """
+    name: str
+    sources: Sequence[Stage]
+    filters: Sequence[Stage] = ()
+    scorers: Sequence[Stage] = ()
+    rerankers: Sequence[Stage] = ()
+
+    async def run(self, ctx: RecommendationContext) -> List[Candidate]:
+        candidates: List[Candidate] = []
+        known = set()
+        for stage in self.sources:
+            started = time.perf_counter()
+            for candidate in await stage(ctx, candidates):
+                if candidate.movie_id not in known:
+                    known.add(candidate.movie_id)
+                    candidates.append(candidate)
+            ctx.timed(f"{self.name}.{stage.name}", started)
+        for stage in [*self.filters, *self.scorers, *self.rerankers]:
+            started = time.perf_counter()
+            candidates = await stage(ctx, candidates)
+            ctx.timed(f"{self.name}.{stage.name}", started)
+        return candidates
+
+# --- candidate sources ---
+
+class MoodMovieSource(Stage):
+    """Prefetched TMDB movies for the request's mood keywords (genre names), from the in-memory candidate pool."""
+    name = "mood_movies"
+
+    async def __call__(self, ctx, candidates):
+        from candidate_pool import candidate_pool
+        movies = candidate_pool.movies_for_mood(ctx.mood_keywords)
+        return [Candidate(str(movie['id']), movie) for movie in movies]
+
+class TasteTopSource(Stage):
+    """The user's best taste-scored movies from the whole catalog, `pool_factor` x top_n of them."""
+    name = "taste_top"
+
+    def __init__(self, pool_factor: int = 5):
+        self.pool_factor = pool_factor
+
+    async def __call__(self, ctx, candidates):
+        return ctx.taste().top(ctx.top_n * self.pool_factor)
+
+class TasteRetrievalSource(Stage):
+    """
+    First stage of two-stage retrieval: the user's `size` best taste-scored
+    movies from the whole local catalog, restricted to the mood's genres with
+    the catalog index's genre postings before ranking, so niche genres still
+    fill the pool. Mood keywords that name no genre leave the genres
+    unfiltered. KOBIS-keyed movies are left out, since home results are
+    opened by TMDB id.
+    """
+    name = "taste_retrieval"
+
+    def __init__(self, size: int = 300):
+        self.size = size
+
+    async def __call__(self, ctx, candidates):
+        taste = ctx.taste()
+        if not taste.has_signal():
+            return []
+        movie_ids = np.asarray(taste.movie_ids, dtype=str)
+        # `is_kobis_movie_code`, vectorised over the whole score vector
+        keep = ~((np.char.str_len(movie_ids) > 7) & np.char.isdigit(movie_ids))
+        catalog = ctx.catalog
+        genres = [keyword for keyword in ctx.mood_keywords if keyword in catalog.genre_postings]
+        if genres:
+            keep &= catalog.filter_genres(movie_ids, genres)
+        return taste.top(self.size, keep)
+
+class OnboardingContentSource(Stage):
+    """Content neighbours of the movies a new user liked during onboarding, each weighted equally."""
+    name = "onboarding_content"
+
+    def __init__(self, pool_factor: int = 2):
+        self.pool_factor = pool_factor
+
+    async def __call__(self, ctx, candidates):
+        scorer = ctx.models.scorer
+        if not scorer.content:
+            return []
+        res = supabase_admin.table('profiles').select('onboarding_liked_movie_ids').eq('id', ctx.user_id).single().execute()
+        liked_ids = (res.data or {}).get('onboarding_liked_movie_ids') or []
+        if not liked_ids:
+            return []
+        scores = scorer.score({str(liked_id): 1.0 for liked_id in liked_ids}, 0.0, 1.0)
+        top = scorer.top_n(scores, ctx.top_n * self.pool_factor, scorer.seen_mask(ctx.seen_movie_ids))
+        return [Candidate(movie_id, score=score) for movie_id, score in top]
+
+class GenrePopularSource(Stage):
+    """
+    Fallback: the most popular unseen movies of the user's two favourite genres
+    (by their ratings above 3), or of the whole catalog when they have none.
+    Served from the in-memory catalog index.
+    """
+    name = "genre_popular"
+
+    async def __call__(self, ctx, candidates):
+        print("[대체 추천 로직 실행] 개인화 추천을 생성할 수 없어, 장르 기반 인기 영화를 추천합니다.")
+        catalog = ctx.catalog
+        seen = catalog.mask_of(ctx.seen_movie_ids)
+        liked_ids = [movie_id for movie_id, rating in ctx.ratings.items() if rating > 3]
+        if not liked_ids:
+            print("[정보] 높은 평점 영화가 없어 전역 인기 영화를 추천합니다.")
+            return [Candidate(movie_id) for movie_id in catalog.popular(ctx.top_n, exclude=seen)]
+
+        top_genres = catalog.favorite_genres(liked_ids, 2)
+        if not top_genres:
+            return []
+        print(f"사용자 선호 장르: {top_genres}")
+        return [Candidate(movie_id) for movie_id in catalog.popular(ctx.top_n, top_genres, exclude=seen)]
+
+# --- filters ---
+
+class SeenFilter(Stage):
+    name = "seen_filter"
+
+    async def __call__(self, ctx, candidates):
+        seen = ctx.seen_movie_ids
+        return [candidate for candidate in candidates if candidate.movie_id not in seen]
+
+class MoodTagFilter(Stage):
+    """
+    Keeps movies tagged with one of the mood's emotional tags, using the
+    catalog index's tag bitsets. An unknown mood, or one no cached movie
+    matches, leaves the candidates unfiltered.
+    """
+    name = "mood_filter"
+
+    def __init__(self, mood_tag: Optional[str]):
+        self.mood_tag = mood_tag
+
+    async def __call__(self, ctx, candidates):
+        if not self.mood_tag:
+            return candidates
+        from llm_service import EMOTIONAL_TAGS
+        target_tags = EMOTIONAL_TAGS.get(self.mood_tag, [])
+        if not target_tags:
+            print(f"'{self.mood_tag}'에 해당하는 감성 태그를 찾을 수 없습니다.")
+            return candidates
+        catalog = ctx.catalog
+        if not catalog.has_tagged(target_tags):
+            print(f"'{self.mood_tag}' 기분에 맞는 영화가 DB에 없습니다.")
+            return candidates
+        keep = catalog.filter_tagged([candidate.movie_id for candidate in candidates], target_tags)
+        return [candidate for candidate, kept in zip(candidates, keep) if kept]
+
+# --- scorers ---
+
+class TasteScorer(Stage):
+    """Scores each candidate with the user's taste-score vector."""
+    name = "taste_scorer"
+
+    async def __call__(self, ctx, candidates):
+        scores = ctx.taste().scores_for([candidate.movie_id for candidate in candidates])
+        for candidate, score in zip(candidates, scores):
+            candidate.score = float(score)
+        return candidates
+
+# --- rerankers ---
+
+class SortByScore(Stage):
+    name = "sort"
+
+    async def __call__(self, ctx, candidates):
+        return sorted(candidates, key=lambda candidate: -candidate.score)
+
+class DailyShuffle(Stage):
+    """Shuffles the best `pool_factor` x top_n candidates with a per-user, per-day seed."""
+    name = "daily_shuffle"
+
+    def __init__(self, pool_factor: int = 2):
+        self.pool_factor = pool_factor
+
+    async def __call__(self, ctx, candidates):
+        pool = candidates[:ctx.top_n * self.pool_factor]
+        # Stable across cache refills within the day
+        random.Random(f"{ctx.user_id}:{datetime.now(timezone.utc).date().isoformat()}").shuffle(pool)
+        return pool
+
+class AssignReasons(Stage):
+    """
+    Labels each candidate: `taste_reason` when it has a positive taste score,
+    otherwise `default_reason`. Candidates left without a reason are dropped.
+    """
+    name = "reasons"
+
+    def __init__(self, taste_reason: str, default_reason: str):
+        self.taste_reason = taste_reason
+        self.default_reason = default_reason
+
+    async def __call__(self, ctx, candidates):
+        labelled = []
+        for candidate in candidates:
+            candidate.reason = self.taste_reason if candidate.score > 0 and self.taste_reason else self.default_reason
+            if candidate.reason:
+                if candidate.movie is not None:
+                    candidate.movie['recommendation_reason'] = candidate.reason
+                labelled.append(candidate)
+        return labelled
+
+class HydrateMovies(Stage):
+    """
+    Fills in the movie dict of candidates that only carry an id (those
+    retrieved from the local catalog) from the cached `movies` rows, in one
+    query, in the shape TMDB list endpoints return. Candidates without a
+    cached row or poster, or keyed by a KOBIS movie code (the client opens
+    these results by TMDB id), are dropped.
+    """
+    name = "hydrate"
+
+    async def __call__(self, ctx, candidates):
+        candidates = [candidate for candidate in candidates if candidate.movie is not None or not is_kobis_movie_code(candidate.movie_id)]
+        missing = [candidate.movie_id for candidate in candidates if candidate.movie is None]
+        if not missing:
+            return candidates
+        res = supabase_admin.table('movies').select('id, title, poster_url, release_date, synopsis').in_('id', missing).execute()
+        rows = {str(row['id']): row for row in res.data or []}
+        hydrated = []
+        for candidate in candidates:
+            if candidate.movie is None:
+                row = rows.get(candidate.movie_id)
+                if not row or not row.get('title') or not row.get('poster_url'):
+                    continue
+                candidate.movie = {
+                    "id": int(row['id']), "title": row['title'], "poster_url": row['poster_url'],
+                    "release_date": row.get('release_date'), "overview": row.get('synopsis'), "vote_average": None,
+                }
+                if candidate.reason:
+                    candidate.movie['recommendation_reason'] = candidate.reason
+            hydrated.append(candidate)
+        return hydrated
+
+class Truncate(Stage):
+    name = "truncate"
+
+    async def __call__(self, ctx, candidates):
+        return candidates[:ctx.top_n]
+
+class RecommendationEngine:
+    """
+    Entry point of every recommendation path. Holds the model store (whose
+    snapshot carries the loaded models) and the catalog index store, and
+    builds taste scores; callers
+    compose `Pipeline`s from the stages above and run them on a context.
+    """
+
+    def __init__(self, models: SimilarityModelStore = similarity_models, catalog: CatalogIndexStore = catalog_index, collab_engine: str = COLLAB_ENGINE, use_precomputed: bool = True):
+        self.models = models
+        self.catalog = catalog
+        self.collab_engine = collab_engine
+        self.use_precomputed = use_precomputed
+
+    def context(self, user_id: str, top_n: int, mood_keywords: Sequence[str] = ()) -> RecommendationContext:
+        return RecommendationContext(self, user_id, top_n, mood_keywords)
+
+    def taste_model_ready(self, ctx: RecommendationContext) -> bool:
+        """Whether the collaborative model `taste_scores` falls back to (ALS factors or the item-item scorer) is loaded."""
+        return bool(len(ctx.models.mf if self.collab_engine == 'als' else ctx.models.scorer))
+
+    def taste_scores(self, ctx: RecommendationContext) -> TasteScores:
+        """
+        The nightly precomputed candidates when they are still current (same
+        ratings checksum and, for like-fed models, like count), otherwise live scores from the configured collaborative
+        engine: item-item neighbour propagation or the ALS factor model.
+        """
+        precomputed = ctx.models.precomputed
+        if self.use_precomputed and precomputed:
+            like_count = len(ctx.liked_movie_ids) if precomputed.tracks_likes else None
+            entry = precomputed.for_user(ctx.user_id, interaction_checksum(ctx.ratings), like_count)
+            if entry is not None:
+                return TasteScores(entry.scores, entry, entry.movie_ids, "precomputed")
+        if self.collab_engine == 'als':
+            model = ctx.models.mf
+            if not model:
+                print("[Warning] Factor model not found. Cannot calculate taste scores.")
+                return TasteScores(None, model, model.item_ids, "als")
+            liked_movie_ids = ctx.liked_movie_ids if model.implicit else []
+            return TasteScores(mf_scores_for_interactions(model, ctx.ratings, liked_movie_ids), model, model.item_ids, "als")
+        scorer = ctx.models.scorer
+        if not len(scorer):
+            print("[Warning] Similarity data not found. Cannot calculate taste scores.")
+            return TasteScores(None, scorer, scorer.movie_ids, "hybrid")
+        return TasteScores(hybrid_scores_for_ratings(scorer, ctx.ratings), scorer, scorer.movie_ids, "hybrid")
+
+    async def run(self, ctx: RecommendationContext, pipeline: Pipeline) -> List[Candidate]:
+        started = time.perf_counter()
+        candidates = await pipeline.run(ctx)
+        ctx.timed(pipeline.name, started)
+        print(f"[RecommendationEngine] {pipeline.name} for {ctx.user_id}: {len(candidates)} results ({ctx.format_timings()})")
+        return candidates
+
+recommendation_engine = RecommendationEngine()
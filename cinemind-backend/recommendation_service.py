@@ -1,566 +1,454 @@
 # recommendation_service.py
-import json
-import pandas as pd
+import os
+import asyncio
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from supabase_client import supabase, supabase_admin
-from kobis_service import get_daily_box_office, get_movie_details
-from collections import Counter
-from typing import List, Dict, Optional, Tuple
-import random
+from supabase_client import supabase_admin
+from data_loader import iter_table_chunks
+from model_store import similarity_models, ARTIFACT_NAMES, COLLAB_LIST_TYPE, CONTENT_LIST_TYPE, MF_LIST_TYPE, PRECOMPUTED_LIST_TYPE
+from similarity_artifact import TopKArtifact, ContentVectorArtifact, artifact_version
+from scoring_engine import HybridScoringEngine
+from recommendation_cache import home_recommendation_cache
+from similarity_kernel import compute_top_k_neighbors, top_k_row
+from matrix_factorization import FactorModel, train_als, COLLAB_ENGINE, MF_FEEDBACK
+from ann_index import LSHIndex
+from precomputed_recommendations import PrecomputedRecommendations, interaction_checksum, BATCH_RECOMMENDATIONS_TOP_N, BATCH_RECOMMENDATIONS_JOBS
+from recommendation_engine import (
+    recommendation_engine, Pipeline, hybrid_scores_for_ratings, mf_scores_for_interactions,
+    MoodMovieSource, TasteTopSource, TasteRetrievalSource, OnboardingContentSource, GenrePopularSource,
+    SeenFilter, MoodTagFilter, TasteScorer, SortByScore, DailyShuffle, AssignReasons, HydrateMovies, Truncate,
+)
+from joblib import Parallel, delayed
+from typing import List, Dict, Optional, Tuple, Iterable
+from datetime import datetime, timezone
 
 # --- NEW HYBRID RECOMMENDATION LOGIC FOR HOME SCREEN ---
 
-def _get_similarity_data() -> Tuple[Dict, Dict]:
-    """Helper to fetch cached similarity data from the DB."""
-    try:
-        collab_sim_res = supabase_admin.table('cached_lists').select('data').eq('list_type', "movie_top_k_similarities").single().execute()
-        collab_similarities = json.loads(collab_sim_res.data['data']) if collab_sim_res.data and collab_sim_res.data.get('data') else {}
-    except Exception:
-        collab_similarities = {}
-
-    try:
-        content_sim_res = supabase_admin.table('cached_lists').select('data').eq('list_type', "content_similar_top_k").single().execute()
-        content_similarities = json.loads(content_sim_res.data['data']) if content_sim_res.data and content_sim_res.data.get('data') else {}
-    except Exception:
-        content_similarities = {}
-        
-    return collab_similarities, content_similarities
-
-def _calculate_hybrid_scores(user_id: str) -> Tuple[Optional[Counter], set]:
-    """Calculates hybrid recommendation scores for all movies based on a user's ratings."""
-    collab_similarities, content_similarities = _get_similarity_data()
-    if not collab_similarities and not content_similarities:
-        print("[Warning] Similarity data not found. Cannot calculate taste scores.")
-        return None, set()
-
-    ratings_response = supabase_admin.table('user_ratings').select('movie_id, rating').eq('user_id', user_id).execute()
-    user_ratings = {item['movie_id']: item['rating'] for item in ratings_response.data}
-    seen_movie_ids = set(user_ratings.keys())
-    
-    highly_rated_movies = {movie_id: rating for movie_id, rating in user_ratings.items() if rating >= 4}
-    if not highly_rated_movies:
-        return Counter(), seen_movie_ids
-
-    hybrid_scores = Counter()
-    COLLAB_WEIGHT = 0.6
-    CONTENT_WEIGHT = 0.4
-
-    for movie_id, rating in highly_rated_movies.items():
-        # Collaborative filtering scores
-        if movie_id in collab_similarities:
-            for similar_movie in collab_similarities.get(movie_id, []):
-                hybrid_scores[similar_movie["id"]] += similar_movie["score"] * (rating - 3.5) * COLLAB_WEIGHT
-        
-        # Content-based filtering scores
-        if movie_id in content_similarities:
-            for similar_movie in content_similarities.get(movie_id, []):
-                hybrid_scores[similar_movie["id"]] += similar_movie["score"] * (rating - 3.5) * CONTENT_WEIGHT
-    
-    # Filter out movies the user has already seen
-    for seen_id in seen_movie_ids:
-        if seen_id in hybrid_scores:
-            del hybrid_scores[seen_id]
-            
-    return hybrid_scores, seen_movie_ids
-
 async def get_home_hybrid_recommendations(user_id: str, mood_keywords: List[str], top_n: int = 20) -> List[Dict]:
     """
     Generates hybrid recommendations for the home screen.
     Returns a list of movie dictionaries, each including a 'recommendation_reason'.
+    Results are cached per (user, mood) until they expire or the user rates/likes a movie.
     """
-    from tmdb_service import get_movies_for_home_mood
-    
+    cache_variant = (tuple(mood_keywords), top_n)
+    # Read before computing, so results racing a rating are stored under the generation it replaces
+    generation = await asyncio.to_thread(home_recommendation_cache.generation, user_id)
+    cached = home_recommendation_cache.get(user_id, generation, cache_variant)
+    if cached is not None:
+        return cached
+
+    recommendations = await _compute_home_hybrid_recommendations(user_id, mood_keywords, top_n)
+    # Empty results usually mean an upstream failure, so let the next request retry
+    if recommendations:
+        home_recommendation_cache.set(user_id, generation, cache_variant, recommendations)
+    return recommendations
+
+# Catalog movies the home taste pipeline retrieves from the user's score vector before filtering and reranking
+HOME_RETRIEVAL_SIZE = int(os.getenv('HOME_RETRIEVAL_SIZE', '300'))
+
+# Stages shared by the home pipelines; the reasons depend on the request's mood
+_HOME_SOURCES = [MoodMovieSource()]
+_HOME_FILTERS = [SeenFilter()]
+
+async def _compute_home_hybrid_recommendations(user_id: str, mood_keywords: List[str], top_n: int) -> List[Dict]:
     print(f"--- 홈 화면 하이브리드 추천 생성 시작 (사용자: {user_id}, 기분: {mood_keywords}) ---")
-    
-    scores, seen_movie_ids = _calculate_hybrid_scores(user_id)
-    recommendations = []
+    ctx = recommendation_engine.context(user_id, top_n, mood_keywords)
 
     mood_reason = f"#{mood_keywords[0]} 추천" if mood_keywords else ""
     taste_reason = "#취향저격"
-    fallback_reason = "#CineMind 추천"
     cold_start_reason = f"#{mood_keywords[0]} 인기 영화" if mood_keywords else "#지금 주목할 영화"
 
-    if scores is None or not scores:
+    if not ctx.taste().has_signal():
         print("[DEBUG] 2. 취향 점수 모델을 찾을 수 없거나 평점이 부족하여, 인기 영화로 대체합니다.")
-        movies = await get_movies_for_home_mood(mood_keywords)
-        for m in movies:
-            if str(m['id']) not in seen_movie_ids:
-                m['recommendation_reason'] = cold_start_reason
-                recommendations.append(m)
-        return recommendations[:top_n]
-
-    mood_candidate_movies = await get_movies_for_home_mood(mood_keywords)
-    print(f"[DEBUG] 3. 선택한 기분({mood_keywords})에 맞는 영화 후보군 {len(mood_candidate_movies)}편을 가져옴.")
-    
-    if not mood_candidate_movies:
-        return []
-
-    reranked_movies = []
-    for movie in mood_candidate_movies:
-        movie_id = str(movie['id'])
-        if movie_id not in seen_movie_ids:
-            score = scores.get(movie_id, 0)
-            reranked_movies.append((movie, score))
-    
-    reranked_movies.sort(key=lambda x: x[1], reverse=True)
-    
-    high_quality_pool = reranked_movies[:top_n * 2]
-    random.shuffle(high_quality_pool)
-    
-    print(f"[DEBUG] 4. 취향 점수 상위 {len(high_quality_pool)}편을 무작위로 섞어 추천합니다.")
-    for movie_tuple in high_quality_pool:
-        movie_obj = movie_tuple[0]
-        score = movie_tuple[1]
-        
-        final_reason = ""
-        if score > 0:
-            final_reason = taste_reason
-        elif mood_reason:
-            final_reason = mood_reason
-        
-        if final_reason:
-            movie_obj['recommendation_reason'] = final_reason
-            recommendations.append(movie_obj)
-        
-        if len(recommendations) >= top_n:
-            break
-            
-    if len(recommendations) < top_n:
-        print(f"[DEBUG] 5. 추천 결과가 부족하여 대체 추천 로직 실행.")
-        # This part can be improved later if needed.
-        pass
-
-    print(f"[DEBUG] 6. 최종 추천 영화 목록 ({len(recommendations)}편).")
-    return recommendations[:top_n]
-
-
-def train_and_save_similarity_matrix(top_k: int = 50):
+        pipeline = Pipeline("home_cold_start", _HOME_SOURCES, _HOME_FILTERS, rerankers=[AssignReasons("", cold_start_reason), Truncate()])
+    else:
+        # Mood candidates plus the best-scored catalog movies of the mood's genres, ranked by
+        # taste score; the best 2 x top_n are shuffled daily
+        pipeline = Pipeline(
+            "home_taste", [*_HOME_SOURCES, TasteRetrievalSource(size=HOME_RETRIEVAL_SIZE)], _HOME_FILTERS, [TasteScorer()],
+            [SortByScore(), DailyShuffle(pool_factor=2), AssignReasons(taste_reason, mood_reason), HydrateMovies(), Truncate()],
+        )
+    candidates = await recommendation_engine.run(ctx, pipeline)
+    print(f"[DEBUG] 6. 최종 추천 영화 목록 ({len(candidates)}편).")
+    return [candidate.movie for candidate in candidates]
+
+
+def _build_sparse_user_item_matrix(rating_chunks: Iterable[List[Dict]]) -> Tuple[Optional[sparse.csr_matrix], List[str], List[str]]:
+    """
+    Builds a users x movies CSR matrix directly from chunks of `user_ratings` rows.
+    Only the observed ratings are stored, so memory grows with the number of
+    ratings rather than users x movies. Each chunk is converted to compact
+    arrays as soon as it arrives. Duplicate (user, movie) pairs are averaged,
+    matching the previous `pivot_table` behaviour.
+    Returns (matrix, movie ids of the columns, user ids of the rows).
+    """
+    user_index: Dict[str, int] = {}
+    movie_index: Dict[str, int] = {}
+    row_blocks, col_blocks, value_blocks = [], [], []
+
+    for chunk in rating_chunks:
+        row_idx, col_idx, values = [], [], []
+        for row in chunk:
+            if row.get('rating') is None:
+                continue
+            row_idx.append(user_index.setdefault(row['user_id'], len(user_index)))
+            col_idx.append(movie_index.setdefault(str(row['movie_id']), len(movie_index)))
+            values.append(row['rating'])
+        row_blocks.append(np.asarray(row_idx, dtype=np.int32))
+        col_blocks.append(np.asarray(col_idx, dtype=np.int32))
+        value_blocks.append(np.asarray(values, dtype=np.float32))
+
+    if not movie_index:
+        return None, [], []
+
+    shape = (len(user_index), len(movie_index))
+    rows = np.concatenate(row_blocks)
+    cols = np.concatenate(col_blocks)
+    values = np.concatenate(value_blocks)
+    sums = sparse.csr_matrix((values, (rows, cols)), shape=shape)
+    counts = sparse.csr_matrix((np.ones(len(values), dtype=np.float32), (rows, cols)), shape=shape)
+    # Same sparsity pattern after summing duplicates, so the data arrays line up.
+    sums.data /= counts.data
+
+    return sums, list(movie_index.keys()), list(user_index.keys())
+
+def _save_top_k_model(list_type: str, indptr: np.ndarray, neighbor_indices: np.ndarray, neighbor_scores: np.ndarray, movie_ids: List[str], snapshot_started: str, last_updated: Optional[str] = None):
+    """
+    Persists a trained Top-K model. The binary artifact is written to this host's
+    MODEL_ARTIFACT_DIR for memory-mapped serving, and its compact encoding is
+    upserted to 'cached_lists' as the shared copy other hosts convert from.
+    `snapshot_started` is when training began reading its source table.
     """
-    Fetches all user ratings, calculates movie-movie similarity, and saves only the
+    last_updated = last_updated or datetime.now(timezone.utc).isoformat()
+    artifact = TopKArtifact.from_arrays(indptr, neighbor_indices, neighbor_scores, movie_ids)
+    artifact.snapshot_started = snapshot_started
+    try:
+        artifact.save(ARTIFACT_NAMES[list_type], artifact_version(last_updated))
+    except OSError as e:
+        print(f"Could not write the {ARTIFACT_NAMES[list_type]} artifact locally: {e}")
+
+    supabase_admin.table('cached_lists').upsert(
+        {
+            "list_type": list_type,
+            "data": artifact.to_cached_list(),
+            "last_updated": last_updated
+        },
+        on_conflict='list_type'
+    ).execute()
+
+def train_and_save_similarity_matrix(top_k: int = 50) -> bool:
+    """
+    Streams all user ratings, calculates movie-movie similarity, and saves only the
     top-K most similar movies for each movie to the 'cached_lists' table.
+    Returns True when a new model was saved.
     """
     print("Starting recommendation model training (Top-K)...")
     try:
-        # 1. Fetch all ratings
-        response = supabase_admin.table('user_ratings').select('user_id, movie_id, rating').execute()
-        if not response.data:
-            print("No rating data available to train the model.")
-            return
+        # 1 & 2. Stream every rating page straight into the sparse user-item matrix
+        snapshot_started = datetime.now(timezone.utc).isoformat()
+        rating_chunks = iter_table_chunks('user_ratings', 'user_id, movie_id, rating')
+        user_item_matrix, movie_ids, _ = _build_sparse_user_item_matrix(rating_chunks)
 
-        ratings_df = pd.DataFrame(response.data)
+        if user_item_matrix is None:
+            print("No rating data available to train the model.")
+            return False
 
-        # 2. Create the user-item matrix
-        user_item_matrix = ratings_df.pivot_table(index='user_id', columns='movie_id', values='rating').fillna(0)
-        
         if user_item_matrix.shape[1] < 2:
             print("Not enough unique movies rated to build a model.")
-            return
-
-        # 3. Calculate the full cosine similarity matrix
-        movie_similarity_matrix = cosine_similarity(user_item_matrix.T)
-        movie_ids = user_item_matrix.columns.tolist()
-        
-        # 4. Create the Top-K similarity dictionary
-        top_k_similarities = {}
-        for i, movie_id in enumerate(movie_ids):
-            # Get similarity scores for the current movie with all other movies
-            similarity_scores = movie_similarity_matrix[i]
-            
-            # Get the indices of the top K+1 most similar movies (including itself)
-            top_indices = np.argsort(similarity_scores)[::-1][1:top_k+1]
-            
-            similar_movies = []
-            for index in top_indices:
-                similar_movies.append({
-                    "id": movie_ids[index],
-                    "score": similarity_scores[index]
-                })
-            
-            top_k_similarities[movie_id] = similar_movies
-
-        # 5. Save the new Top-K structure to the cached_lists table
-        list_type = "movie_top_k_similarities"
+            return False
+
+        print(f"Loaded {user_item_matrix.nnz} ratings from {user_item_matrix.shape[0]} users.")
+
+        # 3. Calculate the Top-K item-item cosine similarities block by block
+        indptr, neighbor_indices, neighbor_scores = compute_top_k_neighbors(user_item_matrix.T.tocsr(), top_k)
+
+        # 4. Save the Top-K arrays locally and to the cached_lists table
+        _save_top_k_model(COLLAB_LIST_TYPE, indptr, neighbor_indices, neighbor_scores, movie_ids, snapshot_started)
+
+        print(f"Successfully trained and saved Top-{top_k} similarities for {len(movie_ids)} movies.")
+        return True
+
+    except Exception as e:
+        print(f"An error occurred during Top-K recommendation model training: {e}")
+        return False
+
+def _implicit_interaction_chunks() -> Iterable[List[Dict]]:
+    """Ratings scaled to 0-1 followed by likes as 1.0; a movie both rated and liked gets the average."""
+    for chunk in iter_table_chunks('user_ratings', 'user_id, movie_id, rating'):
+        yield [{**row, 'rating': row['rating'] / 5.0} for row in chunk if row.get('rating') is not None]
+    for chunk in iter_table_chunks('user_likes', 'user_id, movie_id'):
+        yield [{**row, 'rating': 1.0} for row in chunk]
+
+def train_and_save_mf_model() -> bool:
+    """
+    Streams the ratings (or, for implicit feedback, ratings and likes) into a
+    sparse matrix, factorizes it with ALS and saves the movie factors locally
+    and, compactly encoded, to the 'cached_lists' table.
+    Returns True when a new model was saved.
+    """
+    implicit = MF_FEEDBACK == 'implicit'
+    print(f"Starting matrix factorization training ({'implicit' if implicit else 'explicit'} ALS)...")
+    try:
+        chunks = _implicit_interaction_chunks() if implicit else iter_table_chunks('user_ratings', 'user_id, movie_id, rating')
+        user_item_matrix, movie_ids, user_ids = _build_sparse_user_item_matrix(chunks)
+        if user_item_matrix is None:
+            print("No rating data available to train the factor model.")
+            return False
+
+        # User factors are only needed during training; serving folds users in from their ratings
+        _, item_factors, mean = train_als(user_item_matrix, implicit=implicit)
+        model = FactorModel.from_arrays(item_factors, movie_ids, mean=mean, implicit=implicit)
+
+        last_updated = datetime.now(timezone.utc).isoformat()
+        try:
+            model.save(ARTIFACT_NAMES[MF_LIST_TYPE], artifact_version(last_updated))
+        except OSError as e:
+            print(f"Could not write the factor model locally: {e}")
         supabase_admin.table('cached_lists').upsert(
-            {
-                "list_type": list_type,
-                "data": json.dumps(top_k_similarities),
-                "last_updated": pd.Timestamp.now().isoformat()
-            },
+            {"list_type": MF_LIST_TYPE, "data": model.to_cached_list(), "last_updated": last_updated},
             on_conflict='list_type'
         ).execute()
 
-        print(f"Successfully trained and saved Top-{top_k} similarities for {len(movie_ids)} movies.")
+        print(f"Successfully trained and saved factors for {len(user_ids)} users and {len(movie_ids)} movies.")
+        return True
 
     except Exception as e:
-        print(f"An error occurred during Top-K recommendation model training: {e}")
+        print(f"An error occurred during matrix factorization training: {e}")
+        return False
+
+# Users scored per joblib task; large enough to amortise the task overhead
+BATCH_USERS_PER_TASK = 256
+
+# Engine opened by a joblib worker process, keyed by the model versions it was loaded from
+_batch_engine: Dict = {}
+
+def _model_class(list_type: str):
+    return FactorModel if list_type == MF_LIST_TYPE else TopKArtifact
+
+def _load_batch_engine(versions: Tuple[Tuple[str, str], ...]):
+    """Opens the memory-mapped models of the given versions, once per worker process."""
+    if _batch_engine.get('versions') != versions:
+        loaded = {list_type: _model_class(list_type).load(ARTIFACT_NAMES[list_type], artifact_version(version)) for list_type, version in versions}
+        engine = loaded[MF_LIST_TYPE] if MF_LIST_TYPE in loaded else HybridScoringEngine(loaded[COLLAB_LIST_TYPE], loaded[CONTENT_LIST_TYPE])
+        _batch_engine.update(versions=versions, engine=engine)
+    return _batch_engine['engine']
+
+def _score_user_batch(engine, users: List[Tuple[str, Dict, List]], top_n: int) -> List[Tuple[List[str], List[float]]]:
+    """Top-N taste scores of each (user_id, ratings, liked ids) with the given engine."""
+    results = []
+    for _, user_ratings, liked_movie_ids in users:
+        if isinstance(engine, FactorModel):
+            scores, movie_ids = mf_scores_for_interactions(engine, user_ratings, liked_movie_ids), engine.item_ids
+        else:
+            scores, movie_ids = hybrid_scores_for_ratings(engine, user_ratings), engine.movie_ids
+        top_ids, top_scores = top_k_row(scores, movie_ids, top_n)
+        results.append(([str(movie_id) for movie_id in top_ids], top_scores))
+    return results
+
+def _score_user_batch_from_disk(versions: Tuple[Tuple[str, str], ...], users: List[Tuple[str, Dict, List]], top_n: int) -> List[Tuple[List[str], List[float]]]:
+    return _score_user_batch(_load_batch_engine(versions), users, top_n)
+
+def _load_user_interactions(implicit: bool) -> Tuple[Dict[str, Dict[str, float]], Dict[str, List[str]]]:
+    """Every user's ratings ({movie_id: rating}) and, for implicit factor models, likes."""
+    ratings: Dict[str, Dict[str, float]] = {}
+    for chunk in iter_table_chunks('user_ratings', 'user_id, movie_id, rating'):
+        for row in chunk:
+            if row.get('rating') is not None:
+                ratings.setdefault(row['user_id'], {})[str(row['movie_id'])] = row['rating']
+    likes: Dict[str, List[str]] = {}
+    if implicit:
+        for chunk in iter_table_chunks('user_likes', 'user_id, movie_id'):
+            for row in chunk:
+                likes.setdefault(row['user_id'], []).append(str(row['movie_id']))
+    return ratings, likes
+
+def precompute_home_recommendations(top_n: int = BATCH_RECOMMENDATIONS_TOP_N, n_jobs: int = BATCH_RECOMMENDATIONS_JOBS) -> bool:
+    """
+    Batch job: scores every active user (anyone with a rating) against the
+    current serving models and stores their top-N candidates, so the home
+    screen only has to intersect them with the mood candidates.
 
-async def train_and_save_content_similarity(top_k: int = 50):
+    With `n_jobs > 1` users are scored in joblib worker processes that open the
+    same memory-mapped model artifacts by version. Returns True when a new
+    result set was saved.
     """
-    Fetches movie features, calculates content-based similarity, and saves only the
+    print(f"Starting batch home recommendations (top {top_n} per user, {n_jobs} job(s))...")
+    try:
+        snapshot = similarity_models.get()
+        use_mf = COLLAB_ENGINE == 'als'
+        engine = snapshot.mf if use_mf else snapshot.scorer
+        if not len(engine):
+            print("No serving model available to precompute recommendations.")
+            return False
+        list_types = [MF_LIST_TYPE] if use_mf else [COLLAB_LIST_TYPE, CONTENT_LIST_TYPE]
+        versions = tuple((list_type, snapshot.versions[list_type]) for list_type in list_types if snapshot.versions.get(list_type))
+
+        ratings, likes = _load_user_interactions(use_mf and engine.implicit)
+        user_ids = list(ratings.keys())
+        batches = [
+            [(user_id, ratings[user_id], likes.get(user_id, [])) for user_id in user_ids[start:start + BATCH_USERS_PER_TASK]]
+            for start in range(0, len(user_ids), BATCH_USERS_PER_TASK)
+        ]
+
+        # Workers need every model on disk; otherwise score in this process
+        on_disk = len(versions) == len(list_types) and all(
+            _model_class(list_type).load(ARTIFACT_NAMES[list_type], artifact_version(version)) is not None
+            for list_type, version in versions
+        )
+        if n_jobs > 1 and on_disk and len(batches) > 1:
+            batch_results = Parallel(n_jobs=n_jobs)(delayed(_score_user_batch_from_disk)(versions, batch, top_n) for batch in batches)
+        else:
+            batch_results = [_score_user_batch(engine, batch, top_n) for batch in batches]
+
+        candidate_ids, candidate_scores = [], []
+        for results in batch_results:
+            for top_ids, top_scores in results:
+                candidate_ids.append(top_ids)
+                candidate_scores.append(top_scores)
+
+        like_counts = [len(likes.get(user_id, [])) for user_id in user_ids] if use_mf and engine.implicit else None
+        precomputed = PrecomputedRecommendations.from_user_lists(user_ids, candidate_ids, candidate_scores, [interaction_checksum(ratings[user_id]) for user_id in user_ids], like_counts)
+        last_updated = datetime.now(timezone.utc).isoformat()
+        try:
+            precomputed.save(ARTIFACT_NAMES[PRECOMPUTED_LIST_TYPE], artifact_version(last_updated))
+        except OSError as e:
+            print(f"Could not write the precomputed recommendations locally: {e}")
+        supabase_admin.table('cached_lists').upsert(
+            {"list_type": PRECOMPUTED_LIST_TYPE, "data": precomputed.to_cached_list(), "last_updated": last_updated},
+            on_conflict='list_type'
+        ).execute()
+
+        print(f"Successfully precomputed {len(precomputed.movies)} candidates for {len(user_ids)} users.")
+        return True
+
+    except Exception as e:
+        print(f"An error occurred while precomputing home recommendations: {e}")
+        return False
+
+CONTENT_FEATURE_COLUMNS = 'genres, keywords, director, actors, emotional_tags, synopsis'
+# "exact" compares all pairs block by block; "lsh" compares each movie only with its LSH buckets
+CONTENT_SIMILARITY_METHOD = os.getenv('CONTENT_SIMILARITY_METHOD', 'exact')
+
+def _create_corpus_document(row: Dict) -> str:
+    """Joins a movie's content features into a single document for TF-IDF."""
+    parts = []
+    if row.get('genres'):
+        # Genres can be list of dicts or strings, convert to string names
+        processed_genres = []
+        for g in row['genres']:
+            if isinstance(g, dict) and 'name' in g:
+                processed_genres.append(g['name'])
+            elif isinstance(g, str):
+                processed_genres.append(g)
+        parts.extend(processed_genres)
+    if row.get('keywords'):
+        parts.extend(row['keywords'])
+    if row.get('director'):
+        parts.append(row['director'])
+    if row.get('actors'):
+        parts.extend(row['actors'])
+    if row.get('emotional_tags'):
+        parts.extend(row['emotional_tags'])
+
+    # Add synopsis words as well, but limit to avoid too much noise
+    if row.get('synopsis'):
+        synopsis_words = [word.strip(".,!?\"'() ").lower() for word in row['synopsis'].split() if len(word.strip(".,!?\"'() ")) > 1]
+        parts.extend(synopsis_words[:20]) # Take top 20 words from synopsis
+
+    return " ".join(parts)
+
+def _has_content_features(row: Dict) -> bool:
+    return any(row.get(column) is not None for column in ('genres', 'keywords', 'director', 'actors', 'emotional_tags'))
+
+def train_and_save_content_similarity(top_k: int = 50) -> bool:
+    """
+    Streams movie features, calculates content-based similarity, and saves only the
     top-K most similar movies for each movie to the 'cached_lists' table.
+    Returns True when a new model was saved.
     """
     print("Starting content-based similarity training (Top-K)...")
     try:
-        # 1. Fetch all movies with features from DB
-        response = supabase_admin.table('movies').select('id, genres, keywords, director, actors, emotional_tags, synopsis').execute()
-        if not response.data:
-            print("No movie data with features available for content similarity training.")
-            return
-
-        movies_df = pd.DataFrame(response.data)
-        
-        # Filter out movies that don't have enough features
-        movies_df = movies_df[movies_df['genres'].notna() | movies_df['keywords'].notna() | movies_df['director'].notna() | movies_df['actors'].notna() | movies_df['emotional_tags'].notna()]
-        
-        if movies_df.empty:
-            print("No movies with sufficient features to build content similarity.")
-            return
-
-        # 2. Create a corpus for TF-IDF
-        def create_corpus_document(row):
-            parts = []
-            if row['genres']:
-                # Genres can be list of dicts or strings, convert to string names
-                processed_genres = []
-                for g in row['genres']:
-                    if isinstance(g, dict) and 'name' in g:
-                        processed_genres.append(g['name'])
-                    elif isinstance(g, str):
-                        processed_genres.append(g)
-                parts.extend(processed_genres)
-            if row['keywords']:
-                parts.extend(row['keywords'])
-            if row['director']:
-                parts.append(row['director'])
-            if row['actors']:
-                parts.extend(row['actors'])
-            if row['emotional_tags']:
-                parts.extend(row['emotional_tags'])
-            
-            # Add synopsis words as well, but limit to avoid too much noise
-            if row['synopsis']:
-                synopsis_words = [word.strip(".,!?\"'() ").lower() for word in row['synopsis'].split() if len(word.strip(".,!?\"'() ")) > 1]
-                parts.extend(synopsis_words[:20]) # Take top 20 words from synopsis
-            
-            return " ".join(parts)
-
-        movies_df['corpus'] = movies_df.apply(create_corpus_document, axis=1)
-        
-        # Filter out movies with empty corpus
-        movies_df = movies_df[movies_df['corpus'].str.strip() != '']
-
-        if movies_df.empty:
+        # 1 & 2. Stream all movies and build a TF-IDF corpus chunk by chunk,
+        # skipping movies without enough features or with an empty corpus
+        snapshot_started = datetime.now(timezone.utc).isoformat()
+        movie_ids, corpus = [], []
+        for chunk in iter_table_chunks('movies', CONTENT_FEATURE_COLUMNS):
+            for row in chunk:
+                if not _has_content_features(row):
+                    continue
+                document = _create_corpus_document(row)
+                if document.strip():
+                    movie_ids.append(str(row['id']))
+                    corpus.append(document)
+
+        if not corpus:
             print("No movies with valid corpus for content similarity training.")
-            return
+            return False
 
         # 3. TF-IDF Vectorization
         tfidf_vectorizer = TfidfVectorizer()
-        tfidf_matrix = tfidf_vectorizer.fit_transform(movies_df['corpus'])
-
-        # 4. Calculate Cosine Similarity
-        content_similarity_matrix = cosine_similarity(tfidf_matrix)
-        movie_ids = movies_df['id'].tolist()
-
-        # 5. Create the Top-K content similarity dictionary
-        top_k_content_similarities = {}
-        for i, movie_id in enumerate(movie_ids):
-            similarity_scores = content_similarity_matrix[i]
-            
-            # Get the indices of the top K+1 most similar movies (excluding itself)
-            top_indices = np.argsort(similarity_scores)[::-1][1:top_k+1]
-            
-            similar_movies = []
-            for index in top_indices:
-                similar_movies.append({
-                    "id": movie_ids[index],
-                    "score": similarity_scores[index]
-                })
-            
-            top_k_content_similarities[movie_id] = similar_movies
-
-        # 6. Save the new Top-K structure to the cached_lists table
-        list_type = "content_similar_top_k"
-        supabase_admin.table('cached_lists').upsert(
-            {
-                "list_type": list_type,
-                "data": json.dumps(top_k_content_similarities),
-                "last_updated": pd.Timestamp.now().isoformat()
-            },
-            on_conflict='list_type'
-        ).execute()
+        tfidf_matrix = tfidf_vectorizer.fit_transform(corpus)
+
+        # 4. Build the LSH index and calculate the Top-K cosine similarities,
+        # either exactly block by block or among each movie's LSH candidates
+        lsh_index = LSHIndex.build(tfidf_matrix)
+        if CONTENT_SIMILARITY_METHOD == 'lsh':
+            indptr, neighbor_indices, neighbor_scores = lsh_index.top_k_neighbors(tfidf_matrix, top_k)
+        else:
+            indptr, neighbor_indices, neighbor_scores = compute_top_k_neighbors(tfidf_matrix, top_k)
+
+        # 5. Save the TF-IDF state and LSH index for incremental inserts and
+        # on-the-fly queries, then the Top-K arrays locally and to the
+        # cached_lists table, all under the same version
+        last_updated = datetime.now(timezone.utc).isoformat()
+        try:
+            ContentVectorArtifact.from_vectorizer(tfidf_vectorizer, tfidf_matrix, movie_ids).save(artifact_version(last_updated))
+            lsh_index.save(artifact_version(last_updated))
+        except OSError as e:
+            print(f"Could not write the content vectors locally: {e}")
+        _save_top_k_model(CONTENT_LIST_TYPE, indptr, neighbor_indices, neighbor_scores, movie_ids, snapshot_started, last_updated)
 
         print(f"Successfully trained and saved Top-{top_k} content similarities for {len(movie_ids)} movies.")
+        return True
 
     except Exception as e:
         print(f"An error occurred during content-based similarity training: {e}")
+        return False
 
-def get_fallback_recommendations(user_id: str, seen_movie_ids: set, top_n: int) -> List[str]:
-    """
-    Fallback recommendation logic: Recommend popular movies from the user's favorite genres.
-    """
-    print("[대체 추천 로직 실행] 개인화 추천을 생성할 수 없어, 장르 기반 인기 영화를 추천합니다.")
-    try:
-        # 1. Fetch all movies with genres from DB
-        movies_res = supabase_admin.table('movies').select('id, genres').execute()
-        if not movies_res.data:
-            return []
-        
-        # 2. Find user's top 2 favorite genres
-        user_ratings_res = supabase_admin.table('user_ratings').select('movie_id, rating').eq('user_id', user_id).gt('rating', 3).execute()
-        if not user_ratings_res.data:
-            # If no high ratings, just recommend popular movies
-            popular_movies_res = supabase_admin.table('user_ratings').select('movie_id', count='exact').group('movie_id').order('count', desc=True).limit(top_n * 2).execute()
-            return [m['movie_id'] for m in popular_movies_res.data if m['movie_id'] not in seen_movie_ids][:top_n]
-
-        rated_movie_ids = [r['movie_id'] for r in user_ratings_res.data]
-        
-        movies_df = pd.DataFrame(movies_res.data)
-        # Ensure 'id' in movies_df is the same type as rated_movie_ids (string)
-        movies_df['id'] = movies_df['id'].astype(str)
-        rated_movies_df = movies_df[movies_df['id'].isin(rated_movie_ids) & movies_df['genres'].notna()]
-
-        if rated_movies_df.empty:
-             return []
-
-        genre_counter = Counter()
-        for genres in rated_movies_df['genres']:
-            if isinstance(genres, list):
-                for genre in genres:
-                    # Handle both {'id': 1, 'name': 'Action'} and 'Action' formats
-                    if isinstance(genre, dict) and 'name' in genre:
-                        genre_counter[genre['name']] += 1
-                    elif isinstance(genre, str):
-                         genre_counter[genre] += 1
-
-        top_genres = [g for g, count in genre_counter.most_common(2)]
-        if not top_genres:
-            return []
-        
-        print(f"사용자 선호 장르: {top_genres}")
-
-        # 3. Recommend popular movies from those genres
-        fallback_recs = []
-        all_movies_df = pd.DataFrame(movies_res.data)
-        all_movies_df['id'] = all_movies_df['id'].astype(str)
-
-        for genre_name in top_genres:
-            # Filter movies that have the genre_name in their genres list
-            def has_genre(genres):
-                if not isinstance(genres, list):
-                    return False
-                for g in genres:
-                    if isinstance(g, dict) and g.get('name') == genre_name:
-                        return True
-                    if isinstance(g, str) and g == genre_name:
-                        return True
-                return False
-
-            movies_with_genre = all_movies_df[all_movies_df['genres'].apply(has_genre)]
-            
-            for movie_id in movies_with_genre['id']:
-                if movie_id not in seen_movie_ids:
-                    fallback_recs.append(movie_id)
-        
-        return list(dict.fromkeys(fallback_recs))[:top_n]
-
-    except Exception as e:
-        print(f"[오류] 대체 추천 로직 실행 중 오류 발생: {e}")
-        return []
+# Popular movies from the user's favorite genres (globally best-rated ones if they have no high ratings)
+_FALLBACK_PIPELINE = Pipeline("fallback", [GenrePopularSource()], [SeenFilter()], rerankers=[Truncate()])
 
+async def get_fallback_recommendations(user_id: str, top_n: int) -> List[str]:
+    """Fallback recommendation logic: unseen popular movie ids from the user's favorite genres."""
+    ctx = recommendation_engine.context(user_id, top_n)
+    return [candidate.movie_id for candidate in await recommendation_engine.run(ctx, _FALLBACK_PIPELINE)]
 
 async def get_recommendations_for_user(user_id: str, top_n: int = 20, mood_tag: Optional[str] = None):
     """
-    Recommends movies for a user using a hybrid approach (collaborative + content-based).
-    Handles cold-start for new users and applies mood filtering.
+    Recommends movie ids for a user using the hybrid taste scores, restricted to
+    the mood's emotional tags when one is given. New users get the content
+    neighbours of their onboarding picks; users without a usable signal get the
+    genre-popularity fallback.
     """
     print(f"--- 하이브리드 추천 생성 시작: 사용자 ID {user_id}, 기분: {mood_tag} ---")
-    
-    # 1. (MOOD FILTER) Get movie IDs for the selected mood if provided
-    mood_movie_ids = None
-    if mood_tag:
-        print(f"'{mood_tag}' 기분에 맞는 영화를 필터링합니다...")
-        from llm_service import EMOTIONAL_TAGS
-        target_tags = EMOTIONAL_TAGS.get(mood_tag, [])
-        if not target_tags:
-            print(f"'{mood_tag}'에 해당하는 감성 태그를 찾을 수 없습니다.")
-            # Fallback to general recommendations if mood tag is invalid
-            mood_tag = None 
-        else:
-            mood_movies_res = supabase_admin.table('movies').select('id').overlaps('emotional_tags', target_tags).execute()
-            if not mood_movies_res.data:
-                print(f"'{mood_tag}' 기분에 맞는 영화가 DB에 없습니다.")
-                # Fallback to general recommendations if no movies match mood
-                mood_tag = None
-            else:
-                mood_movie_ids = {str(movie['id']) for movie in mood_movies_res.data}
-                print(f"기분 필터링된 영화 수: {len(mood_movie_ids)}")
-
-    # 2. Load pre-computed similarity data
-    try:
-        collab_sim_res = supabase_admin.table('cached_lists').select('data').eq('list_type', "movie_top_k_similarities").single().execute()
-        collab_similarities = json.loads(collab_sim_res.data['data']) if collab_sim_res.data else {}
-    except Exception:
-        collab_similarities = {}
-
-    try:
-        content_sim_res = supabase_admin.table('cached_lists').select('data').eq('list_type', "content_similar_top_k").single().execute()
-        content_similarities = json.loads(content_sim_res.data['data']) if content_sim_res.data else {}
-    except Exception:
-        content_similarities = {}
-
-    if not collab_similarities and not content_similarities:
+    ctx = recommendation_engine.context(user_id, top_n)
+    if not recommendation_engine.taste_model_ready(ctx):
         return {"message": "추천 모델이 아직 준비되지 않았습니다."}
 
-    # 3. Get the user's ratings
-    ratings_response = supabase_admin.table('user_ratings').select('movie_id, rating').eq('user_id', user_id).execute()
-    user_ratings = {item['movie_id']: item['rating'] for item in ratings_response.data}
-    seen_movie_ids = set(user_ratings.keys())
-
-    # 4. Cold-start for new users (no ratings)
-    if not user_ratings:
+    mood_filter = MoodTagFilter(mood_tag)
+    if not ctx.ratings:
         print("[정보] 신규 사용자: 평점 데이터가 없어 온보딩 기반 콘텐츠 추천을 시도합니다.")
-        onboarding_res = supabase_admin.table('profiles').select('onboarding_liked_movie_ids').eq('id', user_id).single().execute()
-        onboarding_liked_ids = onboarding_res.data.get('onboarding_liked_movie_ids') if onboarding_res.data else []
-
-        if onboarding_liked_ids and content_similarities:
-            cold_start_recommendations = Counter()
-            for liked_id in onboarding_liked_ids:
-                liked_id_str = str(liked_id)
-                if liked_id_str in content_similarities:
-                    for similar_movie in content_similarities[liked_id_str]:
-                        cold_start_recommendations[similar_movie["id"]] += similar_movie["score"]
-            
-            final_recs = [movie_id for movie_id, score in cold_start_recommendations.most_common(top_n * 2) if movie_id not in seen_movie_ids]
-            
-            if mood_movie_ids:
-                final_recs = [rec_id for rec_id in final_recs if rec_id in mood_movie_ids]
-            
-            return final_recs[:top_n]
-        else:
-            print("[정보] 온보딩 데이터도 없어 일반적인 대체 추천을 제공합니다.")
-            return await get_fallback_recommendations(user_id, seen_movie_ids, top_n)
-
-    # 5. Calculate hybrid recommendation scores for existing users
-    hybrid_scores = Counter()
-    highly_rated_movies = {movie_id: rating for movie_id, rating in user_ratings.items() if rating >= 4}
-
-    if not highly_rated_movies:
-        print("[정보] 높은 평점 영화가 없어 대체 추천 로직을 실행합니다.")
-        return await get_fallback_recommendations(user_id, seen_movie_ids, top_n)
-
-    # Weights for hybrid scoring
-    COLLAB_WEIGHT = 0.7
-    CONTENT_WEIGHT = 0.3
-
-    for movie_id, rating in highly_rated_movies.items():
-        # Collaborative scores
-        if movie_id in collab_similarities:
-            for similar_movie in collab_similarities[movie_id]:
-                hybrid_scores[similar_movie["id"]] += similar_movie["score"] * (rating - 3) * COLLAB_WEIGHT
-        
-        # Content-based scores
-        if movie_id in content_similarities:
-            for similar_movie in content_similarities[movie_id]:
-                hybrid_scores[similar_movie["id"]] += similar_movie["score"] * (rating - 3) * CONTENT_WEIGHT
-
-    # Filter out seen movies
-    for seen_movie_id in seen_movie_ids:
-        if seen_movie_id in hybrid_scores:
-            del hybrid_scores[seen_movie_id]
-    
-    # Get initial list of recommended IDs
-    recommended_movie_ids = [movie_id for movie_id, score in hybrid_scores.most_common(top_n * 5)]
-
-    # (MOOD FILTER) Filter by mood
-    if mood_movie_ids:
-        final_recommendations = [rec_id for rec_id in recommended_movie_ids if rec_id in mood_movie_ids]
+        pipeline = Pipeline("onboarding", [OnboardingContentSource(pool_factor=2)], [mood_filter], rerankers=[Truncate()])
     else:
-        final_recommendations = recommended_movie_ids
-    
-    final_recommendations = final_recommendations[:top_n]
+        pipeline = Pipeline("personalized", [TasteTopSource(pool_factor=5)], [SeenFilter(), mood_filter], rerankers=[Truncate()])
+    candidates = await recommendation_engine.run(ctx, pipeline)
 
     # If recommendations are still empty, use fallback
-    if not final_recommendations:
+    if not candidates:
         print("[정보] 개인화 추천 결과가 비어있어 대체 추천 로직을 실행합니다.")
-        final_recommendations = await get_fallback_recommendations(user_id, seen_movie_ids, top_n)
+        candidates = await recommendation_engine.run(ctx, _FALLBACK_PIPELINE)
 
+    final_recommendations = [candidate.movie_id for candidate in candidates]
     print(f"--- 최종 추천 영화 ID 목록 ({len(final_recommendations)}개): {final_recommendations} ---")
     return final_recommendations
-
-async def get_fallback_recommendations(user_id: str, seen_movie_ids: set, top_n: int) -> List[str]:
-    """
-    Fallback recommendation logic: Recommend popular movies from the user's favorite genres.
-    If no high ratings, just recommend globally popular movies.
-    """
-    print("[대체 추천 로직 실행] 개인화 추천을 생성할 수 없어, 장르 기반 인기 영화를 추천합니다.")
-    try:
-        # 1. Fetch all movies with genres from DB
-        movies_res = supabase_admin.table('movies').select('id, genres').execute()
-        if not movies_res.data:
-            return []
-        
-        # 2. Find user's top 2 favorite genres
-        user_ratings_res = supabase_admin.table('user_ratings').select('movie_id, rating').eq('user_id', user_id).gt('rating', 3).execute()
-        
-        if not user_ratings_res.data:
-            # If no high ratings, just recommend globally popular movies
-            print("[정보] 높은 평점 영화가 없어 전역 인기 영화를 추천합니다.")
-            popular_movies_res = supabase_admin.table('movies').select('id').order('vote_average', desc=True).limit(top_n * 2).execute()
-            return [m['id'] for m in popular_movies_res.data if m['id'] not in seen_movie_ids][:top_n]
-
-        rated_movie_ids = [r['movie_id'] for r in user_ratings_res.data]
-        
-        movies_df = pd.DataFrame(movies_res.data)
-        # Ensure 'id' in movies_df is the same type as rated_movie_ids (string)
-        movies_df['id'] = movies_df['id'].astype(str)
-        rated_movies_df = movies_df[movies_df['id'].isin(rated_movie_ids) & movies_df['genres'].notna()]
-
-        if rated_movies_df.empty:
-             return []
-
-        genre_counter = Counter()
-        for genres in rated_movies_df['genres']:
-            if isinstance(genres, list):
-                for genre in genres:
-                    # Handle both {'id': 1, 'name': 'Action'} and 'Action' formats
-                    if isinstance(genre, dict) and 'name' in genre:
-                        genre_counter[genre['name']] += 1
-                    elif isinstance(genre, str):
-                         genre_counter[genre] += 1
-
-        top_genres = [g for g, count in genre_counter.most_common(2)]
-        if not top_genres:
-            return []
-        
-        print(f"사용자 선호 장르: {top_genres}")
-
-        # 3. Recommend popular movies from those genres
-        fallback_recs = []
-        all_movies_df = pd.DataFrame(movies_res.data)
-        all_movies_df['id'] = all_movies_df['id'].astype(str)
-
-        for genre_name in top_genres:
-            # Filter movies that have the genre_name in their genres list
-            def has_genre(genres):
-                if not isinstance(genres, list):
-                    return False
-                for g in genres:
-                    if isinstance(g, dict) and g.get('name') == genre_name:
-                        return True
-                    if isinstance(g, str) and g == genre_name:
-                        return True
-                return False
-
-            movies_with_genre = all_movies_df[all_movies_df['genres'].apply(has_genre)]
-            
-            for movie_id in movies_with_genre['id']:
-                if movie_id not in seen_movie_ids:
-                    fallback_recs.append(movie_id)
-        
-        return list(dict.fromkeys(fallback_recs))[:top_n]
-
-    except Exception as e:
-        print(f"[오류] 대체 추천 로직 실행 중 오류 발생: {e}")
-        return []
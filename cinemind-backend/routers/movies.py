@@ -1,16 +1,18 @@
-import os
-import requests
 import json
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query
 from dateutil.parser import isoparse
-import traceback
+import asyncio
 
 # Import services, clients, schemas, and handlers
 from supabase_client import supabase_admin
-from kobis_service import get_daily_box_office, get_movie_details
-from recommendation_service import get_home_hybrid_recommendations
+from kobis_service import get_daily_box_office_async, get_movie_details_async, is_kobis_movie_code
+from recommendation_service import get_home_hybrid_recommendations, CONTENT_FEATURE_COLUMNS
+from model_store import similarity_models
+from incremental_content import incremental_content
+from catalog_index import catalog_index
+from singleflight import coalesce
 from tmdb_service import (
     search_movie_by_title, get_movie_poster_path, get_full_poster_url, 
     get_movies_for_onboarding, get_details_for_movies, get_trending_movies,
@@ -34,10 +36,20 @@ router = APIRouter(
 POSTER_PLACEHOLDER = "https://via.placeholder.com/500x750.png?text=Image+Not+Available"
 
 
+async def _find_tmdb_poster_url(title: str, release_year: str | None) -> str | None:
+    """KOBIS 영화의 포스터를 TMDB에서 제목과 개봉 연도로 찾아 전체 URL을 반환합니다."""
+    tmdb_movie_data = await search_movie_by_title(title, release_year)
+    if not tmdb_movie_data:
+        return None
+    poster_path = await get_movie_poster_path(tmdb_movie_data.get('id'))
+    return get_full_poster_url(poster_path)
+
 def _parse_iso_datetime(date_string: str) -> datetime:
     """Parses an ISO 8601 datetime string into a timezone-aware datetime object."""
     return isoparse(date_string)
 
+# 같은 목록(첫 페이지 캐시 갱신 포함)을 동시에 요청하면 하나의 조회만 실행하고 결과를 공유
+@coalesce("cached_lists", key=lambda list_type, fetch_function, cache_expiration_hours, **kwargs: (list_type, tuple(sorted(kwargs.items()))))
 async def _get_cached_or_fetch_list(list_type: str, fetch_function, cache_expiration_hours: int, **kwargs):
     page = kwargs.get('page', 1)
     if page == 1:
@@ -178,16 +190,16 @@ async def get_movies_details_in_bulk(movie_ids: MovieIdList):
     return movie_details
 
 @router.get("/movies/box-office", response_model=List[Movie])
-def get_box_office_live(sort_by: str = Query("rank", enum=["rank", "audience"])):
+async def get_box_office_live(sort_by: str = Query("rank", enum=["rank", "audience"])):
     """KOBIS API를 사용하여 실시간 박스오피스 정보를 가져옵니다."""
-    raw_movies_kobis = get_daily_box_office()
+    raw_movies_kobis = await get_daily_box_office_async()
     if raw_movies_kobis is None: return []
     
     movie_ids_kobis = [m.get('movieCd') for m in raw_movies_kobis]
     
     try:
         # DB에서 캐시된 영화 정보 미리 가져오기
-        cached_movies_res = supabase_admin.table('movies').select('id', 'title', 'release_date', 'poster_url').in_('id', movie_ids_kobis).execute()
+        cached_movies_res = await asyncio.to_thread(supabase_admin.table('movies').select('id', 'title', 'release_date', 'poster_url').in_('id', movie_ids_kobis).execute)
         cached_movies_dict = {m['id']: m for m in cached_movies_res.data}
     except Exception as e:
         print(f"DB에서 캐시된 영화 조회 중 오류: {e}")
@@ -196,20 +208,22 @@ def get_box_office_live(sort_by: str = Query("rank", enum=["rank", "audience"]))
     temp_enriched_movies = []
     movies_to_upsert = []
 
+    # 유효한 캐시(포스터 URL 포함)가 없는 영화들의 포스터는 TMDB에서 동시에 조회
+    def has_cached_poster(movie_id):
+        cached_movie = cached_movies_dict.get(movie_id)
+        return bool(cached_movie and cached_movie.get('poster_url') and cached_movie.get('poster_url') != POSTER_PLACEHOLDER)
+    uncached = [m for m in raw_movies_kobis if not has_cached_poster(m.get('movieCd'))]
+    fetched_posters = await asyncio.gather(*[
+        _find_tmdb_poster_url(m.get('movieNm'), m.get('openDt')[:4] if m.get('openDt') else None) for m in uncached
+    ])
+    fetched_poster_by_id = {m.get('movieCd'): poster_url for m, poster_url in zip(uncached, fetched_posters)}
+
     for m in raw_movies_kobis:
         movie_id = m.get('movieCd')
-        cached_movie = cached_movies_dict.get(movie_id)
-        
-        poster_url = None
-        # 유효한 캐시가 있는지 확인 (포스터 URL 포함)
-        if cached_movie and cached_movie.get('poster_url') and cached_movie.get('poster_url') != POSTER_PLACEHOLDER:
-            poster_url = cached_movie.get('poster_url')
+        if has_cached_poster(movie_id):
+            poster_url = cached_movies_dict[movie_id].get('poster_url')
         else:
-            title, release_year = m.get('movieNm'), m.get('openDt')[:4] if m.get('openDt') else None
-            tmdb_movie_data = search_movie_by_title(title, release_year)
-            if tmdb_movie_data:
-                poster_path = get_movie_poster_path(tmdb_movie_data.get('id'))
-                poster_url = get_full_poster_url(poster_path)
+            poster_url = fetched_poster_by_id.get(movie_id)
 
         final_poster_url = poster_url or POSTER_PLACEHOLDER
         
@@ -231,7 +245,7 @@ def get_box_office_live(sort_by: str = Query("rank", enum=["rank", "audience"]))
 
     if movies_to_upsert:
         try:
-            supabase_admin.table('movies').upsert(movies_to_upsert).execute()
+            await asyncio.to_thread(supabase_admin.table('movies').upsert(movies_to_upsert).execute)
         except Exception as e:
             print(f"DB에 영화 정보 업데이트 중 오류: {e}")
             
@@ -264,7 +278,7 @@ def get_box_office_live(sort_by: str = Query("rank", enum=["rank", "audience"]))
 async def get_box_office_battle():
     try:
         # Get the top 10 movies from the general box office
-        all_movies_raw = get_daily_box_office()
+        all_movies_raw = await get_daily_box_office_async()
         if not all_movies_raw or len(all_movies_raw) < 2:
             # Not enough movies for a battle
             return BoxOfficeBattleResponse()
@@ -288,10 +302,7 @@ async def get_box_office_battle():
             except Exception:
                 # If not in cache, fetch from TMDB
                 release_year = movie_raw.get('openDt')[:4] if movie_raw.get('openDt') else None
-                tmdb_movie_data = search_movie_by_title(title, release_year)
-                if tmdb_movie_data:
-                    poster_path = get_movie_poster_path(tmdb_movie_data.get('id'))
-                    poster_url = get_full_poster_url(poster_path)
+                poster_url = await _find_tmdb_poster_url(title, release_year)
             
             final_poster_url = poster_url or POSTER_PLACEHOLDER
             
@@ -341,11 +352,18 @@ async def get_mood_recommendations(current_user: dict = Depends(get_current_user
         print(f"Pydantic 모델 변환 중 오류 발생: {e}")
         raise HTTPException(status_code=500, detail="추천 영화 데이터를 처리하는 중 오류가 발생했습니다.")
 
-@router.get("/movies/tmdb/{tmdb_id}", response_model=MovieDetails)
-async def get_movie_detail_by_tmdb_id(tmdb_id: int, current_user: dict | None = Depends(get_current_user_optional)):
+@coalesce("tmdb_movie_page", key=lambda tmdb_id: tmdb_id)
+async def _fetch_and_cache_tmdb_movie(tmdb_id: int) -> Tuple[dict, Optional[list], bool]:
+    """
+    TMDB 상세 정보를 가져와 movies 테이블에 저장하고 감성 태그를 채웁니다.
+    같은 영화에 대한 동시 요청은 이 작업을 한 번만 실행합니다. 후속 작업은 각 요청이 등록하도록
+    (상세 정보, 감성 태그, 태그를 새로 생성했는지)를 반환합니다.
+    콘텐츠 유사도 목록에는 학습 리더가 갱신된 `last_updated`를 보고 반영합니다.
+    """
     details = await get_movie_details_by_tmdb_id(tmdb_id)
     if not details: raise HTTPException(status_code=404, detail="TMDB에서 영화 정보를 찾을 수 없습니다.")
     if not details.get('poster_url'): details['poster_url'] = POSTER_PLACEHOLDER
+    emotional_tags, freshly_tagged = None, False
     try:
         movie_id_str = str(tmdb_id)
         additional_features = extract_features_from_tmdb_details(details)
@@ -353,14 +371,25 @@ async def get_movie_detail_by_tmdb_id(tmdb_id: int, current_user: dict | None =
         supabase_admin.table('movies').upsert(movie_to_cache).execute()
         try:
             existing_movie_res = supabase_admin.table("movies").select("emotional_tags").eq("id", movie_id_str).single().execute()
-            if not existing_movie_res.data or not existing_movie_res.data.get("emotional_tags"):
+            emotional_tags = existing_movie_res.data.get("emotional_tags") if existing_movie_res.data else None
+            if not emotional_tags:
                 emotional_tags = get_emotional_tags_for_movie(details.get("title"))
-                supabase_admin.table("movies").update({"emotional_tags": emotional_tags}).eq("id", movie_id_str).execute()
+                # last_updated도 갱신해 콘텐츠 유사도 증분 반영이 태그를 포함한 특징을 다시 읽도록 합니다
+                supabase_admin.table("movies").update({"emotional_tags": emotional_tags, "last_updated": datetime.now(timezone.utc).isoformat()}).eq("id", movie_id_str).execute()
                 details['emotional_tags'] = emotional_tags
+                freshly_tagged = True
         except Exception as e:
             print(f"Error handling emotional tags for {details.get('title')}: {e}")
     except Exception as e:
         print(f"DB에 TMDB 영화 정보 저장 중 오류 발생: {e}")
+    return details, emotional_tags, freshly_tagged
+
+@router.get("/movies/tmdb/{tmdb_id}", response_model=MovieDetails)
+async def get_movie_detail_by_tmdb_id(tmdb_id: int, background_tasks: BackgroundTasks, current_user: dict | None = Depends(get_current_user_optional)):
+    details, emotional_tags, freshly_tagged = await _fetch_and_cache_tmdb_movie(tmdb_id)
+    if freshly_tagged:
+        # 기분 필터용 감성 태그 인덱스에 즉시 반영
+        background_tasks.add_task(catalog_index.set_emotional_tags, str(tmdb_id), emotional_tags)
     user_rating, is_liked, comment = None, False, None
     if current_user:
         try:
@@ -374,15 +403,16 @@ async def get_movie_detail_by_tmdb_id(tmdb_id: int, current_user: dict | None =
 @router.get("/movies/{movie_id}/similar", response_model=List[Movie])
 async def get_content_similar_movies(movie_id: str):
     try:
-        source_movie_res = supabase_admin.table('movies').select('title').eq('id', movie_id).single().execute()
+        source_movie_res = supabase_admin.table('movies').select(f'id, title, {CONTENT_FEATURE_COLUMNS}').eq('id', movie_id).single().execute()
         source_movie_title = source_movie_res.data.get('title') if source_movie_res.data else "선택한 영화"
-        content_sim_res = supabase_admin.table('cached_lists').select('data').eq('list_type', "content_similar_top_k").single().execute()
-        if not content_sim_res.data or not content_sim_res.data.get('data'): return []
-        content_similarities = json.loads(content_sim_res.data['data'])
-        similar_movies_data = content_similarities.get(str(movie_id))
-        if not similar_movies_data: return []
-        similar_movies_data.sort(key=lambda x: x['score'], reverse=True)
-        similar_movie_ids = [item['id'] for item in similar_movies_data]
+        # Includes movies inserted incrementally since the last retrain
+        neighbor_ids, _ = similarity_models.get().scorer.neighbors("content", movie_id)
+        if not len(neighbor_ids) and source_movie_res.data:
+            # 학습에 포함되지 않은 영화는 LSH 인덱스로 근사 이웃을 즉시 계산
+            neighbor_ids, _ = incremental_content.similar_movies(source_movie_res.data)
+        if not len(neighbor_ids): return []
+        # Neighbours are stored sorted by descending score
+        similar_movie_ids = [str(neighbor_id) for neighbor_id in neighbor_ids]
         movies_res = supabase_admin.table('movies').select('id, title, release_date, poster_url').in_('id', similar_movie_ids).execute()
         if not movies_res.data: return []
         movies_dict = {str(m['id']): m for m in movies_res.data}
@@ -429,13 +459,13 @@ async def get_movie_detail_by_id(movie_id: str, current_user: dict | None = Depe
         if "PGRST116" not in str(e): print(f"DB 캐시 조회 중 오류: {e}")
 
     # 2. Determine ID type and fetch initial data
-    is_kobis_id = len(movie_id) > 7 and movie_id.isdigit()
+    is_kobis_id = is_kobis_movie_code(movie_id)
     
     details = {}
     tmdb_details = {}
 
     if is_kobis_id:
-        kobis_details = get_movie_details(movie_id)
+        kobis_details = await get_movie_details_async(movie_id)
         if not kobis_details or not kobis_details.get('movieNm'):
             raise HTTPException(status_code=404, detail="KOBIS에서 영화 정보를 찾을 수 없습니다.")
         
@@ -445,7 +475,7 @@ async def get_movie_detail_by_id(movie_id: str, current_user: dict | None = Depe
         details['runtime'] = int(kobis_details.get('showTm', 0))
 
         # Correctly get supplemental data from TMDB
-        tmdb_search_result = search_movie_by_title(kobis_details.get('movieNm'), kobis_details.get('openDt', '')[:4])
+        tmdb_search_result = await search_movie_by_title(kobis_details.get('movieNm'), kobis_details.get('openDt', '')[:4])
         if tmdb_search_result:
             tmdb_id = tmdb_search_result.get('id')
             tmdb_details = await get_movie_details_by_tmdb_id(tmdb_id) if tmdb_id else {}
@@ -1,24 +1,11 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
-from typing import List, Optional
-from collections import Counter
+from typing import Optional
 
 # 서비스, 스키마 임포트
-from kobis_service import get_person_details, get_daily_box_office, get_movie_details, search_person_by_name
-from schemas import PersonDetails, Person
-
-router = APIRouter(
-    prefix="/person", # prefix를 people에서 person으로 되돌림
-    tags=["People"],
-)
-
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
-from collections import Counter
-
-# 서비스, 스키마 임포트
-from kobis_service import get_person_details, get_daily_box_office, get_movie_details, search_person_by_name
+from kobis_service import get_person_details_async, get_daily_box_office_async, get_movie_details_async, search_person_by_name_async
 from tmdb_service import search_person_on_tmdb, get_full_poster_url
-from schemas import PersonDetails, Person, WeeklyPopularPerson, RelatedMovie
+from schemas import PersonDetails, WeeklyPopularPerson, RelatedMovie
 
 router = APIRouter(
     prefix="/person",
@@ -26,22 +13,24 @@ router = APIRouter(
 )
 
 @router.get("/weekly-popular", response_model=Optional[WeeklyPopularPerson])
-def get_weekly_popular_person():
+async def get_weekly_popular_person():
     """
     현재 박스오피스 상위 영화에 가장 많이 등장하는 배우 또는 감독을 찾아,
     사진, 관련 영화 정보와 함께 반환합니다.
     """
     try:
-        box_office = get_daily_box_office()
+        box_office = await get_daily_box_office_async()
         if not box_office:
             return None
 
         person_to_movies = {}
 
-        for movie_summary in box_office[:5]:
+        # 상위 5개 영화의 상세 정보를 동시에 조회
+        top_movies = box_office[:5]
+        movie_details = await asyncio.gather(*[get_movie_details_async(movie_summary.get('movieCd')) for movie_summary in top_movies])
+        for movie_summary, details in zip(top_movies, movie_details):
             movie_cd = movie_summary.get('movieCd')
             movie_nm = movie_summary.get('movieNm')
-            details = get_movie_details(movie_cd)
             if not details:
                 continue
 
@@ -65,13 +54,13 @@ def get_weekly_popular_person():
         kobis_id = top_person_data.get('kobis_id')
         if not kobis_id:
             # KOBIS ID가 없는 경우, 이름으로 다시 한번 조회 시도
-            kobis_id = search_person_by_name(top_person_name)
+            kobis_id = await search_person_by_name_async(top_person_name)
             if not kobis_id:
                 return None
 
         # TMDB에서 인물 사진 검색
         profile_url = None
-        tmdb_person = search_person_on_tmdb(top_person_name)
+        tmdb_person = await search_person_on_tmdb(top_person_name)
         if tmdb_person and tmdb_person.get('profile_path'):
             profile_url = get_full_poster_url(tmdb_person['profile_path'])
 
@@ -90,11 +79,11 @@ def get_weekly_popular_person():
 
 
 @router.get("/{person_id}", response_model=PersonDetails)
-def get_person_details_by_id(person_id: str):
+async def get_person_details_by_id(person_id: str):
     """
     KOBIS 영화인 코드를 사용하여 특정 인물의 상세 정보와 필모그래피를 가져옵니다.
     """
-    details = get_person_details(person_cd=person_id)
+    details = await get_person_details_async(person_cd=person_id)
     if not details:
         raise HTTPException(status_code=404, detail=f"ID {person_id}에 해당하는 영화인을 찾을 수 없습니다.")
     
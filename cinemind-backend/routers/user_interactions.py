@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from schemas import RatingCreate, ResponseMessage, UserActivityStatus
 from auth_handler import get_current_user
 from supabase_client import supabase_admin
+from recommendation_cache import home_recommendation_cache
+from incremental_collab import incremental_collab
 
 router = APIRouter(
     tags=["User Interactions"]
@@ -41,7 +43,7 @@ def get_user_activity_for_movie(movie_id: str = Query(...), current_user: dict =
         raise HTTPException(status_code=500, detail="활동 상태를 가져오는 중 오류가 발생했습니다.")
 
 @router.post("/ratings", response_model=ResponseMessage)
-async def create_or_update_rating(rating_data: RatingCreate, request: Request, current_user: dict = Depends(get_current_user)):
+async def create_or_update_rating(rating_data: RatingCreate, request: Request, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
     """
     영화에 대한 평점을 생성하거나 업데이트합니다. (상세 디버깅 모드)
     """
@@ -78,6 +80,11 @@ async def create_or_update_rating(rating_data: RatingCreate, request: Request, c
         else:
             print("[DEBUG] 4. UPDATE successful.")
 
+        # 새 평점이 반영되도록 모든 워커에서 이 사용자의 홈 추천 캐시를 무효화
+        home_recommendation_cache.invalidate_user(user_id)
+        # 응답 후 이 영화의 협업 필터링 Top-K 목록을 증분 갱신
+        background_tasks.add_task(incremental_collab.apply_rating, user_id, movie_id, rating_data.rating)
+
         print("--- [DEBUG] /ratings endpoint finished successfully ---\n")
         return {"message": "평점이 성공적으로 저장되었습니다."}
     except Exception as e:
@@ -94,6 +101,7 @@ def like_movie(movie_id: str, current_user: dict = Depends(get_current_user)):
             'user_id': current_user.id,
             'movie_id': movie_id
         }).execute()
+        home_recommendation_cache.invalidate_user(current_user.id)
         return {"message": "영화를 찜했습니다."}
     except Exception as e:
         print(f"Error liking movie: {e}")
@@ -112,6 +120,7 @@ def unlike_movie(movie_id: str, current_user: dict = Depends(get_current_user)):
         if not delete_result.data:
             return {"message": "찜한 기록이 없는 영화입니다."}
 
+        home_recommendation_cache.invalidate_user(current_user.id)
         return {"message": "영화 찜하기를 취소했습니다."}
     except Exception as e:
         print(f"Error unliking movie: {e}")
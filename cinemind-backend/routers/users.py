@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from collections import Counter
-from datetime import datetime
 
-from schemas import UserRatingWithMovie, UserActivityStatus, LikedMovie, TasteAnalysisResponse, RatingDistributionItem, Person
+from schemas import UserRatingWithMovie, LikedMovie, TasteAnalysisResponse, RatingDistributionItem, Person
 from auth_handler import get_current_user
 from supabase_client import supabase_admin
 from kobis_service import search_person_by_name
+from recommendation_cache import GENERATION_PREFIX
 
 router = APIRouter(
     prefix="/users",
@@ -225,6 +225,7 @@ def delete_user_account(current_user: dict = Depends(get_current_user)):
         supabase_admin.table('user_ratings').delete().eq('user_id', user_id).execute()
         supabase_admin.table('user_likes').delete().eq('user_id', user_id).execute()
         supabase_admin.table('profiles').delete().eq('id', user_id).execute()
+        supabase_admin.table('cached_lists').delete().eq('list_type', f"{GENERATION_PREFIX}{user_id}").execute()
 
         # Step 2: Delete the user from the auth.users table.
         # This will fail if there are still tables referencing this user and CASCADE is not on.
@@ -2,7 +2,12 @@ from fastapi import APIRouter, HTTPException
 from supabase_client import supabase_admin
 import httpx
 import os
+import asyncio
 from recommendation_service import train_and_save_content_similarity
+from training_scheduler import get_training_status
+from http_clients import tmdb_http, http_pool_stats
+from tmdb_cache import tmdb_response_cache
+from singleflight import singleflight_stats
 
 router = APIRouter(
     prefix="/utils",
@@ -27,37 +32,37 @@ async def seed_movies(pages: int = 10):
     print(f"Starting to seed database with up to {pages * 20} movies from TMDB...")
     unique_movies = {}  # Use a dictionary to handle duplicates automatically
     
-    async with httpx.AsyncClient() as client:
-        for page in range(1, pages + 1):
-            url = f"{TMDB_API_BASE_URL}/movie/popular"
-            params = {
-                "api_key": TMDB_API_KEY,
-                "language": "ko-KR",
-                "region": "KR",
-                "page": page
-            }
-            try:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                results = response.json().get("results", [])
+    client = tmdb_http.client()
+    for page in range(1, pages + 1):
+        url = f"{TMDB_API_BASE_URL}/movie/popular"
+        params = {
+            "api_key": TMDB_API_KEY,
+            "language": "ko-KR",
+            "region": "KR",
+            "page": page
+        }
+        try:
+            response = await client.get(url, params=params)
+            response.raise_for_status()
+            results = response.json().get("results", [])
                 
-                for movie in results:
-                    if movie.get("poster_path"):
-                        movie_id_str = str(movie["id"])
-                        # By using the ID as a key, we overwrite any duplicates.
-                        unique_movies[movie_id_str] = {
-                            "id": movie_id_str,
-                            "title": movie["title"],
-                            "release_date": movie.get("release_date"),
-                            "poster_url": get_full_poster_url(movie.get('poster_path')),
-                            "synopsis": movie.get("overview"),
-                        }
-            except httpx.HTTPStatusError as e:
-                print(f"Error fetching page {page} from TMDB: {e.response.status_code}")
-                continue
-            except Exception as e:
-                print(f"An unexpected error occurred while fetching page {page}: {e}")
-                continue
+            for movie in results:
+                if movie.get("poster_path"):
+                    movie_id_str = str(movie["id"])
+                    # By using the ID as a key, we overwrite any duplicates.
+                    unique_movies[movie_id_str] = {
+                        "id": movie_id_str,
+                        "title": movie["title"],
+                        "release_date": movie.get("release_date"),
+                        "poster_url": get_full_poster_url(movie.get('poster_path')),
+                        "synopsis": movie.get("overview"),
+                    }
+        except httpx.HTTPStatusError as e:
+            print(f"Error fetching page {page} from TMDB: {e.response.status_code}")
+            continue
+        except Exception as e:
+            print(f"An unexpected error occurred while fetching page {page}: {e}")
+            continue
 
     if not unique_movies:
         raise HTTPException(status_code=500, detail="No movies could be fetched from TMDB.")
@@ -78,7 +83,36 @@ async def train_content_similarity_endpoint():
     Triggers the training and saving of content-based movie similarities.
     """
     print("콘텐츠 기반 유사도 모델 학습을 시작합니다...")
-    await train_and_save_content_similarity()
+    # CPU 집약적인 학습이 이벤트 루프를 막지 않도록 별도 스레드에서 실행합니다.
+    await asyncio.to_thread(train_and_save_content_similarity)
     print("콘텐츠 기반 유사도 모델 학습 완료.")
     return {"message": "콘텐츠 기반 유사도 모델 학습이 성공적으로 완료되었습니다."}
 
+@router.get("/training-status")
+def training_status_endpoint():
+    """
+    백그라운드 학습 스케줄러의 상태(리더 여부, 모델별 마지막 학습 시각과 결과)를 반환합니다.
+    """
+    return get_training_status()
+
+@router.get("/http-pool-stats")
+async def http_pool_stats_endpoint():
+    """
+    공유 HTTP 클라이언트의 커넥션 풀 사용 현황(활성/유휴 연결, HTTP/2 연결, 처리 중·대기 중 요청)을 반환합니다.
+    이벤트 루프에서 실행되어야 앱이 사용하는 루프의 클라이언트 현황을 읽습니다.
+    """
+    return http_pool_stats()
+
+@router.get("/tmdb-cache-stats")
+def tmdb_cache_stats_endpoint():
+    """
+    TMDB 응답 캐시의 적중/미스/축출 횟수와 엔드포인트별 카운터를 반환합니다.
+    """
+    return tmdb_response_cache.stats()
+
+@router.get("/singleflight-stats")
+def singleflight_stats_endpoint():
+    """
+    동시 요청 병합 그룹별로 실제 실행된 호출 수와 진행 중인 호출에 합류한 요청 수를 반환합니다.
+    """
+    return singleflight_stats()
@@ -0,0 +1,158 @@
+# scoring_engine.py
+import numpy as np
+from scipy import sparse
+from typing import Dict, Iterable, List, Tuple
+
+from similarity_artifact import TopKArtifact
+
+def _as_csr(artifact: TopKArtifact) -> sparse.csr_matrix:
+    """Wraps the (possibly memory-mapped) artifact arrays as a CSR matrix without copying them."""
+    n = len(artifact)
+    return sparse.csr_matrix((artifact.scores, artifact.indices, artifact.indptr), shape=(n, n), copy=False)
+
+class HybridScoringEngine:
+    """
+    Vectorised hybrid scoring over the collaborative and content Top-K matrices.
+
+    Both artifacts are mapped onto one catalog index space (the sorted union of
+    their ids). A user's weighted ratings become a sparse row vector, which is
+    multiplied by each neighbour matrix; the results are scattered into a
+    single dense score array over the catalog.
+
+    Rows refreshed incrementally since the artifact was trained are kept in a
+    small per-model override map and take precedence over the artifact rows.
+    Movies that only appear in override rows (inserted or first rated after
+    the last retrain) get score slots after the catalog in an append-only
+    extension table, so they can be recommended like any catalog movie.
+    `movie_ids` maps every score slot back to its movie id.
+    """
+
+    def __init__(self, collab: TopKArtifact, content: TopKArtifact):
+        self.collab = collab
+        self.content = content
+        self.catalog_ids = np.union1d(np.asarray(collab.ids), np.asarray(content.ids))
+        self._collab_to_catalog = np.searchsorted(self.catalog_ids, collab.ids)
+        self._content_to_catalog = np.searchsorted(self.catalog_ids, content.ids)
+        self._collab_matrix = _as_csr(collab)
+        self._content_matrix = _as_csr(content)
+        self._overrides: Dict[str, Dict[str, Tuple[np.ndarray, np.ndarray]]] = {"collab": {}, "content": {}}
+        self._extension: Dict[str, int] = {}
+        self.movie_ids = self.catalog_ids
+
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+
+    def catalog_indices(self, movie_ids: Iterable) -> np.ndarray:
+        """Maps movie ids to score slots (catalog, then extension); unknown ids map to -1."""
+        query = np.asarray([str(movie_id) for movie_id in movie_ids], dtype=str)
+        if not len(query):
+            return np.full(0, -1, dtype=np.int64)
+        if len(self.catalog_ids):
+            positions = np.minimum(np.searchsorted(self.catalog_ids, query), len(self.catalog_ids) - 1)
+            indices = np.where(self.catalog_ids[positions] == query, positions, -1).astype(np.int64)
+        else:
+            indices = np.full(len(query), -1, dtype=np.int64)
+        if self._extension:
+            for i in np.flatnonzero(indices < 0):
+                indices[i] = self._extension.get(query[i], -1)
+        return indices
+
+    def _extend(self, movie_ids: Iterable[str]):
+        """Gives movies outside the catalog a score slot. Slots are only ever appended."""
+        new_ids = [movie_id for movie_id in dict.fromkeys(movie_ids) if movie_id not in self._extension]
+        new_ids = [movie_id for movie_id, index in zip(new_ids, self.catalog_indices(new_ids)) if index < 0]
+        if not new_ids:
+            return
+        for movie_id in new_ids:
+            self._extension[movie_id] = len(self.catalog_ids) + len(self._extension)
+        # Assigned last: a reader sizing a score array by `len(self)` never sees an unmapped slot
+        self.movie_ids = np.concatenate([self.movie_ids, np.asarray(new_ids, dtype=str)])
+
+    def override_rows(self, model: str, rows: Dict[str, Tuple[List[str], List[float]]]):
+        """Replaces the Top-K lists of some movies of `model` ("collab" or "content") until the next snapshot."""
+        overrides = self._overrides[model]
+        rows = {str(movie_id): (np.asarray(neighbor_ids, dtype=str), np.asarray(neighbor_scores, dtype=np.float32)) for movie_id, (neighbor_ids, neighbor_scores) in rows.items()}
+        self._extend([slot_id for movie_id, (neighbor_ids, _) in rows.items() for slot_id in [movie_id, *neighbor_ids]])
+        for movie_id, row in rows.items():
+            # Single key assignment: concurrent readers see either the old or the new row
+            overrides[movie_id] = row
+
+    def inherit_overrides(self, previous: "HybridScoringEngine", models: Iterable[str]):
+        """Carries the override rows of unchanged models over from the previous snapshot's engine."""
+        for model in models:
+            overrides = previous._overrides[model]
+            self._extend([slot_id for movie_id, (neighbor_ids, _) in list(overrides.items()) for slot_id in [movie_id, *neighbor_ids]])
+            self._overrides[model] = overrides
+
+    def neighbors(self, model: str, movie_id) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (neighbour movie ids, scores) of a movie, honouring incremental overrides."""
+        override = self._overrides[model].get(str(movie_id))
+        if override is not None:
+            return override
+        artifact = self.collab if model == "collab" else self.content
+        neighbor_indices, neighbor_scores = artifact.neighbors(movie_id)
+        return artifact.ids[neighbor_indices], neighbor_scores
+
+    def _propagate(self, model: str, artifact: TopKArtifact, matrix: sparse.csr_matrix, to_catalog: np.ndarray, movie_weights: Dict[str, float], scale: float, out: np.ndarray):
+        if not scale or not movie_weights:
+            return
+        overrides = self._overrides[model]
+        base_weights = {}
+        for movie_id, weight in movie_weights.items():
+            override = overrides.get(str(movie_id))
+            if override is None:
+                base_weights[movie_id] = weight
+                continue
+            neighbor_indices = self.catalog_indices(override[0])
+            # Slots appended after `out` was sized are left for the next request
+            known = (neighbor_indices >= 0) & (neighbor_indices < len(out))
+            np.add.at(out, neighbor_indices[known], override[1][known] * (weight * scale))
+
+        if not len(artifact) or not base_weights:
+            return
+        rows = artifact.indices_of(list(base_weights.keys()))
+        known = rows >= 0
+        if not known.any():
+            return
+        weights = np.fromiter(base_weights.values(), dtype=np.float32, count=len(base_weights))[known] * scale
+        user_vector = sparse.csr_matrix((weights, (np.zeros(known.sum(), dtype=np.int32), rows[known])), shape=(1, len(artifact)))
+        # (1 x N) @ (N x N) sparse product: touches only the rated rows' neighbour lists
+        propagated = user_vector @ matrix
+        np.add.at(out, to_catalog[propagated.indices], propagated.data)
+
+    def score(self, movie_weights: Dict[str, float], collab_weight: float, content_weight: float) -> np.ndarray:
+        """
+        Returns a float32 score for every score slot (see `movie_ids`):
+        sum over weighted movies m of weight(m) * (collab_weight * collab_sim(m, .) + content_weight * content_sim(m, .)).
+        """
+        scores = np.zeros(len(self.movie_ids), dtype=np.float32)
+        self._propagate("collab", self.collab, self._collab_matrix, self._collab_to_catalog, movie_weights, collab_weight, scores)
+        self._propagate("content", self.content, self._content_matrix, self._content_to_catalog, movie_weights, content_weight, scores)
+        return scores
+
+    def seen_mask(self, seen_movie_ids: Iterable) -> np.ndarray:
+        mask = np.zeros(len(self.movie_ids), dtype=bool)
+        indices = self.catalog_indices(seen_movie_ids)
+        mask[indices[(indices >= 0) & (indices < len(mask))]] = True
+        return mask
+
+    def scores_for(self, scores: np.ndarray, movie_ids: List) -> np.ndarray:
+        """Looks up the scores of specific movies; movies outside the catalog score 0."""
+        indices = self.catalog_indices(movie_ids)
+        indices[indices >= len(scores)] = -1
+        return np.where(indices >= 0, scores[np.maximum(indices, 0)] if len(scores) else 0, 0).astype(np.float32)
+
+    def top_n(self, scores: np.ndarray, n: int, exclude: np.ndarray = None) -> List[Tuple[str, float]]:
+        """Returns the `n` highest positive-scoring (movie id, score) pairs, skipping masked movies."""
+        candidates = scores > 0
+        if exclude is not None:
+            candidates &= ~exclude
+        candidate_indices = np.flatnonzero(candidates)
+        if n <= 0 or not len(candidate_indices):
+            return []
+        if len(candidate_indices) > n:
+            partition = np.argpartition(scores[candidate_indices], -n)[-n:]
+            candidate_indices = candidate_indices[partition]
+        ordered = candidate_indices[np.argsort(-scores[candidate_indices], kind='stable')]
+        movie_ids = self.movie_ids
+        return [(str(movie_ids[i]), float(scores[i])) for i in ordered]
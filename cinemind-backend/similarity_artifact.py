@@ -0,0 +1,282 @@
+# similarity_artifact.py
+import io
+import os
+import re
+import json
+import base64
+import shutil
+import tempfile
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from datetime import timezone
+from dateutil.parser import isoparse
+
+# Artifacts are written once per model version and opened read-only with mmap,
+# so every worker on the host shares the same page-cached copy.
+MODEL_ARTIFACT_DIR = os.getenv('MODEL_ARTIFACT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_artifacts'))
+ARTIFACT_VERSIONS_TO_KEEP = 2
+# Score encoding of the shared `cached_lists` copy of Top-K models: "int8" (per-row scale) or "float32".
+SIMILARITY_SCORE_ENCODING = os.getenv('SIMILARITY_SCORE_ENCODING', 'int8')
+
+_ARRAY_NAMES = ('indptr', 'indices', 'scores', 'ids', 'id_order')
+
+class TopKArtifact:
+    """
+    Top-K neighbour lists stored as contiguous arrays.
+
+    - `indptr` (int64, N+1), `indices` (int32), `scores` (float32): CSR layout,
+      the neighbours of movie index i are `indices[indptr[i]:indptr[i+1]]`.
+    - `ids` (unicode, N): movie id of each index.
+    - `id_order` (int32, N): permutation that sorts `ids`, used for
+      id -> index lookups with `np.searchsorted` so no per-worker dict is built.
+
+    `snapshot_started` is when training began reading its source table: writes
+    made after it may be missing from the model, so incremental updates replay
+    everything from that point rather than from the (later) save time.
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray, ids: np.ndarray, id_order: np.ndarray, version: Optional[str] = None, snapshot_started: Optional[str] = None):
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.ids = ids
+        self.id_order = id_order
+        self.version = version
+        self.snapshot_started = snapshot_started
+
+    @classmethod
+    def empty(cls) -> "TopKArtifact":
+        return cls(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32), np.empty(0, dtype='U1'), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def from_arrays(cls, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray, movie_ids: List[str], version: Optional[str] = None) -> "TopKArtifact":
+        ids = np.asarray([str(movie_id) for movie_id in movie_ids], dtype=str)
+        return cls(
+            np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int32), np.asarray(scores, dtype=np.float32),
+            ids, np.argsort(ids, kind='stable').astype(np.int32), version,
+        )
+
+    @classmethod
+    def from_top_k_dict(cls, top_k_similarities: Dict[str, List[Dict]], version: Optional[str] = None) -> "TopKArtifact":
+        """Converts the legacy `{movie_id: [{"id", "score"}]}` JSON map into arrays."""
+        movie_ids = list(top_k_similarities.keys())
+        position = {movie_id: i for i, movie_id in enumerate(movie_ids)}
+        # Neighbours that have no list of their own still need an index
+        for neighbors in top_k_similarities.values():
+            for neighbor in neighbors:
+                neighbor_id = str(neighbor["id"])
+                if neighbor_id not in position:
+                    position[neighbor_id] = len(movie_ids)
+                    movie_ids.append(neighbor_id)
+
+        indptr = np.zeros(len(movie_ids) + 1, dtype=np.int64)
+        indices, scores = [], []
+        for i, movie_id in enumerate(movie_ids):
+            neighbors = top_k_similarities.get(movie_id, [])
+            indices.extend(position[str(neighbor["id"])] for neighbor in neighbors)
+            scores.extend(neighbor["score"] for neighbor in neighbors)
+            indptr[i + 1] = len(indices)
+        return cls.from_arrays(indptr, np.asarray(indices, dtype=np.int32), np.asarray(scores, dtype=np.float32), movie_ids, version)
+
+    @classmethod
+    def from_cached_list(cls, data: str, version: Optional[str] = None) -> "TopKArtifact":
+        """
+        Converts the `data` column of a `cached_lists` model row: the compact
+        npz document written by `to_cached_list`, or the legacy JSON map.
+        """
+        document = json.loads(data)
+        if document.get("format") != "npz":
+            return cls.from_top_k_dict(document, version)
+        with np.load(io.BytesIO(base64.b64decode(document["payload"]))) as arrays:
+            indptr = arrays["indptr"]
+            if document.get("scores") == "int8":
+                scores = dequantize_rows(indptr, arrays["scores"], arrays["row_scales"])
+            else:
+                scores = arrays["scores"]
+            artifact = cls.from_arrays(indptr, arrays["indices"], scores, arrays["ids"].tolist(), version)
+        artifact.snapshot_started = document.get("snapshot_started")
+        return artifact
+
+    def to_cached_list(self, encoding: str = SIMILARITY_SCORE_ENCODING) -> str:
+        """
+        Compact shared copy for `cached_lists`: the CSR arrays with each movie id
+        stored once, as a compressed .npz, base64 encoded. With "int8" encoding
+        the scores are quantized per row (score ~= q * row_scale).
+        """
+        arrays = {"indptr": np.asarray(self.indptr, dtype=np.int64), "indices": np.asarray(self.indices, dtype=np.int32), "ids": np.asarray(self.ids)}
+        if encoding == "int8":
+            arrays["scores"], arrays["row_scales"] = quantize_rows(arrays["indptr"], self.scores)
+        else:
+            arrays["scores"] = np.asarray(self.scores, dtype=np.float32)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return json.dumps({"format": "npz", "scores": encoding, "snapshot_started": self.snapshot_started, "payload": base64.b64encode(buffer.getvalue()).decode('ascii')})
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __bool__(self) -> bool:
+        return len(self.ids) > 0
+
+    def __contains__(self, movie_id) -> bool:
+        return self.index_of(movie_id) is not None
+
+    def index_of(self, movie_id) -> Optional[int]:
+        if not len(self.ids):
+            return None
+        movie_id = str(movie_id)
+        position = np.searchsorted(self.ids, movie_id, sorter=self.id_order)
+        if position < len(self.ids) and self.ids[self.id_order[position]] == movie_id:
+            return int(self.id_order[position])
+        return None
+
+    def indices_of(self, movie_ids: List) -> np.ndarray:
+        """Vectorised id -> index lookup; unknown ids map to -1."""
+        return lookup_indices(self.ids, self.id_order, movie_ids)
+
+    def neighbors(self, movie_id) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (neighbour indices, scores) for a movie id, sorted by descending score."""
+        index = self.index_of(movie_id)
+        if index is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        row = slice(self.indptr[index], self.indptr[index + 1])
+        return self.indices[row], self.scores[row]
+
+    def save(self, name: str, version: str) -> str:
+        """Writes the arrays under `<MODEL_ARTIFACT_DIR>/<name>/<version>`."""
+        meta = {"version": version, "movies": len(self), "neighbors": int(len(self.indices)), "snapshot_started": self.snapshot_started}
+        return save_arrays(name, version, {array_name: getattr(self, array_name) for array_name in _ARRAY_NAMES}, meta)
+
+    @classmethod
+    def load(cls, name: str, version: str) -> Optional["TopKArtifact"]:
+        """Opens a saved artifact memory-mapped, or returns None if this version is not on disk."""
+        arrays = load_arrays(name, version, _ARRAY_NAMES)
+        if arrays is None:
+            return None
+        with open(os.path.join(artifact_dir(name, version), 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(version=version, snapshot_started=meta.get("snapshot_started"), **arrays)
+
+class ContentVectorArtifact:
+    """
+    The fitted TF-IDF state of a content model, saved next to its Top-K lists
+    under the same version so new movies can be vectorised and compared later.
+
+    - `data`, `indices`, `indptr`: the L2-normalised TF-IDF matrix (CSR).
+    - `ids` (unicode, N): movie id of each matrix row.
+    - `terms` (unicode, V) and `idf` (float64, V): the vocabulary in column order and its IDF weights.
+    """
+
+    ARTIFACT_NAME = "content_vectors"
+    _ARRAY_NAMES = ('data', 'indices', 'indptr', 'ids', 'terms', 'idf')
+
+    def __init__(self, data: np.ndarray, indices: np.ndarray, indptr: np.ndarray, ids: np.ndarray, terms: np.ndarray, idf: np.ndarray, version: Optional[str] = None):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.ids = ids
+        self.terms = terms
+        self.idf = idf
+        self.version = version
+
+    @classmethod
+    def from_vectorizer(cls, tfidf_vectorizer, tfidf_matrix, movie_ids: List[str], version: Optional[str] = None) -> "ContentVectorArtifact":
+        terms = np.empty(len(tfidf_vectorizer.vocabulary_), dtype=object)
+        for term, column in tfidf_vectorizer.vocabulary_.items():
+            terms[column] = term
+        matrix = tfidf_matrix.tocsr()
+        return cls(
+            matrix.data.astype(np.float32), matrix.indices.astype(np.int32), matrix.indptr.astype(np.int64),
+            np.asarray([str(movie_id) for movie_id in movie_ids], dtype=str), terms.astype(str),
+            np.asarray(tfidf_vectorizer.idf_, dtype=np.float64), version,
+        )
+
+    def save(self, version: str) -> str:
+        meta = {"version": version, "movies": len(self.ids), "terms": len(self.terms)}
+        return save_arrays(self.ARTIFACT_NAME, version, {array_name: getattr(self, array_name) for array_name in self._ARRAY_NAMES}, meta)
+
+    @classmethod
+    def load(cls, version: str) -> Optional["ContentVectorArtifact"]:
+        arrays = load_arrays(cls.ARTIFACT_NAME, version, cls._ARRAY_NAMES)
+        return cls(version=version, **arrays) if arrays is not None else None
+
+def quantize_rows(indptr: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Quantizes CSR row values to int8 with one float32 scale per row (the row's
+    largest magnitude / 127), so each score is off by at most half a step.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    lengths = np.diff(indptr)
+    row_scales = np.zeros(len(lengths), dtype=np.float32)
+    non_empty = lengths > 0
+    if len(scores):
+        row_scales[non_empty] = np.maximum.reduceat(np.abs(scores), indptr[:-1][non_empty]) / 127
+    value_scales = np.repeat(row_scales, lengths)
+    quantized = np.divide(scores, value_scales, out=np.zeros_like(scores), where=value_scales > 0)
+    return np.clip(np.rint(quantized), -127, 127).astype(np.int8), row_scales
+
+def dequantize_rows(indptr: np.ndarray, quantized: np.ndarray, row_scales: np.ndarray) -> np.ndarray:
+    return quantized.astype(np.float32) * np.repeat(np.asarray(row_scales, dtype=np.float32), np.diff(indptr))
+
+def lookup_indices(ids: np.ndarray, id_order: np.ndarray, query_ids: List) -> np.ndarray:
+    """Maps ids to their positions in `ids` (sorted by `id_order`) with `np.searchsorted`; unknown ids map to -1."""
+    if not len(ids) or not len(query_ids):
+        return np.full(len(query_ids), -1, dtype=np.int64)
+    query = np.asarray([str(query_id) for query_id in query_ids], dtype=str)
+    positions = np.minimum(np.searchsorted(ids, query, sorter=id_order), len(ids) - 1)
+    candidates = id_order[positions]
+    return np.where(ids[candidates] == query, candidates, -1).astype(np.int64)
+
+def artifact_version(last_updated: str) -> str:
+    """
+    Canonical version key for a `cached_lists.last_updated` stamp. Postgres and
+    Python format the same instant differently, so compare parsed UTC values.
+    """
+    parsed = isoparse(last_updated)
+    parsed = parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return parsed.strftime('%Y%m%dT%H%M%S%fZ')
+
+def artifact_dir(name: str, version: str) -> str:
+    safe_version = re.sub(r'[^0-9A-Za-z_.-]', '_', version)
+    return os.path.join(MODEL_ARTIFACT_DIR, name, safe_version)
+
+def save_arrays(name: str, version: str, arrays: Dict[str, np.ndarray], meta: Dict) -> str:
+    """
+    Writes arrays as .npy files under `<MODEL_ARTIFACT_DIR>/<name>/<version>`.
+    The directory is populated under a temporary name and renamed into place,
+    so concurrent readers never observe a partial artifact.
+    """
+    version_dir = artifact_dir(name, version)
+    if os.path.isdir(version_dir):
+        return version_dir
+    os.makedirs(os.path.dirname(version_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(version_dir))
+    try:
+        for array_name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{array_name}.npy"), array)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.rename(tmp_dir, version_dir)
+    except OSError:
+        # Another worker finished writing the same version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(version_dir):
+            raise
+    _remove_old_versions(name, keep=version_dir)
+    return version_dir
+
+def load_arrays(name: str, version: str, array_names) -> Optional[Dict[str, np.ndarray]]:
+    version_dir = artifact_dir(name, version)
+    if not os.path.isdir(version_dir):
+        return None
+    return {array_name: np.load(os.path.join(version_dir, f"{array_name}.npy"), mmap_mode='r') for array_name in array_names}
+
+def _remove_old_versions(name: str, keep: str):
+    name_dir = os.path.join(MODEL_ARTIFACT_DIR, name)
+    versions = sorted(
+        (os.path.join(name_dir, entry) for entry in os.listdir(name_dir) if not entry.startswith('.')),
+        key=os.path.getmtime, reverse=True,
+    )
+    # Workers still mapping an old version keep their pages until they swap; unlinking is safe.
+    for stale_dir in [v for v in versions if v != keep][ARTIFACT_VERSIONS_TO_KEEP - 1:]:
+        shutil.rmtree(stale_dir, ignore_errors=True)
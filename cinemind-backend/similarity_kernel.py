@@ -0,0 +1,87 @@
+# similarity_kernel.py
+import os
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from typing import Callable, List, Optional, Tuple
+
+# Upper bound for one dense block of similarity scores (rows x all items, float32).
+SIMILARITY_BLOCK_BYTES = int(os.getenv('SIMILARITY_BLOCK_BYTES', str(64 * 1024 * 1024)))
+
+def compute_top_k_neighbors(item_vectors, top_k: int = 50, block_bytes: int = SIMILARITY_BLOCK_BYTES) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Computes the top-K cosine neighbours of every row of `item_vectors` without
+    ever materialising the full N x N similarity matrix.
+
+    Rows are processed in blocks sized so that one dense block of scores stays
+    under `block_bytes`. Each block is reduced with `np.argpartition` and then
+    dropped. The movie itself and non-positive scores are excluded.
+
+    Returns CSR-style arrays `(indptr, indices, scores)` where the neighbours of
+    row i are `indices[indptr[i]:indptr[i+1]]`, sorted by descending score.
+    """
+    if sparse.issparse(item_vectors):
+        vectors = normalize(sparse.csr_matrix(item_vectors, dtype=np.float32))
+    else:
+        vectors = normalize(np.asarray(item_vectors, dtype=np.float32))
+    vectors_t = vectors.T.tocsc() if sparse.issparse(vectors) else vectors.T
+
+    n_items = vectors.shape[0]
+    k = min(top_k, n_items - 1)
+    if k <= 0:
+        return np.zeros(n_items + 1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+    block_rows = max(1, block_bytes // max(1, n_items * 4))
+    row_lengths = np.zeros(n_items, dtype=np.int64)
+    index_blocks, score_blocks = [], []
+
+    for start in range(0, n_items, block_rows):
+        end = min(start + block_rows, n_items)
+        block = vectors[start:end] @ vectors_t
+        block = block.toarray() if sparse.issparse(block) else np.asarray(block)
+        block = block.astype(np.float32, copy=False)
+
+        # Never recommend a movie as its own neighbour
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+        candidates = np.argpartition(block, -k, axis=1)[:, -k:]
+        candidate_scores = np.take_along_axis(block, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+        keep = candidate_scores > 0
+        row_lengths[start:end] = keep.sum(axis=1)
+        index_blocks.append(candidates[keep].astype(np.int32))
+        score_blocks.append(candidate_scores[keep])
+        del block
+
+    indptr = np.zeros(n_items + 1, dtype=np.int64)
+    np.cumsum(row_lengths, out=indptr[1:])
+    return indptr, np.concatenate(index_blocks), np.concatenate(score_blocks)
+
+def top_k_row(scores: np.ndarray, movie_ids: List[str], top_k: int) -> Tuple[List[str], List[float]]:
+    """Returns the `top_k` positive entries of one dense score row as (movie ids, scores), best first."""
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > top_k:
+        candidates = candidates[np.argpartition(scores[candidates], -top_k)[-top_k:]]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return [movie_ids[i] for i in candidates], scores[candidates].tolist()
+
+def update_top_k_row(neighbor_ids, neighbor_scores, movie_id: str, score: float, top_k: int, recompute: Callable[[], Tuple[List[str], List[float]]]) -> Optional[Tuple[List[str], List[float]]]:
+    """
+    Inserts, updates or removes `movie_id` in one movie's Top-K list after its
+    similarity to that movie changed to `score`. Returns the new list, or None if
+    the list is unaffected. When the movie may drop out of a full list only a
+    recomputed row knows its replacement, so `recompute` is called instead.
+    """
+    row = {str(other_id): float(other_score) for other_id, other_score in zip(neighbor_ids, neighbor_scores)}
+    if movie_id not in row and (score <= 0 or (len(row) >= top_k and score <= min(row.values()))):
+        return None
+    if movie_id in row and score < row[movie_id] and len(row) >= top_k:
+        return recompute()
+    row.pop(movie_id, None)
+    if score > 0:
+        row[movie_id] = score
+    ranked = sorted(row.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [other_id for other_id, _ in ranked], [other_score for _, other_score in ranked]
@@ -0,0 +1,67 @@
+# singleflight.py
+import copy
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one upstream call.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it runs await that same task instead of starting their own, and the
+    key is forgotten as soon as it finishes, so nothing is cached beyond the
+    call itself. The task is shielded: a caller that is cancelled (e.g. its
+    client disconnected) does not cancel the fetch the others are waiting on.
+    Results are deep-copied per caller, since route handlers annotate them.
+    """
+
+    def __init__(self, name: str, copy_result: bool = True):
+        self.name = name
+        self.copy_result = copy_result
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        task = self._calls.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            self.calls += 1
+            task = asyncio.create_task(fn(*args, **kwargs), name=f"singleflight-{self.name}-{key}")
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result) if self.copy_result else result
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Marks the exception retrieved even if every caller was cancelled
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {"group": self.name, "in_flight": len(self._calls), "calls": self.calls, "coalesced": self.coalesced}
+
+_groups: Dict[str, SingleFlight] = {}
+
+def coalesce(name: str, key: Optional[Callable[..., Hashable]] = None, copy_result: bool = True):
+    """
+    Decorator running an async function through the SingleFlight group `name`.
+    `key` maps the call's arguments to the coalescing key (all arguments by default).
+    """
+    group = _groups.setdefault(name, SingleFlight(name, copy_result))
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            call_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return await group.do(call_key, fn, *args, **kwargs)
+        wrapper.singleflight = group
+        return wrapper
+    return decorator
+
+def singleflight_stats() -> Dict[str, Dict]:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,22 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Backend modules import each other top-level, as when uvicorn runs main.py from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MODEL_ARTIFACT_DIR', tempfile.mkdtemp(prefix='cinemind-test-artifacts-'))
+
+from benchmarks.fake_supabase import install
+
+# Registered before any backend import, so every module reads and writes this in-memory client
+_supabase = install()
+
+@pytest.fixture
+def supabase():
+    """The in-memory Supabase client, emptied for each test."""
+    _supabase.tables.clear()
+    _supabase._indexes.clear()
+    return _supabase
@@ -0,0 +1,62 @@
+# tests/test_ann_index.py
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from ann_index import LSHIndex
+from similarity_kernel import compute_top_k_neighbors
+
+TOP_K = 10
+
+@pytest.fixture(scope="module")
+def item_vectors():
+    """
+    L2-normalised sparse rows in clusters of near neighbours (cosine around
+    0.8), like remakes and sequels in the content TF-IDF vectors. Sign-projection
+    LSH only promises high recall for neighbours that close.
+    """
+    rng = np.random.default_rng(11)
+    n_items, n_terms, n_clusters, cluster_terms = 800, 600, 40, 20
+    centers = [(rng.choice(n_terms, size=cluster_terms, replace=False), rng.random(cluster_terms) + 0.5) for _ in range(n_clusters)]
+    rows, cols, values = [], [], []
+    for item in range(n_items):
+        terms, weights = centers[item % n_clusters]
+        kept = rng.random(cluster_terms) < 0.8
+        noise_terms = rng.choice(n_terms, size=3, replace=False)
+        rows += [item] * (kept.sum() + 3)
+        cols += terms[kept].tolist() + noise_terms.tolist()
+        values += (weights[kept] * rng.uniform(0.8, 1.2, kept.sum())).tolist() + (rng.random(3) * 0.5).tolist()
+    return normalize(sparse.csr_matrix((values, (rows, cols)), shape=(n_items, n_terms), dtype=np.float32))
+
+def _neighbor_sets(indptr, indices):
+    return [set(indices[indptr[i]:indptr[i + 1]].tolist()) for i in range(len(indptr) - 1)]
+
+def test_lsh_top_k_recall_against_exact_search(item_vectors):
+    exact = _neighbor_sets(*compute_top_k_neighbors(item_vectors, top_k=TOP_K)[:2])
+    index = LSHIndex.build(item_vectors)
+    indptr, indices, scores = index.top_k_neighbors(item_vectors, top_k=TOP_K)
+    approximate = _neighbor_sets(indptr, indices)
+
+    found = sum(len(a & e) for a, e in zip(approximate, exact))
+    assert found / sum(len(e) for e in exact) >= 0.9
+    # Candidates are re-scored exactly, so whatever is returned has its true cosine
+    for i in range(0, item_vectors.shape[0], 97):
+        row = slice(indptr[i], indptr[i + 1])
+        true_scores = (item_vectors[indices[row]] @ item_vectors[i].T).toarray().ravel()
+        assert scores[row] == pytest.approx(true_scores, abs=1e-5)
+        assert i not in indices[row]
+
+def test_multi_probe_candidates_cover_exact_neighbors(item_vectors):
+    exact = _neighbor_sets(*compute_top_k_neighbors(item_vectors, top_k=TOP_K)[:2])
+    index = LSHIndex.build(item_vectors, n_tables=8)
+    queries = range(0, item_vectors.shape[0], 10)
+    single = sum(len(exact[i] & set(index.candidates(item_vectors[i], multi_probe=False).tolist())) for i in queries)
+    multi = sum(len(exact[i] & set(index.candidates(item_vectors[i]).tolist())) for i in queries)
+    total = sum(len(exact[i]) for i in queries)
+    assert multi >= single
+    assert multi / total >= 0.9
+
+def test_candidates_respect_budget(item_vectors):
+    index = LSHIndex.build(item_vectors)
+    assert len(index.candidates(item_vectors[0], max_candidates=25)) <= 25
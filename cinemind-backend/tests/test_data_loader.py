@@ -0,0 +1,36 @@
+# tests/test_data_loader.py
+import data_loader
+from data_loader import iter_table_chunks
+
+def _load_ratings(supabase, n):
+    supabase.load('user_ratings', [{"id": i, "user_id": f"user-{i % 7}", "movie_id": i % 50, "rating": 4} for i in range(1, n + 1)])
+
+def test_streams_every_row_in_key_order(supabase):
+    _load_ratings(supabase, 2500)
+    chunks = list(iter_table_chunks('user_ratings', 'movie_id', chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert [row['id'] for chunk in chunks for row in chunk] == list(range(1, 2501))
+
+def test_keeps_paging_past_pages_shorter_than_the_chunk_size(supabase, monkeypatch):
+    _load_ratings(supabase, 2500)
+    fetch_page = data_loader._fetch_page
+    # The server caps every response below the requested chunk size, like PostgREST's max-rows
+    monkeypatch.setattr(data_loader, '_fetch_page', lambda table, columns, key, after, size: fetch_page(table, columns, key, after, min(size, 300)))
+
+    rows = [row for chunk in iter_table_chunks('user_ratings', 'movie_id', chunk_size=1000) for row in chunk]
+    assert [row['id'] for row in rows] == list(range(1, 2501))
+
+def test_after_key_skips_rows_already_read(supabase):
+    _load_ratings(supabase, 30)
+    rows = [row for chunk in iter_table_chunks('user_ratings', 'movie_id', chunk_size=8, after_key=25) for row in chunk]
+    assert [row['id'] for row in rows] == [26, 27, 28, 29, 30]
+
+def test_empty_table(supabase):
+    supabase.load('user_ratings', [])
+    assert list(iter_table_chunks('user_ratings', 'movie_id')) == []
+
+def test_stopping_early_does_not_leave_the_producer_blocked(supabase):
+    _load_ratings(supabase, 5000)
+    chunks = iter_table_chunks('user_ratings', 'movie_id', chunk_size=100, prefetch=1)
+    assert len(next(chunks)) == 100
+    chunks.close()
@@ -0,0 +1,103 @@
+# tests/test_rate_limit.py
+import asyncio
+import time
+
+import httpx
+
+from rate_limit import RateLimiter, RateLimitedTransport
+
+def _client(handler, limiter: RateLimiter, max_retries: int = 3) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=RateLimitedTransport(httpx.MockTransport(handler), limiter, max_retries), base_url="https://api.test")
+
+def _run(main):
+    # A leaked slot blocks the next request forever; fail instead of hanging the suite
+    return asyncio.run(asyncio.wait_for(main(), timeout=5))
+
+async def _body():
+    for _ in range(4):
+        await asyncio.sleep(0)
+        yield b"x" * 256
+
+def test_slot_is_held_until_the_body_is_closed():
+    limiter = RateLimiter("test", rate=1000, burst=1000, max_concurrency=1)
+
+    async def main():
+        # A streamed body, as the network transport returns it
+        async with _client(lambda request: httpx.Response(200, content=_body()), limiter) as client:
+            async with client.stream("GET", "/movie/1") as response:
+                assert limiter.in_flight == 1
+                # The only slot is still taken while the body is being read
+                second = asyncio.create_task(client.get("/movie/2"))
+                await asyncio.sleep(0.01)
+                assert not second.done() and limiter.waiting == 1
+                await response.aread()
+            assert (await second).status_code == 200
+        assert limiter.in_flight == 0 and limiter.waiting == 0
+
+    _run(main)
+
+def test_slot_is_released_for_a_body_read_in_advance():
+    limiter = RateLimiter("test", rate=1000, burst=1000, max_concurrency=1)
+
+    async def main():
+        async with _client(lambda request: httpx.Response(200, content=b"{}"), limiter) as client:
+            for movie_id in range(3):
+                assert (await client.get(f"/movie/{movie_id}")).status_code == 200
+        assert limiter.in_flight == 0
+
+    _run(main)
+
+def test_slot_is_released_when_the_transport_fails():
+    limiter = RateLimiter("test", rate=1000, burst=1000, max_concurrency=1)
+
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    async def main():
+        async with _client(handler, limiter) as client:
+            for _ in range(2):
+                try:
+                    await client.get("/movie/1")
+                except httpx.ConnectError:
+                    pass
+        assert limiter.in_flight == 0
+
+    _run(main)
+
+def test_429_is_retried_after_retry_after():
+    limiter = RateLimiter("test", rate=1000, burst=1000, max_concurrency=2)
+    attempts = []
+
+    def handler(request):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.2"})
+        return httpx.Response(200, json={"ok": True})
+
+    async def main():
+        async with _client(handler, limiter) as client:
+            return await client.get("/movie/1")
+
+    response = _run(main)
+    assert response.status_code == 200 and response.json() == {"ok": True}
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.2
+    assert limiter.throttled == 1 and limiter.retries == 1 and limiter.gave_up == 0
+    assert limiter.in_flight == 0
+
+def test_429_is_returned_once_retries_run_out():
+    limiter = RateLimiter("test", rate=1000, burst=1000, max_concurrency=2)
+    attempts = []
+
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(429, headers={"Retry-After": "0"})
+
+    async def main():
+        async with _client(handler, limiter, max_retries=2) as client:
+            return await client.get("/movie/1")
+
+    assert _run(main).status_code == 429
+    assert len(attempts) == 3
+    assert limiter.throttled == 3 and limiter.retries == 2 and limiter.gave_up == 1
+    assert limiter.in_flight == 0
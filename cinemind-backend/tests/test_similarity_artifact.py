@@ -0,0 +1,38 @@
+# tests/test_similarity_artifact.py
+import numpy as np
+
+from similarity_artifact import quantize_rows, dequantize_rows
+
+def test_int8_round_trip_is_within_half_a_step_per_row():
+    rng = np.random.default_rng(3)
+    lengths = rng.integers(0, 30, size=200)
+    lengths[[0, 17, 199]] = 0
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    # Rows of very different magnitudes, as with raw co-rating and cosine scores
+    scores = (rng.random(indptr[-1]) * np.repeat(10.0 ** rng.integers(-3, 3, size=len(lengths)), lengths)).astype(np.float32)
+
+    quantized, row_scales = quantize_rows(indptr, scores)
+    assert quantized.dtype == np.int8 and row_scales.dtype == np.float32
+    restored = dequantize_rows(indptr, quantized, row_scales)
+
+    steps = np.repeat(row_scales, lengths)
+    assert np.all(np.abs(restored - scores) <= steps / 2 + 1e-6 * np.abs(scores))
+    # Each row's largest magnitude maps to 127, so the best neighbour keeps its value
+    for i in np.flatnonzero(lengths):
+        row = slice(indptr[i], indptr[i + 1])
+        assert np.abs(quantized[row]).max() == 127
+        assert np.isclose(restored[row].max(), scores[row].max(), rtol=1e-6)
+
+def test_zero_rows_stay_zero():
+    indptr = np.array([0, 3, 3, 5])
+    scores = np.array([0, 0, 0, 0.5, -0.25], dtype=np.float32)
+    quantized, row_scales = quantize_rows(indptr, scores)
+    restored = dequantize_rows(indptr, quantized, row_scales)
+    assert row_scales[:2].tolist() == [0.0, 0.0]
+    assert restored[:3].tolist() == [0.0, 0.0, 0.0]
+    assert np.allclose(restored[3:], scores[3:], atol=row_scales[2] / 2)
+
+def test_empty_scores():
+    quantized, row_scales = quantize_rows(np.zeros(3, dtype=np.int64), np.empty(0, dtype=np.float32))
+    assert len(quantized) == 0 and row_scales.tolist() == [0.0, 0.0]
@@ -0,0 +1,51 @@
+# tests/test_similarity_kernel.py
+import numpy as np
+import pytest
+from scipy import sparse
+
+from similarity_kernel import compute_top_k_neighbors
+
+def _brute_force_top_k(vectors: np.ndarray, top_k: int):
+    """Full N x N cosine matrix, self and non-positive scores excluded, best first."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+    similarities = unit @ unit.T
+    np.fill_diagonal(similarities, -np.inf)
+    rows = []
+    for row in similarities:
+        order = np.argsort(-row, kind='stable')[:top_k]
+        order = order[row[order] > 0]
+        rows.append(dict(zip(order.tolist(), row[order].tolist())))
+    return rows
+
+def _rows(indptr, indices, scores):
+    return [dict(zip(indices[indptr[i]:indptr[i + 1]].tolist(), scores[indptr[i]:indptr[i + 1]].tolist())) for i in range(len(indptr) - 1)]
+
+@pytest.mark.parametrize("block_bytes", [64 * 1024 * 1024, 4 * 120, 1])
+@pytest.mark.parametrize("as_sparse", [False, True])
+def test_blockwise_top_k_matches_brute_force(block_bytes, as_sparse):
+    rng = np.random.default_rng(7)
+    # Nonnegative and mostly zero, like rating and TF-IDF vectors, so many pairs score 0
+    vectors = rng.random((120, 40)) * (rng.random((120, 40)) < 0.15)
+    indptr, indices, scores = compute_top_k_neighbors(sparse.csr_matrix(vectors) if as_sparse else vectors, top_k=10, block_bytes=block_bytes)
+
+    expected = _brute_force_top_k(vectors, 10)
+    for row, (got, want) in enumerate(zip(_rows(indptr, indices, scores), expected)):
+        # Ties at the cut may pick different movies; the scores must agree
+        assert sorted(got.values(), reverse=True) == pytest.approx(sorted(want.values(), reverse=True), abs=1e-5), row
+        assert row not in got
+        for neighbor, score in got.items():
+            assert score == pytest.approx(expected[row].get(neighbor, score), abs=1e-5)
+
+def test_rows_are_sorted_best_first():
+    vectors = np.random.default_rng(1).random((50, 8))
+    indptr, indices, scores = compute_top_k_neighbors(vectors, top_k=5, block_bytes=4 * 50 * 7)
+    for i in range(50):
+        row = scores[indptr[i]:indptr[i + 1]]
+        assert len(row) == 5
+        assert np.all(np.diff(row) <= 0)
+
+def test_single_item_has_no_neighbors():
+    indptr, indices, scores = compute_top_k_neighbors(np.ones((1, 3)), top_k=5)
+    assert indptr.tolist() == [0, 0]
+    assert len(indices) == len(scores) == 0
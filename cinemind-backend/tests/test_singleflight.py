@@ -0,0 +1,86 @@
+# tests/test_singleflight.py
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_upstream_call():
+    group = SingleFlight("test")
+    upstream_calls = []
+
+    async def fetch(movie_id):
+        upstream_calls.append(movie_id)
+        await asyncio.sleep(0.01)
+        return {"id": movie_id, "genres": ["drama"]}
+
+    async def main():
+        return await asyncio.gather(*(group.do(("movie", 1), fetch, 1) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert upstream_calls == [1]
+    assert group.calls == 1 and group.coalesced == 9
+    assert all(result == {"id": 1, "genres": ["drama"]} for result in results)
+    # Each caller gets its own copy to annotate
+    results[0]["genres"].append("mutated")
+    assert results[1]["genres"] == ["drama"]
+    assert len({id(result) for result in results}) == 10
+
+def test_different_keys_are_not_coalesced():
+    group = SingleFlight("test")
+
+    async def fetch(movie_id):
+        await asyncio.sleep(0)
+        return movie_id
+
+    async def main():
+        return await asyncio.gather(group.do(1, fetch, 1), group.do(2, fetch, 2))
+
+    assert asyncio.run(main()) == [1, 2]
+    assert group.calls == 2 and group.coalesced == 0
+
+def test_errors_propagate_to_every_waiting_caller():
+    group = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(*(group.do("key", fetch) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert group.calls == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream down" for result in results)
+
+def test_key_is_forgotten_once_the_call_finishes():
+    group = SingleFlight("test")
+    values = iter(["first", "second"])
+
+    async def fetch():
+        await asyncio.sleep(0)
+        return next(values)
+
+    async def main():
+        return await group.do("key", fetch), await group.do("key", fetch)
+
+    assert asyncio.run(main()) == ("first", "second")
+    assert group.calls == 2 and group.stats()["in_flight"] == 0
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    group = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(group.do("key", fetch))
+        second = asyncio.create_task(group.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
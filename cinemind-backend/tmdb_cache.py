@@ -0,0 +1,197 @@
+# tmdb_cache.py
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import httpx
+from cachetools import TLRUCache
+
+TMDB_CACHE_ENABLED = os.getenv('TMDB_CACHE_ENABLED', 'true').lower() != 'false'
+# Bound of the in-memory tier, in bytes of cached response bodies.
+TMDB_CACHE_MAX_BYTES = int(os.getenv('TMDB_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# SQLite file of the optional disk tier, which survives restarts; empty disables it.
+TMDB_CACHE_DB_PATH = os.getenv('TMDB_CACHE_DB_PATH', '')
+# Expired disk rows are purged after this many writes.
+TMDB_CACHE_DB_PURGE_EVERY = 1000
+
+# (endpoint name, path pattern, TTL in seconds), first match wins. Static data such as
+# credits and keywords lives long, charts that move during the day expire quickly.
+ENDPOINT_TTLS = [
+    ("trending", re.compile(r"^/3/trending/"), 30 * 60),
+    ("movie_lists", re.compile(r"^/3/movie/(popular|top_rated|now_playing|upcoming)$"), 60 * 60),
+    ("discover", re.compile(r"^/3/discover/"), 60 * 60),
+    ("credits", re.compile(r"^/3/movie/\d+/credits$"), 7 * 24 * 60 * 60),
+    ("keywords", re.compile(r"^/3/movie/\d+/keywords$"), 7 * 24 * 60 * 60),
+    ("watch_providers", re.compile(r"^/3/movie/\d+/watch/providers$"), 24 * 60 * 60),
+    ("movie", re.compile(r"^/3/movie/\d+$"), 24 * 60 * 60),
+    ("search", re.compile(r"^/3/search/"), 6 * 60 * 60),
+    ("genres", re.compile(r"^/3/genre/"), 7 * 24 * 60 * 60),
+]
+# Query parameters that do not change the response
+_IGNORED_PARAMS = {"api_key"}
+
+# A cached response: (expires at, wall clock), status code, content type, body
+CachedResponse = Tuple[float, int, str, bytes]
+
+def endpoint_ttl(path: str) -> Tuple[Optional[str], Optional[int]]:
+    """The endpoint name and TTL of a TMDB path, or (None, None) for paths that are not cached."""
+    for name, pattern, ttl in ENDPOINT_TTLS:
+        if pattern.match(path):
+            return name, ttl
+    return None, None
+
+def cache_key(request: httpx.Request) -> str:
+    """Endpoint path plus the sorted query parameters, without the API key."""
+    params = sorted((key, value) for key, value in request.url.params.multi_items() if key not in _IGNORED_PARAMS)
+    return f"{request.url.host}{request.url.path}?{urlencode(params)}"
+
+class _LRUEntries(TLRUCache):
+    """Per-entry expiry plus LRU eviction by total body size, counting evictions."""
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize, ttu=lambda key, value, now: value[0], timer=time.time, getsizeof=lambda value: len(value[3]) or 1)
+        self.evictions = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+class TMDBResponseCache:
+    """
+    Read-through cache of successful TMDB GET responses.
+
+    Responses are keyed by endpoint and normalized query parameters and kept
+    for the TTL of their endpoint (`ENDPOINT_TTLS`). The memory tier is an LRU
+    bounded by TMDB_CACHE_MAX_BYTES; when TMDB_CACHE_DB_PATH is set, entries
+    are also written to SQLite so they survive restarts, and a memory miss
+    falls back to disk before going upstream.
+    """
+
+    def __init__(self, max_bytes: int = TMDB_CACHE_MAX_BYTES, db_path: str = TMDB_CACHE_DB_PATH):
+        self._entries = _LRUEntries(max_bytes)
+        self._lock = threading.Lock()
+        self._db_path = db_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._db_writes = 0
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, endpoint: str, counter: str):
+        counters = self.counters.setdefault(endpoint, {"hits": 0, "disk_hits": 0, "misses": 0})
+        counters[counter] += 1
+
+    # --- memory tier ---
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, entry: CachedResponse):
+        with self._lock:
+            try:
+                self._entries[key] = entry
+            except ValueError:
+                # A single body larger than the whole memory tier is not kept
+                pass
+
+    # --- disk tier ---
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self._db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tmdb_cache (key TEXT PRIMARY KEY, expires_at REAL, status INTEGER, content_type TEXT, content BLOB)"
+            )
+        return self._db
+
+    def disk_get(self, key: str) -> Optional[CachedResponse]:
+        with self._db_lock:
+            row = self._connection().execute("SELECT expires_at, status, content_type, content FROM tmdb_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        return row[0], row[1], row[2], bytes(row[3])
+
+    def disk_set(self, key: str, entry: CachedResponse):
+        with self._db_lock:
+            db = self._connection()
+            db.execute("INSERT OR REPLACE INTO tmdb_cache VALUES (?, ?, ?, ?, ?)", (key, *entry))
+            self._db_writes += 1
+            if self._db_writes % TMDB_CACHE_DB_PURGE_EVERY == 0:
+                db.execute("DELETE FROM tmdb_cache WHERE expires_at <= ?", (time.time(),))
+            db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db_path:
+            with self._db_lock:
+                self._connection().execute("DELETE FROM tmdb_cache")
+                self._connection().commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            totals = {name: sum(counters[name] for counters in self.counters.values()) for name in ("hits", "disk_hits", "misses")}
+            lookups = sum(totals.values())
+            return {
+                "entries": len(self._entries), "bytes": self._entries.currsize, "max_bytes": self._entries.maxsize,
+                "evictions": self._entries.evictions, "disk_tier": bool(self._db_path),
+                **totals, "hit_rate": round((totals["hits"] + totals["disk_hits"]) / lookups, 4) if lookups else None,
+                "endpoints": {endpoint: dict(counters) for endpoint, counters in self.counters.items()},
+            }
+
+    async def lookup(self, key: str, endpoint: str) -> Optional[CachedResponse]:
+        entry = self.get(key)
+        if entry is not None:
+            self._count(endpoint, "hits")
+            return entry
+        if self._db_path:
+            entry = await asyncio.to_thread(self.disk_get, key)
+            if entry is not None:
+                self._count(endpoint, "disk_hits")
+                self.set(key, entry)
+                return entry
+        self._count(endpoint, "misses")
+        return None
+
+    async def store(self, key: str, entry: CachedResponse):
+        self.set(key, entry)
+        if self._db_path:
+            try:
+                await asyncio.to_thread(self.disk_set, key, entry)
+            except sqlite3.Error as e:
+                print(f"[TMDBCache] Failed to write the disk tier: {e}")
+
+class CachingTransport(httpx.AsyncBaseTransport):
+    """Wraps the pooled transport so cacheable TMDB GETs are answered from `cache` when possible."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, cache: TMDBResponseCache):
+        self._transport = transport
+        self._cache = cache
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint, ttl = endpoint_ttl(request.url.path) if request.method == "GET" else (None, None)
+        if endpoint is None:
+            return await self._transport.handle_async_request(request)
+
+        key = cache_key(request)
+        entry = await self._cache.lookup(key, endpoint)
+        if entry is None:
+            response = await self._transport.handle_async_request(request)
+            if response.status_code != 200:
+                return response
+            # Bodies are stored decoded, so the replayed response carries no content-encoding
+            content = await response.aread()
+            entry = (time.time() + ttl, response.status_code, response.headers.get("content-type", "application/json"), content)
+            await self._cache.store(key, entry)
+        _, status_code, content_type, content = entry
+        return httpx.Response(status_code, headers={"content-type": content_type}, content=content, request=request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+tmdb_response_cache = TMDBResponseCache()
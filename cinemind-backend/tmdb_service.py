@@ -1,12 +1,14 @@
 # tmdb_service.py
 import os
-import requests
 import httpx
 import asyncio
 import random
-from typing import List, Dict, Optional
+from typing import List, Optional
 from datetime import datetime, timedelta
 
+from http_clients import tmdb_http
+from singleflight import coalesce
+
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 TMDB_API_BASE_URL = 'https://api.themoviedb.org/3'
 
@@ -32,7 +34,7 @@ def get_full_poster_url(poster_path: str, size: str = 'w500'):
         return None
     return f"https://image.tmdb.org/t/p/{size}{poster_path}"
 
-def search_movie_by_title(title: str, year: str = None):
+async def search_movie_by_title(title: str, year: str = None):
     """
     영화 제목과 개봉 연도로 TMDB에서 영화를 검색합니다.
     """
@@ -50,17 +52,17 @@ def search_movie_by_title(title: str, year: str = None):
         params['year'] = year
 
     try:
-        response = requests.get(f"{TMDB_API_BASE_URL}/search/movie", params=params)
+        response = await tmdb_http.client().get(f"{TMDB_API_BASE_URL}/search/movie", params=params)
         response.raise_for_status()
         results = response.json().get('results')
         if results:
             return results[0]
         return None
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"TMDB API 영화 검색 중 오류 발생: {e}")
         return None
 
-def get_movie_poster_path(tmdb_id: int):
+async def get_movie_poster_path(tmdb_id: int):
     """
     TMDB 영화 ID로 상세 정보를 조회하여 포스터 경로를 반환합니다.
     """
@@ -73,11 +75,11 @@ def get_movie_poster_path(tmdb_id: int):
     }
     
     try:
-        response = requests.get(f"{TMDB_API_BASE_URL}/movie/{tmdb_id}", params=params)
+        response = await tmdb_http.client().get(f"{TMDB_API_BASE_URL}/movie/{tmdb_id}", params=params)
         response.raise_for_status()
         data = response.json()
         return data.get('poster_path')
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"TMDB API 영화 상세 정보 조회 중 오류 발생: {e}")
         return None
 
@@ -97,28 +99,72 @@ async def get_movies_for_onboarding(mood_keywords: List[str]) -> List[dict]:
     movie_candidates = []
     seen_movie_ids = set()
 
-    async with httpx.AsyncClient() as client:
-        # 1. 사용자가 선택한 장르에서 영화 후보군 수집
-        tasks = []
-        for genre_id in target_genre_ids:
+    client = tmdb_http.client()
+    # 1. 사용자가 선택한 장르에서 영화 후보군 수집
+    tasks = []
+    for genre_id in target_genre_ids:
+        random_page = random.randint(1, 5)
+        url = f"{TMDB_API_BASE_URL}/discover/movie"
+        params = {
+            "api_key": TMDB_API_KEY, "with_genres": str(genre_id), "sort_by": "popularity.desc",
+            "language": "ko-KR", "page": random_page, "region": "KR", "vote_count.gte": 100
+        }
+        tasks.append(client.get(url, params=params))
+
+    discover_responses = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for i, response in enumerate(discover_responses):
+        try:
+            if isinstance(response, httpx.Response) and response.status_code == 200:
+                data = response.json()
+                current_genre_id = target_genre_ids[i % len(target_genre_ids)]
+                genre_name = id_to_genre_name_map.get(current_genre_id, "기타")
+                    
+                for movie in data.get("results", [])[:7]: # 장르당 7개씩 우선 수집
+                    if movie.get("poster_path") and movie["id"] not in seen_movie_ids:
+                        movie_candidates.append({
+                            "movie_id": movie["id"], "title": movie["title"],
+                            "poster_url": get_full_poster_url(movie['poster_path']),
+                            "genre_name": genre_name
+                        })
+                        seen_movie_ids.add(movie["id"])
+            elif isinstance(response, Exception):
+                print(f"TMDB discover movie API 호출 중 예외 발생: {response}")
+            else: # httpx.Response but not 200
+                print(f"TMDB discover movie API 호출 실패 (상태 코드: {response.status_code})")
+        except Exception as e:
+            print(f"TMDB discover movie 응답 처리 중 오류 발생: {e}")
+        
+    # 2. 영화가 부족할 경우, 기본 인기 장르에서 보충 (Fallback)
+    if len(seen_movie_ids) < MIN_ONBOARDING_MOVIES:
+        print(f"온보딩 영화 부족: {len(seen_movie_ids)}편. 기본 장르에서 보충합니다.")
+            
+        fallback_tasks = []
+        # 선택된 장르를 제외한 기본 장르 목록
+        fallback_genre_names = [name for name in DEFAULT_ONBOARDING_GENRE_NAMES if name not in target_genre_names]
+            
+        for genre_name in fallback_genre_names:
+            genre_id = GENRE_IDS[genre_name]
             random_page = random.randint(1, 5)
             url = f"{TMDB_API_BASE_URL}/discover/movie"
             params = {
                 "api_key": TMDB_API_KEY, "with_genres": str(genre_id), "sort_by": "popularity.desc",
                 "language": "ko-KR", "page": random_page, "region": "KR", "vote_count.gte": 100
             }
-            tasks.append(client.get(url, params=params))
+            fallback_tasks.append(client.get(url, params=params))
 
-        discover_responses = await asyncio.gather(*tasks, return_exceptions=True)
+        fallback_responses = await asyncio.gather(*fallback_tasks, return_exceptions=True)
 
-        for i, response in enumerate(discover_responses):
+        for i, response in enumerate(fallback_responses):
+            if len(seen_movie_ids) >= MIN_ONBOARDING_MOVIES:
+                break # 목표 개수를 채우면 중단
+                
             try:
                 if isinstance(response, httpx.Response) and response.status_code == 200:
                     data = response.json()
-                    current_genre_id = target_genre_ids[i % len(target_genre_ids)]
-                    genre_name = id_to_genre_name_map.get(current_genre_id, "기타")
-                    
-                    for movie in data.get("results", [])[:7]: # 장르당 7개씩 우선 수집
+                    genre_name = fallback_genre_names[i % len(fallback_genre_names)]
+                        
+                    for movie in data.get("results", []):
                         if movie.get("poster_path") and movie["id"] not in seen_movie_ids:
                             movie_candidates.append({
                                 "movie_id": movie["id"], "title": movie["title"],
@@ -126,84 +172,39 @@ async def get_movies_for_onboarding(mood_keywords: List[str]) -> List[dict]:
                                 "genre_name": genre_name
                             })
                             seen_movie_ids.add(movie["id"])
+                            if len(seen_movie_ids) >= MIN_ONBOARDING_MOVIES:
+                                break
                 elif isinstance(response, Exception):
-                    print(f"TMDB discover movie API 호출 중 예외 발생: {response}")
-                else: # httpx.Response but not 200
-                    print(f"TMDB discover movie API 호출 실패 (상태 코드: {response.status_code})")
+                    print(f"TMDB discover movie API (fallback) 호출 중 예외 발생: {response}")
+                else:
+                    print(f"TMDB discover movie API (fallback) 호출 실패 (상태 코드: {response.status_code})")
             except Exception as e:
-                print(f"TMDB discover movie 응답 처리 중 오류 발생: {e}")
-        
-        # 2. 영화가 부족할 경우, 기본 인기 장르에서 보충 (Fallback)
-        if len(seen_movie_ids) < MIN_ONBOARDING_MOVIES:
-            print(f"온보딩 영화 부족: {len(seen_movie_ids)}편. 기본 장르에서 보충합니다.")
-            
-            fallback_tasks = []
-            # 선택된 장르를 제외한 기본 장르 목록
-            fallback_genre_names = [name for name in DEFAULT_ONBOARDING_GENRE_NAMES if name not in target_genre_names]
-            
-            for genre_name in fallback_genre_names:
-                genre_id = GENRE_IDS[genre_name]
-                random_page = random.randint(1, 5)
-                url = f"{TMDB_API_BASE_URL}/discover/movie"
-                params = {
-                    "api_key": TMDB_API_KEY, "with_genres": str(genre_id), "sort_by": "popularity.desc",
-                    "language": "ko-KR", "page": random_page, "region": "KR", "vote_count.gte": 100
-                }
-                fallback_tasks.append(client.get(url, params=params))
-
-            fallback_responses = await asyncio.gather(*fallback_tasks, return_exceptions=True)
-
-            for i, response in enumerate(fallback_responses):
-                if len(seen_movie_ids) >= MIN_ONBOARDING_MOVIES:
-                    break # 목표 개수를 채우면 중단
-                
-                try:
-                    if isinstance(response, httpx.Response) and response.status_code == 200:
-                        data = response.json()
-                        genre_name = fallback_genre_names[i % len(fallback_genre_names)]
-                        
-                        for movie in data.get("results", []):
-                            if movie.get("poster_path") and movie["id"] not in seen_movie_ids:
-                                movie_candidates.append({
-                                    "movie_id": movie["id"], "title": movie["title"],
-                                    "poster_url": get_full_poster_url(movie['poster_path']),
-                                    "genre_name": genre_name
-                                })
-                                seen_movie_ids.add(movie["id"])
-                                if len(seen_movie_ids) >= MIN_ONBOARDING_MOVIES:
-                                    break
-                    elif isinstance(response, Exception):
-                        print(f"TMDB discover movie API (fallback) 호출 중 예외 발생: {response}")
-                    else:
-                        print(f"TMDB discover movie API (fallback) 호출 실패 (상태 코드: {response.status_code})")
-                except Exception as e:
-                    print(f"TMDB discover movie (fallback) 응답 처리 중 오류 발생: {e}")
+                print(f"TMDB discover movie (fallback) 응답 처리 중 오류 발생: {e}")
     
     # 3. 수집된 영화들의 출연진 정보 병렬로 가져오기
     actor_map = {}
-    async with httpx.AsyncClient() as client:
-        tasks = []
-        for movie in movie_candidates:
-            movie_id = movie["movie_id"]
-            credits_url = f"{TMDB_API_BASE_URL}/movie/{movie_id}/credits"
-            params = {"api_key": TMDB_API_KEY, "language": "ko-KR"}
-            tasks.append(client.get(credits_url, params=params))
-
-        credits_responses = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for i, response in enumerate(credits_responses):
-            movie_id = movie_candidates[i]["movie_id"]
-            try:
-                if isinstance(response, httpx.Response) and response.status_code == 200:
-                    credits_data = response.json()
-                    top_actors = [actor['name'] for actor in credits_data.get('cast', [])[:2]]
-                    actor_map[movie_id] = top_actors
-                elif isinstance(response, Exception):
-                    print(f"TMDB credits API 호출 중 예외 발생: {response}")
-                else:
-                    print(f"TMDB credits API 호출 실패 (상태 코드: {response.status_code})")
-            except Exception as e:
-                print(f"TMDB credits 응답 처리 중 오류 발생: {e}")
+    tasks = []
+    for movie in movie_candidates:
+        movie_id = movie["movie_id"]
+        credits_url = f"{TMDB_API_BASE_URL}/movie/{movie_id}/credits"
+        params = {"api_key": TMDB_API_KEY, "language": "ko-KR"}
+        tasks.append(client.get(credits_url, params=params))
+
+    credits_responses = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for i, response in enumerate(credits_responses):
+        movie_id = movie_candidates[i]["movie_id"]
+        try:
+            if isinstance(response, httpx.Response) and response.status_code == 200:
+                credits_data = response.json()
+                top_actors = [actor['name'] for actor in credits_data.get('cast', [])[:2]]
+                actor_map[movie_id] = top_actors
+            elif isinstance(response, Exception):
+                print(f"TMDB credits API 호출 중 예외 발생: {response}")
+            else:
+                print(f"TMDB credits API 호출 실패 (상태 코드: {response.status_code})")
+        except Exception as e:
+            print(f"TMDB credits 응답 처리 중 오류 발생: {e}")
 
     # 4. 최종 영화 목록에 배우 정보 결합
     onboarding_movies = []
@@ -219,17 +220,17 @@ async def get_details_for_movies(ids: List[int]) -> List[dict]:
     """
     주어진 영화 ID 목록에 대한 상세 정보(키워드, 개봉일 포함)를 TMDB에서 가져옵니다.
     """
-    async with httpx.AsyncClient() as client:
-        tasks = []
-        for movie_id in ids:
-            details_url = f"{TMDB_API_BASE_URL}/movie/{movie_id}"
-            keywords_url = f"{TMDB_API_BASE_URL}/movie/{movie_id}/keywords"
-            params = {"api_key": TMDB_API_KEY, "language": "ko-KR"}
+    client = tmdb_http.client()
+    tasks = []
+    for movie_id in ids:
+        details_url = f"{TMDB_API_BASE_URL}/movie/{movie_id}"
+        keywords_url = f"{TMDB_API_BASE_URL}/movie/{movie_id}/keywords"
+        params = {"api_key": TMDB_API_KEY, "language": "ko-KR"}
             
-            tasks.append(client.get(details_url, params=params))
-            tasks.append(client.get(keywords_url, params={"api_key": TMDB_API_KEY}))
+        tasks.append(client.get(details_url, params=params))
+        tasks.append(client.get(keywords_url, params={"api_key": TMDB_API_KEY}))
         
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
     
     detailed_movies = []
     for i in range(0, len(responses), 2):
@@ -260,7 +261,7 @@ async def get_details_for_movies(ids: List[int]) -> List[dict]:
             print(f"TMDB movie details 응답 처리 중 오류 발생: {e}")
     return detailed_movies
 
-def search_person_on_tmdb(name: str) -> dict | None:
+async def search_person_on_tmdb(name: str) -> dict | None:
     """
     TMDB에서 이름으로 인물을 검색하고 첫 번째 결과를 반환합니다.
     """
@@ -274,13 +275,13 @@ def search_person_on_tmdb(name: str) -> dict | None:
         "language": "ko-KR"
     }
     try:
-        response = requests.get(url, params=params)
+        response = await tmdb_http.client().get(url, params=params)
         response.raise_for_status()
         results = response.json().get('results')
         if results:
             return results[0]
         return None
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"TMDB 인물 검색 중 오류 발생: {e}")
         return None
 
@@ -288,63 +289,63 @@ async def search_movies_by_query(query: str) -> List[dict]:
     """
     TMDB에서 검색 쿼리로 영화 목록을 검색합니다.
     """
-    async with httpx.AsyncClient() as client:
-        url = f"{TMDB_API_BASE_URL}/search/movie"
-        params = {
-            "api_key": TMDB_API_KEY,
-            "query": query,
-            "language": "ko-KR",
-            "region": "KR",
-            "page": 1
-        }
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
+    client = tmdb_http.client()
+    url = f"{TMDB_API_BASE_URL}/search/movie"
+    params = {
+        "api_key": TMDB_API_KEY,
+        "query": query,
+        "language": "ko-KR",
+        "region": "KR",
+        "page": 1
+    }
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
             
-            results = response.json().get("results", [])
+        results = response.json().get("results", [])
             
-            searched_movies = []
-            for movie in results:
-                if movie.get("poster_path"):
-                    searched_movies.append({
-                        "id": movie["id"],
-                        "title": movie["title"],
-                        "poster_url": get_full_poster_url(movie.get('poster_path')),
-                        "release_date": movie.get("release_date"),
-                        "overview": movie.get("overview"),
-                        "vote_average": movie.get("vote_average")
-                    })
-            return searched_movies
-        except httpx.HTTPStatusError as e:
-            print(f"TMDB 검색 API 오류 발생: {e.response.status_code}")
-            return []
-        except Exception as e:
-            print(f"TMDB 영화 검색 중 예외 발생: {e}")
-            return []
+        searched_movies = []
+        for movie in results:
+            if movie.get("poster_path"):
+                searched_movies.append({
+                    "id": movie["id"],
+                    "title": movie["title"],
+                    "poster_url": get_full_poster_url(movie.get('poster_path')),
+                    "release_date": movie.get("release_date"),
+                    "overview": movie.get("overview"),
+                    "vote_average": movie.get("vote_average")
+                })
+        return searched_movies
+    except httpx.HTTPStatusError as e:
+        print(f"TMDB 검색 API 오류 발생: {e.response.status_code}")
+        return []
+    except Exception as e:
+        print(f"TMDB 영화 검색 중 예외 발생: {e}")
+        return []
 
 async def get_trending_movies(time_window: str = 'week', page: int = 1) -> List[dict]:
     """
     TMDB에서 트렌딩 영화 목록을 가져옵니다. (주간/일간)
     """
-    async with httpx.AsyncClient() as client:
-        url = f"{TMDB_API_BASE_URL}/trending/movie/{time_window}"
-        params = {"api_key": TMDB_API_KEY, "language": "ko-KR", "region": "KR", "page": page}
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            results = response.json().get("results", [])
+    client = tmdb_http.client()
+    url = f"{TMDB_API_BASE_URL}/trending/movie/{time_window}"
+    params = {"api_key": TMDB_API_KEY, "language": "ko-KR", "region": "KR", "page": page}
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        results = response.json().get("results", [])
             
-            trending_movies = []
-            for movie in results:
-                if movie.get("poster_path"):
-                    trending_movies.append({"id": movie["id"], "title": movie["title"], "poster_url": get_full_poster_url(movie.get('poster_path')), "release_date": movie.get("release_date"), "overview": movie.get("overview"), "vote_average": movie.get("vote_average")})
-            return trending_movies
-        except httpx.HTTPStatusError as e:
-            print(f"TMDB 트렌딩 API 오류: {e.response.status_code}")
-            return []
-        except Exception as e:
-            print(f"TMDB 트렌딩 영화 조회 중 예외 발생: {e}")
-            return []
+        trending_movies = []
+        for movie in results:
+            if movie.get("poster_path"):
+                trending_movies.append({"id": movie["id"], "title": movie["title"], "poster_url": get_full_poster_url(movie.get('poster_path')), "release_date": movie.get("release_date"), "overview": movie.get("overview"), "vote_average": movie.get("vote_average")})
+        return trending_movies
+    except httpx.HTTPStatusError as e:
+        print(f"TMDB 트렌딩 API 오류: {e.response.status_code}")
+        return []
+    except Exception as e:
+        print(f"TMDB 트렌딩 영화 조회 중 예외 발생: {e}")
+        return []
 
 async def get_now_playing_movies(page: int = 1) -> List[dict]:
     """
@@ -357,157 +358,158 @@ async def get_top_rated_movies(page: int = 1) -> List[dict]:
     """
     TMDB에서 역대 평점 높은 영화 목록을 가져옵니다.
     """
-    async with httpx.AsyncClient() as client:
-        url = f"{TMDB_API_BASE_URL}/movie/top_rated"
-        params = {
-            "api_key": TMDB_API_KEY,
-            "language": "ko-KR",
-            "region": "KR",
-            "page": page
-        }
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
+    client = tmdb_http.client()
+    url = f"{TMDB_API_BASE_URL}/movie/top_rated"
+    params = {
+        "api_key": TMDB_API_KEY,
+        "language": "ko-KR",
+        "region": "KR",
+        "page": page
+    }
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
             
-            results = response.json().get("results", [])
+        results = response.json().get("results", [])
             
-            top_rated_movies = []
-            for movie in results:
-                # Ensure poster_path exists, otherwise it's not useful
-                if movie.get("poster_path"):
-                    top_rated_movies.append({
-                        "id": movie["id"],
-                        "title": movie["title"],
-                        "poster_url": get_full_poster_url(movie.get('poster_path')),
-                        "release_date": movie.get("release_date"),
-                        "overview": movie.get("overview"),
-                        "vote_average": movie.get("vote_average")
-                    })
-            return top_rated_movies
-        except httpx.HTTPStatusError as e:
-            # Log HTTP errors specifically, but return empty list for graceful degradation
-            print(f"TMDB 평점 높은 영화 API 오류 발생: {e.response.status_code} - {e.response.text}")
-            return []
-        except Exception as e:
-            # Catch any other unexpected errors during the API call or JSON parsing
-            print(f"TMDB 평점 높은 영화 조회 중 예외 발생: {e}")
-            return []
+        top_rated_movies = []
+        for movie in results:
+            # Ensure poster_path exists, otherwise it's not useful
+            if movie.get("poster_path"):
+                top_rated_movies.append({
+                    "id": movie["id"],
+                    "title": movie["title"],
+                    "poster_url": get_full_poster_url(movie.get('poster_path')),
+                    "release_date": movie.get("release_date"),
+                    "overview": movie.get("overview"),
+                    "vote_average": movie.get("vote_average")
+                })
+        return top_rated_movies
+    except httpx.HTTPStatusError as e:
+        # Log HTTP errors specifically, but return empty list for graceful degradation
+        print(f"TMDB 평점 높은 영화 API 오류 발생: {e.response.status_code} - {e.response.text}")
+        return []
+    except Exception as e:
+        # Catch any other unexpected errors during the API call or JSON parsing
+        print(f"TMDB 평점 높은 영화 조회 중 예외 발생: {e}")
+        return []
 
 async def get_watch_providers(tmdb_id: int) -> dict:
     """
     TMDB에서 특정 영화의 한국 스트리밍 서비스 제공자 목록과 대표 '보러가기' 링크를 함께 가져옵니다.
     """
-    async with httpx.AsyncClient() as client:
-        url = f"{TMDB_API_BASE_URL}/movie/{tmdb_id}/watch/providers"
-        params = {"api_key": TMDB_API_KEY}
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            results = response.json().get("results", {})
-            kr_results = results.get("KR", {})
-            link = kr_results.get("link")
-            providers = kr_results.get("flatrate", [])
+    client = tmdb_http.client()
+    url = f"{TMDB_API_BASE_URL}/movie/{tmdb_id}/watch/providers"
+    params = {"api_key": TMDB_API_KEY}
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        results = response.json().get("results", {})
+        kr_results = results.get("KR", {})
+        link = kr_results.get("link")
+        providers = kr_results.get("flatrate", [])
             
-            provider_list = [{"provider_name": provider.get("provider_name"), "logo_url": get_full_poster_url(provider.get("logo_path"))} for provider in providers]
-            return {"link": link, "providers": provider_list}
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 404:
-                print(f"TMDB Watch Providers API: Watch providers not found for movie {tmdb_id}.")
-            else:
-                print(f"TMDB Watch Providers API 오류: {e.response.status_code} - {e.response.text}")
-            return {"link": None, "providers": []}
-        except Exception as e:
-            print(f"TMDB Watch Providers 조회 중 예외: {e}")
-            return {"link": None, "providers": []}
-
+        provider_list = [{"provider_name": provider.get("provider_name"), "logo_url": get_full_poster_url(provider.get("logo_path"))} for provider in providers]
+        return {"link": link, "providers": provider_list}
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            print(f"TMDB Watch Providers API: Watch providers not found for movie {tmdb_id}.")
+        else:
+            print(f"TMDB Watch Providers API 오류: {e.response.status_code} - {e.response.text}")
+        return {"link": None, "providers": []}
+    except Exception as e:
+        print(f"TMDB Watch Providers 조회 중 예외: {e}")
+        return {"link": None, "providers": []}
+
+@coalesce("tmdb_movie_details", key=lambda tmdb_id: str(tmdb_id))
 async def get_movie_details_by_tmdb_id(tmdb_id: int) -> dict | None:
     """
     TMDB ID를 사용하여 영화의 상세 정보(감독, 배우, OTT 포함)를 가져옵니다.
     """
-    async with httpx.AsyncClient() as client:
-        details_url = f"{TMDB_API_BASE_URL}/movie/{tmdb_id}"
-        credits_url = f"{TMDB_API_BASE_URL}/movie/{tmdb_id}/credits"
-        params = {"api_key": TMDB_API_KEY, "language": "ko-KR"}
+    client = tmdb_http.client()
+    details_url = f"{TMDB_API_BASE_URL}/movie/{tmdb_id}"
+    credits_url = f"{TMDB_API_BASE_URL}/movie/{tmdb_id}/credits"
+    params = {"api_key": TMDB_API_KEY, "language": "ko-KR"}
         
-        try:
-            details_task = client.get(details_url, params=params)
-            credits_task = client.get(credits_url, params=params)
-            providers_task = get_watch_providers(tmdb_id)
+    try:
+        details_task = client.get(details_url, params=params)
+        credits_task = client.get(credits_url, params=params)
+        providers_task = get_watch_providers(tmdb_id)
             
-            responses = await asyncio.gather(details_task, credits_task, providers_task, return_exceptions=True)
+        responses = await asyncio.gather(details_task, credits_task, providers_task, return_exceptions=True)
             
-            details_res, credits_res, provider_data = responses
+        details_res, credits_res, provider_data = responses
             
-            # Check if details_res is a successful httpx.Response object
-            if not (isinstance(details_res, httpx.Response) and details_res.status_code == 200):
-                print(f"TMDB movie details API 호출 실패 또는 예외 발생: {details_res}")
-                return None
+        # Check if details_res is a successful httpx.Response object
+        if not (isinstance(details_res, httpx.Response) and details_res.status_code == 200):
+            print(f"TMDB movie details API 호출 실패 또는 예외 발생: {details_res}")
+            return None
             
-            # Check if credits_res is a successful httpx.Response object
-            if not (isinstance(credits_res, httpx.Response) and credits_res.status_code == 200):
-                print(f"TMDB credits API 호출 실패 또는 예외 발생: {credits_res}")
-                # We can still proceed with details if credits fail, so log and use empty data
-                credits = {}
-            else:
-                credits = credits_res.json()
-
-            details = details_res.json()
+        # Check if credits_res is a successful httpx.Response object
+        if not (isinstance(credits_res, httpx.Response) and credits_res.status_code == 200):
+            print(f"TMDB credits API 호출 실패 또는 예외 발생: {credits_res}")
+            # We can still proceed with details if credits fail, so log and use empty data
+            credits = {}
+        else:
+            credits = credits_res.json()
+
+        details = details_res.json()
             
-            director = next((person['name'] for person in credits.get('crew', []) if person.get('job') == 'Director'), "N/A")
-            actors = [person['name'] for person in credits.get('cast', [])[:5]]
-
-            return {
-                "id": str(details.get("id")), "title": details.get("title"), "release": details.get("release_date"), "runtime": details.get("runtime"),
-                "genres": [genre['name'] for genre in details.get('genres', [])], "directors": [director], "actors": actors,
-                "synopsis": details.get("overview") or "줄거리 정보가 없습니다.", "poster_url": get_full_poster_url(details.get('poster_path')),
-                "backdrop_url": get_full_poster_url(details.get('backdrop_path'), size='w780'),
-                "watch_link": provider_data.get("link") if isinstance(provider_data, dict) else None,
-                "watch_providers": provider_data.get("providers") if isinstance(provider_data, dict) else []
-            }
-        except Exception as e:
-            print(f"TMDB 상세 정보 조회 중 예외: {e}")
-            return None
+        director = next((person['name'] for person in credits.get('crew', []) if person.get('job') == 'Director'), "N/A")
+        actors = [person['name'] for person in credits.get('cast', [])[:5]]
+
+        return {
+            "id": str(details.get("id")), "title": details.get("title"), "release": details.get("release_date"), "runtime": details.get("runtime"),
+            "genres": [genre['name'] for genre in details.get('genres', [])], "directors": [director], "actors": actors,
+            "synopsis": details.get("overview") or "줄거리 정보가 없습니다.", "poster_url": get_full_poster_url(details.get('poster_path')),
+            "backdrop_url": get_full_poster_url(details.get('backdrop_path'), size='w780'),
+            "watch_link": provider_data.get("link") if isinstance(provider_data, dict) else None,
+            "watch_providers": provider_data.get("providers") if isinstance(provider_data, dict) else []
+        }
+    except Exception as e:
+        print(f"TMDB 상세 정보 조회 중 예외: {e}")
+        return None
 
 async def _get_movies_by_genre_base(genre_id: int, page: int, region: str | None, vote_count_gte: int) -> List[dict]:
     """Base function to fetch movies by genre with specific filters."""
-    async with httpx.AsyncClient() as client:
-        url = f"{TMDB_API_BASE_URL}/discover/movie"
-        params = {
-            "api_key": TMDB_API_KEY,
-            "with_genres": str(genre_id),
-            "sort_by": "popularity.desc",
-            "language": "ko-KR",
-            "page": page,
-            "vote_count.gte": vote_count_gte,
-        }
-        if region:
-            params["region"] = region
+    client = tmdb_http.client()
+    url = f"{TMDB_API_BASE_URL}/discover/movie"
+    params = {
+        "api_key": TMDB_API_KEY,
+        "with_genres": str(genre_id),
+        "sort_by": "popularity.desc",
+        "language": "ko-KR",
+        "page": page,
+        "vote_count.gte": vote_count_gte,
+    }
+    if region:
+        params["region"] = region
         
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            results = response.json().get("results", [])
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        results = response.json().get("results", [])
             
-            movies = []
-            for movie in results:
-                if movie.get("poster_path"):
-                    movies.append({
-                        "id": movie["id"],
-                        "title": movie["title"],
-                        "poster_url": get_full_poster_url(movie.get('poster_path')),
-                        "release_date": movie.get("release_date"),
-                        "overview": movie.get("overview"),
-                        "vote_average": movie.get("vote_average")
-                    })
-            return movies
-        except httpx.HTTPStatusError as e:
-            # 404 is not an error in this context, just no results
-            if e.response.status_code != 404:
-                print(f"TMDB 장르별 영화 API 오류: {e.response.status_code}")
-            return []
-        except Exception as e:
-            print(f"TMDB 장르별 영화 조회 중 예외 발생: {e}")
-            return []
+        movies = []
+        for movie in results:
+            if movie.get("poster_path"):
+                movies.append({
+                    "id": movie["id"],
+                    "title": movie["title"],
+                    "poster_url": get_full_poster_url(movie.get('poster_path')),
+                    "release_date": movie.get("release_date"),
+                    "overview": movie.get("overview"),
+                    "vote_average": movie.get("vote_average")
+                })
+        return movies
+    except httpx.HTTPStatusError as e:
+        # 404 is not an error in this context, just no results
+        if e.response.status_code != 404:
+            print(f"TMDB 장르별 영화 API 오류: {e.response.status_code}")
+        return []
+    except Exception as e:
+        print(f"TMDB 장르별 영화 조회 중 예외 발생: {e}")
+        return []
 
 async def get_movies_by_genre(genre_id: int, page: int = 1) -> List[dict]:
     """
@@ -543,97 +545,83 @@ async def get_recent_releases(days_ago: int = 7) -> List[dict]:
     """
     TMDB에서 최근 N일 동안 개봉한 영화 목록을 가져옵니다.
     """
-    async with httpx.AsyncClient() as client:
-        today = datetime.now()
-        start_date = (today - timedelta(days=days_ago)).strftime('%Y-%m-%d')
-        end_date = today.strftime('%Y-%m-%d')
+    client = tmdb_http.client()
+    today = datetime.now()
+    start_date = (today - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+    end_date = today.strftime('%Y-%m-%d')
         
-        url = f"{TMDB_API_BASE_URL}/discover/movie"
-        params = {
-            "api_key": TMDB_API_KEY,
-            "language": "ko-KR",
-            "region": "KR",
-            "primary_release_date.gte": start_date,
-            "primary_release_date.lte": end_date,
-            "with_release_type": "3|2",  # 극장 개봉
-            "sort_by": "popularity.desc"
-        }
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            results = response.json().get("results", [])
+    url = f"{TMDB_API_BASE_URL}/discover/movie"
+    params = {
+        "api_key": TMDB_API_KEY,
+        "language": "ko-KR",
+        "region": "KR",
+        "primary_release_date.gte": start_date,
+        "primary_release_date.lte": end_date,
+        "with_release_type": "3|2",  # 극장 개봉
+        "sort_by": "popularity.desc"
+    }
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        results = response.json().get("results", [])
             
-            movies = []
-            for movie in results:
-                # Ensure poster_path exists, otherwise it's not useful
-                if movie.get("poster_path"):
-                    movies.append({
-                        "id": movie["id"],
-                        "title": movie["title"],
-                        "poster_url": get_full_poster_url(movie.get('poster_path')),
-                        "release_date": movie.get("release_date"),
-                        "overview": movie.get("overview"),
-                        "vote_average": movie.get("vote_average")
-                    })
-            return movies
-        except httpx.HTTPStatusError as e:
-            print(f"TMDB 신작 영화 API 오류: {e.response.status_code} - {e.response.text}")
-            return []
-        except Exception as e:
-            print(f"TMDB 신작 영화 조회 중 예외 발생: {e}")
-            return []
-
-async def get_movies_for_home_mood(keywords: List[str]) -> List[dict]:
+        movies = []
+        for movie in results:
+            # Ensure poster_path exists, otherwise it's not useful
+            if movie.get("poster_path"):
+                movies.append({
+                    "id": movie["id"],
+                    "title": movie["title"],
+                    "poster_url": get_full_poster_url(movie.get('poster_path')),
+                    "release_date": movie.get("release_date"),
+                    "overview": movie.get("overview"),
+                    "vote_average": movie.get("vote_average")
+                })
+        return movies
+    except httpx.HTTPStatusError as e:
+        print(f"TMDB 신작 영화 API 오류: {e.response.status_code} - {e.response.text}")
+        return []
+    except Exception as e:
+        print(f"TMDB 신작 영화 조회 중 예외 발생: {e}")
+        return []
+
+async def get_mood_pool_movies(genre_id: Optional[int], pages: int = 5) -> List[dict]:
     """
-    홈 화면의 감성 큐레이션을 위한 안정적인 영화 후보군을 가져옵니다.
-    여러 페이지를 동시에 조회하여 편차를 줄입니다.
+    감성 후보 풀을 채우기 위해 장르별 인기 영화(genre_id가 없으면 트렌딩 영화)를
+    여러 페이지 조회합니다. 요청 시점의 병합을 위해 `genre_ids`와 `popularity`를 함께 반환합니다.
     """
-    genre_ids = [str(GENRE_IDS[keyword]) for keyword in keywords if keyword in GENRE_IDS]
-    if not genre_ids:
-        # 키워드가 없을 경우, 인기 영화를 반환하는 로직 (예시)
-        print("[DEBUG-TMDB] No keywords provided, fetching general popular movies.")
-        return await get_trending_movies()
+    if genre_id is None:
+        url = f"{TMDB_API_BASE_URL}/trending/movie/week"
+        base_params = {"api_key": TMDB_API_KEY, "language": "ko-KR", "region": "KR"}
+    else:
+        url = f"{TMDB_API_BASE_URL}/discover/movie"
+        base_params = {"api_key": TMDB_API_KEY, "with_genres": str(genre_id), "sort_by": "popularity.desc", "language": "ko-KR"}
 
-    genre_id_string = ",".join(genre_ids)
-    
-    pages_to_fetch = [1, 2, 3] # 상위 3개 페이지를 조회
-    tasks = []
-    
-    async with httpx.AsyncClient() as client:
-        for page in pages_to_fetch:
-            url = f"{TMDB_API_BASE_URL}/discover/movie"
-            params = {
-                "api_key": TMDB_API_KEY,
-                "with_genres": genre_id_string,
-                "sort_by": "popularity.desc",
-                "language": "ko-KR",
-                "page": page,
-            }
-            tasks.append(client.get(url, params=params))
-        
-        responses = await asyncio.gather(*tasks, return_exceptions=True)
+    client = tmdb_http.client()
+    responses = await asyncio.gather(*[client.get(url, params={**base_params, "page": page}) for page in range(1, pages + 1)], return_exceptions=True)
 
-    combined_results = []
+    movies = []
     seen_movie_ids = set()
-
     for response in responses:
         if isinstance(response, httpx.Response) and response.status_code == 200:
-            results = response.json().get("results", [])
-            for movie in results:
-                # 중복 추가 방지
+            for movie in response.json().get("results", []):
                 if movie.get("id") not in seen_movie_ids and movie.get("poster_path"):
-                    combined_results.append({
+                    movies.append({
                         "id": movie["id"],
                         "title": movie["title"],
                         "poster_url": get_full_poster_url(movie.get('poster_path')),
                         "release_date": movie.get("release_date"),
                         "overview": movie.get("overview"),
-                        "vote_average": movie.get("vote_average")
+                        "vote_average": movie.get("vote_average"),
+                        "genre_ids": movie.get("genre_ids") or [],
+                        "popularity": movie.get("popularity") or 0.0,
                     })
                     seen_movie_ids.add(movie["id"])
         elif isinstance(response, Exception):
-            print(f"TMDB 감성 추천 병렬 요청 중 예외 발생: {response}")
-
-    print(f"[DEBUG-TMDB] Mood search for {keywords} from pages {pages_to_fetch} returned {len(combined_results)} unique movies.")
-    
-    return combined_results
\ No newline at end of file
+            print(f"TMDB 감성 후보 풀 요청 중 예외 발생: {response}")
+        else:
+            print(f"TMDB 감성 후보 풀 요청 실패 (상태 코드: {response.status_code})")
+    # 일부 페이지만 실패하면 빈 목록 대신 받은 만큼 반환하고, 모두 실패하면 예외로 알립니다.
+    if not movies and any(isinstance(response, Exception) or response.status_code != 200 for response in responses):
+        raise RuntimeError(f"TMDB 감성 후보 풀 조회 실패 (genre_id={genre_id})")
+    return movies
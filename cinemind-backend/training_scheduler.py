@@ -0,0 +1,170 @@
+# training_scheduler.py
+import os
+import json
+import socket
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from dateutil.parser import isoparse
+
+from supabase_client import supabase_admin
+from recommendation_service import train_and_save_similarity_matrix, train_and_save_content_similarity, train_and_save_mf_model, precompute_home_recommendations
+from model_store import similarity_models, COLLAB_LIST_TYPE, CONTENT_LIST_TYPE, MF_LIST_TYPE, PRECOMPUTED_LIST_TYPE
+from matrix_factorization import MF_TRAINING_ENABLED
+from precomputed_recommendations import BATCH_RECOMMENDATIONS_ENABLED, BATCH_RECOMMENDATIONS_INTERVAL_MINUTES
+
+TRAINING_ENABLED = os.getenv('TRAINING_ENABLED', 'true').lower() != 'false'
+# How old a saved model may get before the leader retrains it.
+TRAINING_INTERVAL_MINUTES = int(os.getenv('TRAINING_INTERVAL_MINUTES', '360'))
+# How often each worker wakes up to check the lease and model age.
+TRAINING_POLL_SECONDS = int(os.getenv('TRAINING_POLL_SECONDS', '60'))
+# A leader that stops renewing (crash, deploy) loses the lease after this long.
+TRAINING_LEASE_SECONDS = int(os.getenv('TRAINING_LEASE_SECONDS', '1800'))
+
+LEASE_LIST_TYPE = "training_leader_lease"
+MODEL_LIST_TYPES = {
+    "collaborative": COLLAB_LIST_TYPE,
+    "content": CONTENT_LIST_TYPE,
+}
+MODEL_TRAINERS = [("collaborative", train_and_save_similarity_matrix), ("content", train_and_save_content_similarity)]
+if MF_TRAINING_ENABLED:
+    MODEL_LIST_TYPES["matrix_factorization"] = MF_LIST_TYPE
+    MODEL_TRAINERS.append(("matrix_factorization", train_and_save_mf_model))
+# The batch job runs last so it scores users with the freshly trained models
+if BATCH_RECOMMENDATIONS_ENABLED:
+    MODEL_LIST_TYPES["batch_recommendations"] = PRECOMPUTED_LIST_TYPE
+    MODEL_TRAINERS.append(("batch_recommendations", precompute_home_recommendations))
+# Per-model overrides of TRAINING_INTERVAL_MINUTES
+MODEL_INTERVAL_MINUTES = {"batch_recommendations": BATCH_RECOMMENDATIONS_INTERVAL_MINUTES}
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_scheduler_task: Optional[asyncio.Task] = None
+
+training_status: Dict = {
+    "worker_id": WORKER_ID,
+    "enabled": TRAINING_ENABLED,
+    "is_leader": False,
+    "state": "idle",
+    "interval_minutes": TRAINING_INTERVAL_MINUTES,
+    "models": {
+        name: {"last_started": None, "last_finished": None, "last_result": None}
+        for name in MODEL_LIST_TYPES
+    },
+    "last_error": None,
+}
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _as_utc(value: str) -> datetime:
+    parsed = isoparse(value)
+    # Naive stamps are UTC (Postgres `timestamp` columns), not this host's local time
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _try_acquire_lease() -> bool:
+    """
+    Takes or renews the single-leader lease stored as a row in `cached_lists`.
+    The update is conditional on the `last_updated` value we read, so two
+    workers racing for an expired lease cannot both win.
+    """
+    now = _now()
+    lease = {"holder": WORKER_ID, "expires_at": (now + timedelta(seconds=TRAINING_LEASE_SECONDS)).isoformat()}
+    row = {"list_type": LEASE_LIST_TYPE, "data": json.dumps(lease), "last_updated": now.isoformat()}
+
+    current = supabase_admin.table('cached_lists').select('data, last_updated').eq('list_type', LEASE_LIST_TYPE).limit(1).execute()
+    if not current.data:
+        try:
+            supabase_admin.table('cached_lists').insert(row).execute()
+            return True
+        except Exception:
+            # Another worker inserted the lease first
+            return False
+
+    existing = current.data[0]
+    holder = json.loads(existing['data']) if existing.get('data') else {}
+    expired = not holder.get('expires_at') or _as_utc(holder['expires_at']) <= now
+    if holder.get('holder') != WORKER_ID and not expired:
+        return False
+
+    updated = supabase_admin.table('cached_lists').update(row).eq('list_type', LEASE_LIST_TYPE).eq('last_updated', existing['last_updated']).execute()
+    return bool(updated.data)
+
+def _release_lease():
+    try:
+        current = supabase_admin.table('cached_lists').select('data').eq('list_type', LEASE_LIST_TYPE).limit(1).execute()
+        if current.data and json.loads(current.data[0]['data']).get('holder') == WORKER_ID:
+            expired = {"holder": None, "expires_at": _now().isoformat()}
+            supabase_admin.table('cached_lists').update({"data": json.dumps(expired)}).eq('list_type', LEASE_LIST_TYPE).execute()
+    except Exception as e:
+        print(f"[Scheduler] Failed to release training lease: {e}")
+
+def _model_is_stale(list_type: str, interval_minutes: int = TRAINING_INTERVAL_MINUTES) -> bool:
+    res = supabase_admin.table('cached_lists').select('last_updated').eq('list_type', list_type).limit(1).execute()
+    if not res.data or not res.data[0].get('last_updated'):
+        return True
+    return _as_utc(res.data[0]['last_updated']) <= _now() - timedelta(minutes=interval_minutes)
+
+async def _run_training(name: str, train_function):
+    model_status = training_status["models"][name]
+    training_status["state"] = f"training_{name}"
+    model_status["last_started"] = _now().isoformat()
+    # The trainers are CPU bound; keep them off the event loop.
+    succeeded = await asyncio.to_thread(train_function)
+    model_status["last_finished"] = _now().isoformat()
+    model_status["last_result"] = "success" if succeeded else "failed"
+    if succeeded:
+        # The leader picks up its own model right away instead of waiting for the next poll
+        await asyncio.to_thread(similarity_models.refresh)
+
+async def run_training_cycle(force: bool = False):
+    """Retrains every stale model if this worker holds (or can take) the leader lease."""
+    is_leader = await asyncio.to_thread(_try_acquire_lease)
+    training_status["is_leader"] = is_leader
+    if not is_leader:
+        return
+
+    for name, train_function in MODEL_TRAINERS:
+        if force or await asyncio.to_thread(_model_is_stale, MODEL_LIST_TYPES[name], MODEL_INTERVAL_MINUTES.get(name, TRAINING_INTERVAL_MINUTES)):
+            print(f"[Scheduler] {WORKER_ID} retraining {name} model...")
+            await _run_training(name, train_function)
+            # Renew the lease between models so a long run does not let it lapse
+            await asyncio.to_thread(_try_acquire_lease)
+
+async def _scheduler_loop():
+    while True:
+        try:
+            await run_training_cycle()
+            training_status["last_error"] = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            training_status["last_error"] = str(e)
+            print(f"[Scheduler] Training cycle failed: {e}")
+        finally:
+            training_status["state"] = "idle"
+        await asyncio.sleep(TRAINING_POLL_SECONDS)
+
+def start_training_scheduler():
+    """Starts the background training loop on the running event loop."""
+    global _scheduler_task
+    if not TRAINING_ENABLED or _scheduler_task is not None:
+        return
+    _scheduler_task = asyncio.create_task(_scheduler_loop(), name="training-scheduler")
+    print(f"[Scheduler] Background training scheduler started ({WORKER_ID}).")
+
+async def stop_training_scheduler():
+    global _scheduler_task
+    if _scheduler_task is None:
+        return
+    _scheduler_task.cancel()
+    try:
+        await _scheduler_task
+    except asyncio.CancelledError:
+        pass
+    _scheduler_task = None
+    await asyncio.to_thread(_release_lease)
+
+def get_training_status() -> Dict:
+    return training_status